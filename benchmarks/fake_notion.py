@@ -0,0 +1,338 @@
+"""Local stand-in for the Notion API.
+
+Serves a synthetic workspace over the endpoints `NotionClient` uses and can
+simulate network latency and HTTP 429 rate limiting, so the crawler can be
+exercised without a real workspace:
+
+    python -m benchmarks.fake_notion --pages 1000 --depth 4 --latency-ms 50 --rate-limit 3
+    python -m benchmarks.fake_notion --pages 100 --databases 5 --rows-per-database 2000
+
+Point the sync at it with `NOTION_BASE_URL=http://127.0.0.1:8765`.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+WORDS = (
+    "policy onboarding remote work engineering release deploy incident review "
+    "budget hiring roadmap customer support billing security access laptop "
+    "vacation expense travel benefits payroll design api database storage "
+    "meeting notes quarterly planning architecture service migration backup"
+).split()
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def _rich_text(text: str) -> List[dict]:
+    return [{"type": "text", "text": {"content": text}, "plain_text": text}]
+
+def _timestamp(seconds: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:00.000Z", time.gmtime(seconds))
+
+STATUSES = ["Not started", "In progress", "Done"]
+
+class FakeWorkspace:
+    """A synthetic Notion workspace: a tree of pages, each with block content.
+
+    Databases hang off top-level pages. Their rows are pages too, with typed
+    properties; only every other database has rows with block content.
+    """
+
+    def __init__(self, pages: int = 100, depth: int = 3, blocks_per_page: int = 20, seed: int = 0,
+                 databases: int = 0, rows_per_database: int = 0):
+        self.rng = random.Random(seed)
+        self.pages: Dict[str, dict] = {}
+        self.databases: Dict[str, dict] = {}
+        self.rows: Dict[str, List[str]] = {}  # database id -> row page ids
+        self.blocks: Dict[str, List[dict]] = {}  # parent block/page id -> child blocks
+        self.lock = threading.Lock()
+        levels: List[List[str]] = [[] for _ in range(max(1, depth))]
+        for i in range(pages):
+            level = 0 if not levels[0] or i < max(1, pages // 20) else self.rng.randrange(len(levels))
+            while level and not levels[level - 1]:
+                level -= 1
+            parent_id = self.rng.choice(levels[level - 1]) if level else None
+            page = self.add_page(f"{_text(self.rng, 2).title()} {i}", parent_id, blocks_per_page)
+            levels[level].append(page["id"])
+        for i in range(databases):
+            database = self.add_database(f"{_text(self.rng, 1).title()} Tracker {i}", self.rng.choice(levels[0]) if levels[0] else None)
+            for j in range(rows_per_database):
+                self.add_row(database["id"], f"{_text(self.rng, 3).capitalize()} {j}", blocks=3 if i % 2 == 0 else 0)
+
+    def add_database(self, title: str, parent_id: Optional[str] = None) -> dict:
+        database_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        database = {
+            "object": "database",
+            "id": database_id,
+            "last_edited_time": _timestamp(time.time()),
+            "title": _rich_text(title),
+            "url": f"https://www.notion.so/{database_id.replace('-', '')}",
+            "archived": False,
+            "parent": {"type": "page_id", "page_id": parent_id} if parent_id else {"type": "workspace", "workspace": True},
+            "properties": {
+                "Name": {"id": "title", "type": "title", "title": {}},
+                "Status": {"id": "s", "type": "select", "select": {}},
+                "Tags": {"id": "t", "type": "multi_select", "multi_select": {}},
+                "Estimate": {"id": "e", "type": "number", "number": {}},
+                "Due": {"id": "d", "type": "date", "date": {}},
+                "Done": {"id": "c", "type": "checkbox", "checkbox": {}},
+                "Notes": {"id": "n", "type": "rich_text", "rich_text": {}}
+            }
+        }
+        with self.lock:
+            self.databases[database_id] = database
+            self.rows[database_id] = []
+        return database
+
+    def add_row(self, database_id: str, title: str, blocks: int = 0) -> dict:
+        row_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        rng = self.rng
+        row = {
+            "object": "page",
+            "id": row_id,
+            "created_time": _timestamp(time.time()),
+            "last_edited_time": _timestamp(time.time()),
+            "archived": False,
+            "url": f"https://www.notion.so/{row_id.replace('-', '')}",
+            "parent": {"type": "database_id", "database_id": database_id},
+            "properties": {
+                "Name": {"id": "title", "type": "title", "title": _rich_text(title)},
+                "Status": {"id": "s", "type": "select", "select": {"name": rng.choice(STATUSES)}},
+                "Tags": {"id": "t", "type": "multi_select", "multi_select": [{"name": word} for word in rng.sample(WORDS, 2)]},
+                "Estimate": {"id": "e", "type": "number", "number": rng.randint(1, 13)},
+                "Due": {"id": "d", "type": "date", "date": {"start": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "end": None}},
+                "Done": {"id": "c", "type": "checkbox", "checkbox": rng.random() < 0.5},
+                "Notes": {"id": "n", "type": "rich_text", "rich_text": _rich_text(_text(rng, 12))}
+            }
+        }
+        with self.lock:
+            self.pages[row_id] = row
+            self.rows[database_id].append(row_id)
+            self.blocks[row_id] = self._make_blocks(row_id, blocks) if blocks else []
+        return row
+
+    def add_page(self, title: str, parent_id: Optional[str] = None, blocks: int = 20) -> dict:
+        page_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        now = _timestamp(time.time())
+        page = {
+            "object": "page",
+            "id": page_id,
+            "created_time": now,
+            "last_edited_time": now,
+            "archived": False,
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "parent": {"type": "page_id", "page_id": parent_id} if parent_id else {"type": "workspace", "workspace": True},
+            "properties": {"title": {"id": "title", "type": "title", "title": _rich_text(title)}}
+        }
+        with self.lock:
+            self.pages[page_id] = page
+            self.blocks[page_id] = self._make_blocks(page_id, blocks)
+        return page
+
+    def _make_blocks(self, parent_id: str, count: int, nested: bool = True) -> List[dict]:
+        blocks = []
+        for i in range(count):
+            block_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            if i % 10 == 0:
+                block_type = "heading_2"
+            elif nested and i % 7 == 3:
+                block_type = "toggle"
+            else:
+                block_type = "paragraph"
+            has_children = block_type == "toggle"
+            blocks.append({
+                "object": "block",
+                "id": block_id,
+                "type": block_type,
+                "has_children": has_children,
+                block_type: {"rich_text": _rich_text(_text(self.rng, 4 if block_type == "heading_2" else 30))}
+            })
+            if has_children:
+                self.blocks[block_id] = self._make_blocks(block_id, 3, nested=False)
+        return blocks
+
+class _RateLimit:
+    """Server-side token bucket; requests beyond it get HTTP 429."""
+
+    def __init__(self, requests_per_second: float, burst: int):
+        self.rate = requests_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class FakeNotionServer:
+    """Threaded HTTP server answering Notion API requests from a `FakeWorkspace`.
+
+    Args:
+        workspace: The workspace to serve
+        latency_ms: Delay added to every response
+        rate_limit: Allowed requests per second, or None for no limit
+        retry_after: Value of the `Retry-After` header sent with 429 responses
+    """
+
+    def __init__(self, workspace: FakeWorkspace, latency_ms: float = 0.0, rate_limit: Optional[float] = None,
+                 retry_after: float = 1.0, host: str = "127.0.0.1", port: int = 0):
+        self.workspace = workspace
+        self.latency = latency_ms / 1000.0
+        self.rate_limit = _RateLimit(rate_limit, burst=max(1, int(rate_limit))) if rate_limit else None
+        self.retry_after = retry_after
+        self.stats = Counter()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the base URL."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def _dispatch(self, method: str):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                parts = [part for part in url.path.split("/") if part]
+
+                if parts[:1] == ["_stats"]:
+                    return self._send(200, dict(server.stats))
+
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.rate_limit and not server.rate_limit.allow():
+                    server.stats["rate_limited"] += 1
+                    return self._send(429, {
+                        "object": "error", "status": 429, "code": "rate_limited",
+                        "message": "You have been rate limited. Please try again in a few minutes."
+                    }, headers={"Retry-After": str(server.retry_after)})
+
+                route = server.route(method, parts[1:] if parts[:1] == ["v1"] else parts, body, query)
+                if route is None:
+                    return self._send(404, {
+                        "object": "error", "status": 404, "code": "object_not_found",
+                        "message": f"Could not find {url.path}"
+                    })
+                server.stats[route[0]] += 1
+                server.stats["requests"] += 1
+                self._send(200, route[1])
+
+            def _send(self, status: int, payload: dict, headers: Optional[dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def route(self, method: str, parts: List[str], body: dict, query: dict):
+        """Return `(stat_name, payload)` for a request, or None if unknown."""
+        workspace = self.workspace
+        if method == "POST" and parts == ["search"]:
+            wanted = (body.get("filter") or {}).get("value")
+            with workspace.lock:
+                results = [page for page in workspace.pages.values() if not page["archived"]] if wanted != "database" else []
+                if wanted != "page":
+                    results += [database for database in workspace.databases.values() if not database["archived"]]
+            return "search", self._paginate(results, body.get("start_cursor"), body.get("page_size"))
+        if method == "POST" and len(parts) == 3 and parts[0] == "databases" and parts[2] == "query":
+            if parts[1] not in workspace.databases:
+                return None
+            since = ((body.get("filter") or {}).get("last_edited_time") or {}).get("on_or_after")
+            with workspace.lock:
+                rows = [workspace.pages[row_id] for row_id in workspace.rows[parts[1]]]
+            rows = [row for row in rows if not row["archived"] and (not since or row["last_edited_time"] >= since)]
+            if body.get("sorts"):
+                rows.sort(key=lambda row: row["last_edited_time"], reverse=body["sorts"][0].get("direction") == "descending")
+            return "databases.query", self._paginate(rows, body.get("start_cursor"), body.get("page_size"))
+        if method == "GET" and len(parts) == 2 and parts[0] == "pages":
+            page = workspace.pages.get(parts[1])
+            return ("pages.retrieve", page) if page else None
+        if method == "GET" and len(parts) == 2 and parts[0] == "databases":
+            database = workspace.databases.get(parts[1])
+            return ("databases.retrieve", database) if database else None
+        if method == "GET" and len(parts) == 3 and parts[0] == "blocks" and parts[2] == "children":
+            children = workspace.blocks.get(parts[1])
+            if children is None:
+                return None
+            return "blocks.children.list", self._paginate(children, query.get("start_cursor"), query.get("page_size"))
+        return None
+
+    @staticmethod
+    def _paginate(items: List[dict], start_cursor: Optional[str], page_size) -> dict:
+        start = int(start_cursor or 0)
+        size = min(int(page_size or 100), 100)
+        end = start + size
+        return {
+            "object": "list",
+            "results": items[start:end],
+            "next_cursor": str(end) if end < len(items) else None,
+            "has_more": end < len(items)
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a synthetic Notion workspace locally')
+    parser.add_argument('--pages', type=int, default=100, help='Number of pages in the workspace')
+    parser.add_argument('--depth', type=int, default=3, help='Depth of the page hierarchy')
+    parser.add_argument('--blocks', type=int, default=20, help='Top-level blocks per page')
+    parser.add_argument('--databases', type=int, default=0, help='Number of databases')
+    parser.add_argument('--rows-per-database', type=int, default=0, help='Rows in each database')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every response')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second before answering 429')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    args = parser.parse_args()
+
+    workspace = FakeWorkspace(pages=args.pages, depth=args.depth, blocks_per_page=args.blocks,
+                              databases=args.databases, rows_per_database=args.rows_per_database)
+    server = FakeNotionServer(workspace, latency_ms=args.latency_ms, rate_limit=args.rate_limit, port=args.port)
+    print(f"Serving {args.pages} fake Notion pages at {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
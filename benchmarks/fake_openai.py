@@ -0,0 +1,185 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Answers `/v1/chat/completions` with a deterministic reply, with or without
+`stream=true`, and `/v1/embeddings` with the local hashing embedder's
+vectors, after a configurable delay, so the LLM path can be exercised and
+load tested without an API key:
+
+    python -m benchmarks.fake_openai --latency-ms 500 --tokens-per-second 50
+
+Point the services at it with `OPENAI_BASE_URL=http://127.0.0.1:8766/v1`.
+"""
+import argparse
+import base64
+import json
+import struct
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from src.llm.embedder import HashingEmbedder
+
+class FakeOpenAIServer:
+    """Threaded HTTP server answering OpenAI-compatible chat completion requests.
+
+    Args:
+        latency_ms: Delay before the first token
+        tokens_per_second: Rate at which the rest of the reply is produced
+        answer_tokens: Length of each reply in tokens
+    """
+
+    def __init__(self, latency_ms: float = 0.0, tokens_per_second: float = 0.0, answer_tokens: int = 40,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the base URL."""
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def reply_tokens(self, messages: List[dict]) -> List[str]:
+        """The reply for a conversation, split into tokens."""
+        prompt = messages[-1].get("content", "") if messages else ""
+        if "searchable terms" in prompt:
+            words = prompt.rsplit(":", 1)[-1].split()
+            return [f"{word} " for word in words[:8]] or ["notion "]
+        context_chars = len(prompt.split("User question:", 1)[0])
+        tokens = [f"Answer from {context_chars} characters of context."]
+        tokens += [" lorem"] * max(self.answer_tokens - 1, 0)
+        return tokens
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/").endswith("/embeddings"):
+                    return self._embeddings(body)
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                with server._lock:
+                    server.stats["requests"] += 1
+                    server.stats["stream" if body.get("stream") else "completion"] += 1
+
+                tokens = server.reply_tokens(body.get("messages", []))
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                time.sleep(server.latency)
+                if body.get("stream"):
+                    return self._stream(completion_id, body.get("model"), tokens)
+                if server.tokens_per_second:
+                    time.sleep(len(tokens) / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+                })
+
+            def _embeddings(self, body: dict):
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                with server._lock:
+                    server.stats["requests"] += 1
+                    server.stats["embedding"] += 1
+                    server.stats["embedded_texts"] += len(texts)
+                time.sleep(server.latency)
+                vectors = HashingEmbedder(body.get("dimensions") or 256).embed(texts)
+                data = []
+                for i, vector in enumerate(vectors):
+                    if body.get("encoding_format") == "base64":
+                        # The SDK asks for packed float32 unless told otherwise
+                        vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+                    data.append({"object": "embedding", "index": i, "embedding": vector})
+                self._send_json(200, {
+                    "object": "list",
+                    "data": data,
+                    "model": body.get("model"),
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0}
+                })
+
+            def _stream(self, completion_id: str, model: str, tokens: List[str]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, token in enumerate(tokens + [None]):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": token} if token is not None else {},
+                            "finish_reason": None if token is not None else "stop"
+                        }]
+                    }
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                    if server.tokens_per_second and token is not None and i:
+                        time.sleep(1 / server.tokens_per_second)
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status: int, payload: dict):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fake OpenAI chat completions API locally')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='Token rate after the first token (0 for instant)')
+    parser.add_argument('--answer-tokens', type=int, default=40, help='Tokens per answer')
+    parser.add_argument('--port', type=int, default=8766, help='Port to listen on')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.latency_ms, args.tokens_per_second, args.answer_tokens, port=args.port)
+    print(f"Serving fake OpenAI API at {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
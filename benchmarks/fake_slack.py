@@ -0,0 +1,147 @@
+"""Local stand-in for the Slack Web API.
+
+Implements `chat.postMessage` and `chat.update`, keeps every message it was
+sent and can simulate latency and per-channel HTTP 429 rate limiting:
+
+    python -m benchmarks.fake_slack --latency-ms 100 --channel-rate 1
+
+Point the server at it with `SLACK_API_URL=http://127.0.0.1:8767/api`.
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+class FakeSlackServer:
+    """Threaded HTTP server answering Slack Web API message calls.
+
+    Args:
+        latency_ms: Delay added to every response
+        channel_rate: Calls per second allowed per channel, or None for no limit
+        retry_after: Value of the `Retry-After` header sent with 429 responses
+    """
+
+    def __init__(self, latency_ms: float = 0.0, channel_rate: Optional[float] = None, retry_after: float = 1.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.channel_rate = channel_rate
+        self.retry_after = retry_after
+        self.stats = Counter()
+        self.messages: Dict[str, dict] = {}  # ts -> message
+        self._buckets: Dict[str, list] = {}  # channel -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the base URL."""
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def _allow(self, channel: str) -> bool:
+        if not self.channel_rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._buckets.setdefault(channel, [1.0, now])
+            bucket[0] = min(1.0, bucket[0] + (now - bucket[1]) * self.channel_rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+            return False
+
+    def call(self, method: str, payload: dict) -> dict:
+        """Apply a Web API call to the stored messages and return Slack's reply."""
+        channel = payload.get("channel")
+        with self._lock:
+            if method == "chat.postMessage":
+                ts = f"{time.time():.6f}"
+                while ts in self.messages:
+                    ts = f"{float(ts) + 0.000001:.6f}"
+                self.messages[ts] = {
+                    "channel": channel,
+                    "thread_ts": payload.get("thread_ts"),
+                    "text": payload.get("text", ""),
+                    "posted_at": time.time(),
+                    "updated_at": None,
+                    "updates": 0
+                }
+                return {"ok": True, "channel": channel, "ts": ts}
+            if method == "chat.update":
+                message = self.messages.get(payload.get("ts"))
+                if message is None or message["channel"] != channel:
+                    return {"ok": False, "error": "message_not_found"}
+                message["text"] = payload.get("text", "")
+                message["updated_at"] = time.time()
+                message["updates"] += 1
+                return {"ok": True, "channel": channel, "ts": payload.get("ts")}
+        return {"ok": False, "error": "unknown_method"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.stats["requests"] += 1
+                if not server._allow(payload.get("channel", "")):
+                    with server._lock:
+                        server.stats["rate_limited"] += 1
+                    return self._send(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": str(server.retry_after)})
+                result = server.call(method, payload)
+                with server._lock:
+                    server.stats[method] += 1
+                self._send(200, result)
+
+            def _send(self, status: int, payload: dict, headers: Optional[dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fake Slack Web API locally')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every response')
+    parser.add_argument('--channel-rate', type=float, default=None, help='Calls per second per channel before answering 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429 responses')
+    parser.add_argument('--port', type=int, default=8767, help='Port to listen on')
+    args = parser.parse_args()
+
+    server = FakeSlackServer(args.latency_ms, args.channel_rate, args.retry_after, port=args.port)
+    print(f"Serving fake Slack API at {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
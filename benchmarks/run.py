@@ -0,0 +1,271 @@
+"""End-to-end benchmark of sync and question answering against local fakes.
+
+Starts the fake Notion, OpenAI and Slack servers, then measures:
+
+- sync: a full and an incremental `SyncService` sync of a synthetic
+  workspace, reporting pages/sec, Notion API calls per page and 429s
+- questions: `LLMService` answering questions concurrently, reporting
+  p50/p95/p99 latency
+- slack: events posted to the FastAPI `/slack/events` endpoint, reporting
+  p50/p95/p99 latency until the answer reaches the fake Slack
+
+Peak memory (RSS) is reported for the whole run. MeiliSearch must be
+running at `MEILISEARCH_HOST`; the benchmark writes to its own index and
+drops it afterwards. Results are saved as JSON, and `--baseline` compares them with
+an earlier run:
+
+    python -m benchmarks.run --pages 500 --depth 4 --notion-latency-ms 20 --questions 100
+    python -m benchmarks.run --baseline benchmark_results.json --output new_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_notion import FakeNotionServer, FakeWorkspace
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_slack import FakeSlackServer
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and max of `values` by nearest rank, in seconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+    return {
+        "p50_seconds": pick(50),
+        "p95_seconds": pick(95),
+        "p99_seconds": pick(99),
+        "max_seconds": ordered[-1]
+    }
+
+def make_questions(workspace: FakeWorkspace, count: int, seed: int = 0) -> List[str]:
+    """Questions about random pages of the workspace, phrased by title."""
+    rng = random.Random(seed)
+    titles = [page["properties"]["title"]["title"][0]["plain_text"] for page in workspace.pages.values()
+              if "title" in page["properties"]]
+    templates = ["What is {}?", "How do we use {}?", "Where can I find the {} notes?", "Summarize {} for me"]
+    return [rng.choice(templates).format(rng.choice(titles)) for _ in range(count)]
+
+def bench_sync(notion_server: FakeNotionServer, pages: int) -> dict:
+    from src.sync.sync_service import SyncService
+
+    service = SyncService()
+    results = {}
+    for name, full_resync in (("full", True), ("incremental", False)):
+        requests_before = notion_server.stats["requests"]
+        rate_limited_before = notion_server.stats["rate_limited"]
+        started = time.perf_counter()
+        ok = service.sync(full_resync=full_resync)
+        seconds = time.perf_counter() - started
+        requests = notion_server.stats["requests"] - requests_before
+        results[name] = {
+            "ok": ok,
+            "seconds": seconds,
+            "pages_per_second": pages / seconds if seconds else 0.0,
+            "notion_requests": requests,
+            "notion_requests_per_page": requests / pages if pages else 0.0,
+            "rate_limited": notion_server.stats["rate_limited"] - rate_limited_before
+        }
+    results["client_retries"] = service.notion_client.rate_limiter.retry_count
+    return results
+
+async def _ask_all(service, questions: List[str], concurrency: int) -> Tuple[List[float], int]:
+    from src.config.config import config
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def ask(question: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await service.agenerate_response(question, max_context_tokens=config.CONTEXT_MAX_TOKENS)
+            except Exception as e:
+                errors.append(str(e))
+                return
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        await asyncio.gather(*(ask(question) for question in questions))
+    finally:
+        # The async client's pool belongs to this event loop
+        await service.llm_client.aclose()
+    if errors:
+        print(f"{len(errors)} questions failed, e.g.: {errors[0]}")
+    return latencies, len(errors)
+
+def bench_questions(questions: List[str], concurrency: int) -> dict:
+    from src.server import get_llm_service
+
+    service = get_llm_service()
+    started = time.perf_counter()
+    latencies, errors = asyncio.run(_ask_all(service, questions, concurrency))
+    seconds = time.perf_counter() - started
+    return {
+        "questions": len(questions),
+        "concurrency": concurrency,
+        "errors": errors,
+        "questions_per_second": len(questions) / seconds if seconds else 0.0,
+        **percentiles(latencies)
+    }
+
+def bench_slack(slack_server: FakeSlackServer, questions: List[str], timeout_seconds: float) -> dict:
+    from fastapi.testclient import TestClient
+    from src.server import app
+
+    sent_at = {}
+    with TestClient(app) as client:
+        for i, question in enumerate(questions):
+            channel = f"CBENCH{i}"
+            sent_at[channel] = time.time()
+            response = client.post("/slack/events", json={
+                "event_id": f"EvBENCH{i}-{time.time_ns()}",
+                "authorizations": [{"user_id": "UBOT"}],
+                "event": {"type": "app_mention", "user": "UBENCH", "channel": channel, "text": question,
+                          "client_msg_id": f"bench-{i}-{time.time_ns()}"}
+            })
+            response.raise_for_status()
+
+        # Each event gets its own channel, so its answer is the channel's message
+        deadline = time.monotonic() + timeout_seconds
+        answered = {}
+        while len(answered) < len(sent_at) and time.monotonic() < deadline:
+            for message in list(slack_server.messages.values()):
+                if message["channel"] in sent_at:
+                    answered.setdefault(message["channel"], message["posted_at"])
+            time.sleep(0.05)
+        metrics = client.get("/slack/metrics").json()
+
+    latencies = [answered[channel] - sent for channel, sent in sent_at.items() if channel in answered]
+    return {
+        "events": len(questions),
+        "answered": len(answered),
+        "slack_rate_limited": slack_server.stats["rate_limited"],
+        "events_shed": metrics.get("events_shed", 0),
+        **percentiles(latencies)
+    }
+
+def compare(results: dict, baseline: dict, prefix: str = ""):
+    """Print the relative change of every numeric result against `baseline`."""
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and isinstance(baseline.get(key), dict):
+            compare(value, baseline[key], f"{name}.")
+        elif isinstance(value, bool):
+            continue
+        elif isinstance(value, (int, float)) and isinstance(baseline.get(key), (int, float)) and baseline[key]:
+            change = (value - baseline[key]) / baseline[key] * 100
+            print(f"  {name:<45} {baseline[key]:>12.4g} -> {value:>12.4g} ({change:+.1f}%)")
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sync and question answering against local fakes')
+    parser.add_argument('--pages', type=int, default=200, help='Pages in the synthetic workspace')
+    parser.add_argument('--depth', type=int, default=3, help='Depth of the page tree')
+    parser.add_argument('--blocks-per-page', type=int, default=20, help='Top-level blocks per page')
+    parser.add_argument('--databases', type=int, default=0, help='Databases in the synthetic workspace')
+    parser.add_argument('--rows-per-database', type=int, default=0, help='Rows in each database')
+    parser.add_argument('--notion-latency-ms', type=float, default=20.0, help='Fake Notion delay per request')
+    parser.add_argument('--notion-rate-limit', type=float, default=None, help='Fake Notion requests per second before 429s')
+    parser.add_argument('--llm-latency-ms', type=float, default=200.0, help='Fake OpenAI delay before answering')
+    parser.add_argument('--llm-tokens-per-second', type=float, default=0.0, help='Fake OpenAI token rate (0 for instant)')
+    parser.add_argument('--slack-latency-ms', type=float, default=20.0, help='Fake Slack delay per call')
+    parser.add_argument('--questions', type=int, default=50, help='Questions for the question and Slack benchmarks')
+    parser.add_argument('--concurrency', type=int, default=10, help='Questions answered at once')
+    parser.add_argument('--skip', nargs='*', choices=['sync', 'questions', 'slack'], default=[], help='Benchmarks to skip')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Seconds to wait for Slack answers')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to save the results')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--keep-index', action='store_true', help="Don't drop the benchmark index afterwards")
+    args = parser.parse_args()
+
+    workspace = FakeWorkspace(args.pages, args.depth, args.blocks_per_page,
+                              databases=args.databases, rows_per_database=args.rows_per_database)
+    notion_server = FakeNotionServer(workspace, latency_ms=args.notion_latency_ms, rate_limit=args.notion_rate_limit)
+    openai_server = FakeOpenAIServer(latency_ms=args.llm_latency_ms, tokens_per_second=args.llm_tokens_per_second)
+    slack_server = FakeSlackServer(latency_ms=args.slack_latency_ms)
+    for server in (notion_server, openai_server, slack_server):
+        server.start()
+
+    # The services read their settings at import time
+    os.environ.update({
+        "NOTION_API_KEY": "benchmark",
+        "NOTION_BASE_URL": notion_server.base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "SLACK_BOT_TOKEN": "benchmark",
+        "SLACK_API_URL": slack_server.base_url,
+        "SLACK_STREAMING": "false",
+        "ANSWER_CACHE": "off",
+        "SYNC_STATE_DIR": tempfile.mkdtemp(prefix="notion-benchmark-")
+    })
+    from src.config.config import config
+    from src.indexer.meilisearch_client import SearchIndexer
+    config.SEARCH_INDEX_NAME = f"benchmark_{config.SEARCH_INDEX_NAME}"
+
+    questions = make_questions(workspace, args.questions)
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "settings": {
+            "index_mode": config.INDEX_MODE,
+            "retrieval_mode": config.RETRIEVAL_MODE,
+            "multi_query": config.MULTI_QUERY,
+            "query_rewrite": config.QUERY_REWRITE,
+            "notion_concurrency": config.NOTION_CONCURRENCY
+        }
+    }
+    try:
+        if "sync" not in args.skip:
+            print(f"Syncing {args.pages} pages...")
+            results["sync"] = bench_sync(notion_server, args.pages)
+        if "questions" not in args.skip:
+            print(f"Answering {len(questions)} questions...")
+            results["questions"] = bench_questions(questions, args.concurrency)
+        if "slack" not in args.skip:
+            print(f"Sending {len(questions)} Slack events...")
+            results["slack"] = bench_slack(slack_server, questions, args.timeout)
+    finally:
+        for server in (notion_server, openai_server, slack_server):
+            server.stop()
+        if not args.keep_index:
+            try:
+                SearchIndexer(config.MEILISEARCH_HOST, config.MEILISEARCH_KEY, config.SEARCH_INDEX_NAME).client.delete_index(config.SEARCH_INDEX_NAME)
+            except Exception as e:
+                print(f"Could not drop {config.SEARCH_INDEX_NAME}: {e}")
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    results["memory"] = {"peak_rss_mb": peak_rss / 2 ** 20}
+
+    print(json.dumps(results, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} ({baseline.get('revision')}):")
+        compare({key: value for key, value in results.items() if key != "parameters"}, baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measure how long the question answering entry points take to start.
+
+Each run is a fresh Python process, so imports are paid in full like they
+are on every CLI invocation. A run times importing the entry module, building
+the services and answering a first question against the fake OpenAI server
+and the MeiliSearch instance at `MEILISEARCH_HOST`:
+
+    python -m benchmarks.startup --runs 5
+
+The first question needs a reachable MeiliSearch; without one only the import
+and build times are reported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+# Runs in the child process and prints its stage timings as JSON
+CHILD = """
+import json, sys, time
+from argparse import Namespace
+start = time.perf_counter()
+timings = {}
+if sys.argv[1] == "server":
+    import src.server as entry
+    timings["import"] = time.perf_counter() - start
+    build = entry.get_llm_service
+else:
+    import src.cli as entry
+    timings["import"] = time.perf_counter() - start
+    build = lambda: entry.build_llm_service(Namespace(model="gpt-3.5-turbo", query_rewrite="never"))
+service = build()
+timings["build"] = time.perf_counter() - start
+try:
+    service.generate_response(sys.argv[2], max_context_length=40000)
+    timings["first_query"] = time.perf_counter() - start
+except Exception as e:
+    timings["error"] = str(e)
+print(json.dumps(timings))
+"""
+
+def run_once(entry: str, question: str, env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, entry, question],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark startup and first-question time')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes per entry point')
+    parser.add_argument('--entry', choices=['cli', 'server', 'both'], default='both', help='Entry point to measure')
+    parser.add_argument('--question', default='How do we deploy the API service?', help='First question to ask')
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0, help='Fake OpenAI delay before answering')
+    args = parser.parse_args()
+
+    openai_server = FakeOpenAIServer(latency_ms=args.llm_latency_ms)
+    openai_server.start()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "ANSWER_CACHE": "off",
+        "PYTHONPATH": os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    }
+
+    try:
+        entries = ['cli', 'server'] if args.entry == 'both' else [args.entry]
+        for entry in entries:
+            runs = [run_once(entry, args.question, env) for _ in range(args.runs)]
+            print(f"{entry} ({args.runs} runs, median seconds since process start):")
+            for stage in ("import", "build", "first_query"):
+                values = [run[stage] for run in runs if stage in run]
+                if values:
+                    print(f"  {stage:<12} {statistics.median(values):.3f}")
+            errors = {run["error"] for run in runs if "error" in run}
+            for error in errors:
+                print(f"  first query failed: {error}")
+    finally:
+        openai_server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,36 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 import os
 
 # Add the project root to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from indexer.meilisearch_client import SearchIndexer
-from config.config import config
+from src.indexer.meilisearch_client import SearchIndexer
+from src.config.config import config
 
 def main():
+    parser = argparse.ArgumentParser(description='Clear or rebuild the search index')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Rebuild into a shadow index and swap it in, keeping the live index searchable')
+    args = parser.parse_args()
+
     try:
+        if args.rebuild:
+            from src.sync.sync_service import SyncService
+
+            print("Rebuilding index from Notion...")
+            if SyncService().rebuild():
+                print("Successfully rebuilt index!")
+                sys.exit(0)
+            else:
+                print("Failed to rebuild index.")
+                sys.exit(1)
+
         print("Initializing indexer...")
-        indexer = SearchIndexer(config.MEILISEARCH_HOST, config.MEILISEARCH_KEY)
+        indexer = SearchIndexer(config.MEILISEARCH_HOST, config.MEILISEARCH_KEY, index_name=config.SEARCH_INDEX_NAME,
+                                vector_dimensions=config.SEARCH_VECTOR_DIMENSIONS)
         
         print("Clearing and recreating index...")
         if indexer.clear_index():
@@ -1,6 +1,11 @@
 import sys
 import os
 import argparse
+import asyncio
+import contextlib
+import json
+import time
+from typing import List, Set, TextIO
 
 # Add the parent directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -8,26 +13,203 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from src.indexer.meilisearch_client import SearchIndexer
 from src.llm.llm_service import LLMService
 from src.llm.llm_client import OpenAIClient
+from src.llm.cache import TTLCache, create_response_cache
+from src.llm.embedder import create_embedder
+from src.indexer.vector_index import LocalVectorIndex
 from src.config.config import config
+from src.metrics import LLM_STAGE_SECONDS, recording
+
+def build_llm_service(args) -> LLMService:
+    """Create the search and LLM services for the parsed command line."""
+    search_indexer = SearchIndexer(host=config.MEILISEARCH_HOST, api_key=config.MEILISEARCH_KEY, index_name=config.SEARCH_INDEX_NAME,
+                                   vector_dimensions=config.SEARCH_VECTOR_DIMENSIONS)
+    search_indexer.configure_search_settings()
+    return LLMService(
+        search_indexer=search_indexer,
+        llm_client=OpenAIClient(
+            model=args.model,
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            timeout=config.LLM_TIMEOUT_SECONDS
+        ),
+        passage_mode=config.INDEX_MODE == "passage",
+        query_rewrite=args.query_rewrite,
+        rewrite_min_score=config.QUERY_REWRITE_MIN_SCORE,
+        rewrite_cache=TTLCache(config.REWRITE_CACHE_SIZE, config.REWRITE_CACHE_TTL_SECONDS),
+        response_cache=create_response_cache(
+            config.ANSWER_CACHE,
+            config.ANSWER_CACHE_PATH,
+            config.ANSWER_CACHE_SIZE,
+            config.ANSWER_CACHE_TTL_SECONDS
+        ),
+        embedder=create_embedder(
+            config.EMBEDDER,
+            config.EMBEDDING_DIMENSIONS,
+            config.EMBEDDING_MODEL,
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL
+        ) if config.RETRIEVAL_MODE == "hybrid" else None,
+        vector_index=LocalVectorIndex(
+            config.VECTOR_INDEX_PATH,
+            config.EMBEDDING_DIMENSIONS
+        ) if config.RETRIEVAL_MODE == "hybrid" and config.VECTOR_STORE == "local" else None,
+        semantic_ratio=config.HYBRID_SEMANTIC_RATIO,
+        crop_words=config.CONTEXT_CROP_WORDS,
+        multi_query=config.MULTI_QUERY
+    )
+
+def read_questions(path: str) -> List[dict]:
+    """Read a JSONL batch of questions from `path` ("-" for stdin).
+
+    Each line is an object with a "question" and optionally an "id", which
+    defaults to the line number; other fields are copied to the output.
+    A line may also be just a JSON string.
+    """
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    records = []
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            print(f"Skipping line {number}: not JSON ({e})", file=sys.stderr)
+            continue
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not str(record.get("question") or "").strip():
+            print(f"Skipping line {number}: no question", file=sys.stderr)
+            continue
+        record["id"] = str(record.get("id", number))
+        if record["id"] in seen:
+            print(f"Skipping line {number}: duplicate id {record['id']}", file=sys.stderr)
+            continue
+        seen.add(record["id"])
+        records.append(record)
+    return records
+
+def answered_ids(path: str) -> Set[str]:
+    """Ids of the questions answered without error in an earlier run's output."""
+    answered = set()
+    if not os.path.exists(path):
+        return answered
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut off when the run was interrupted
+                continue
+            if isinstance(result, dict) and "id" in result and "error" not in result:
+                answered.add(str(result["id"]))
+    return answered
+
+async def answer_batch(llm_service: LLMService, records: List[dict], output: TextIO, args) -> int:
+    """Answer `records` at most `args.concurrency` at a time, writing each result as it completes.
+
+    Returns the number of questions that failed.
+    """
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failed = 0
+
+    async def answer(record: dict):
+        nonlocal failed
+        async with semaphore:
+            result = dict(record)
+            started = time.perf_counter()
+            with recording(LLM_STAGE_SECONDS) as timings:
+                try:
+                    response, hits = await llm_service.aanswer(
+                        record["question"],
+                        max_context_length=args.max_context,
+                        max_context_tokens=args.max_context_tokens,
+                        temperature=args.temperature
+                    )
+                    # The LLM client reports its errors as the answer
+                    result["error" if response.startswith("Error generating response") else "answer"] = response
+                    result["document_ids"] = [hit["id"] for hit in hits]
+                except Exception as e:
+                    result["error"] = str(e)
+            result["timings"] = {**timings, "total": time.perf_counter() - started}
+            if "error" in result:
+                failed += 1
+                print(f"Question {record['id']} failed: {result['error']}", file=sys.stderr)
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+    try:
+        await asyncio.gather(*(answer(record) for record in records))
+    finally:
+        # The async client's pool belongs to this event loop
+        await llm_service.llm_client.aclose()
+    return failed
+
+def run_batch(args):
+    """Answer a JSONL batch of questions concurrently and write JSONL results."""
+    records = read_questions(args.batch)
+    skipped = 0
+    if args.resume:
+        done = answered_ids(args.output)
+        skipped = sum(1 for record in records if record["id"] in done)
+        records = [record for record in records if record["id"] not in done]
+    print(f"Answering {len(records)} questions ({skipped} already answered)", file=sys.stderr)
+    if not records:
+        return
+
+    stdout = sys.stdout
+    # The services print diagnostics; they go to stderr so stdout only carries results
+    with contextlib.redirect_stdout(sys.stderr):
+        llm_service = build_llm_service(args)
+        started = time.perf_counter()
+        if args.output == "-":
+            failed = asyncio.run(answer_batch(llm_service, records, stdout, args))
+        else:
+            # A run killed mid-write can leave a partial last line to finish first
+            ends_cut_off = False
+            if args.resume and os.path.exists(args.output) and os.path.getsize(args.output):
+                with open(args.output, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    ends_cut_off = f.read(1) != b"\n"
+            with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+                if ends_cut_off:
+                    output.write("\n")
+                failed = asyncio.run(answer_batch(llm_service, records, output, args))
+    seconds = time.perf_counter() - started
+    print(f"Answered {len(records) - failed} of {len(records)} questions in {seconds:.1f}s, {failed} failed", file=sys.stderr)
+    if failed:
+        sys.exit(1)
 
 def main():
     parser = argparse.ArgumentParser(description='Query your Notion knowledge base using LLM')
     parser.add_argument('prompt', nargs='?', help='The question to ask. If not provided, will read from stdin.')
     parser.add_argument('--model', default='gpt-3.5-turbo', help='OpenAI model to use')
     parser.add_argument('--max-context', type=int, default=40000, help='Maximum context length in characters')
+    parser.add_argument('--max-context-tokens', type=int, default=config.CONTEXT_MAX_TOKENS,
+                        help='Maximum context length in model tokens (0 to use --max-context instead)')
     parser.add_argument('--temperature', type=float, default=0.7, help='Temperature for LLM generation')
+    parser.add_argument('--query-rewrite', choices=['fallback', 'always', 'never'], default=config.QUERY_REWRITE,
+                        help='When to ask the LLM to rewrite the question into search terms')
+    parser.add_argument('--batch', metavar='FILE', help='Answer the JSONL questions in FILE ("-" for stdin) instead of interactively')
+    parser.add_argument('--output', default='-', help='Where to write the batch results as JSONL (default: stdout)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Batch questions answered at once')
+    parser.add_argument('--resume', action='store_true', help='Skip the questions already answered in --output and append to it')
     
     args = parser.parse_args()
+    if args.batch:
+        if args.resume and args.output == '-':
+            parser.error('--resume needs an --output file')
+        if args.concurrency < 1:
+            parser.error('--concurrency must be at least 1')
+        run_batch(args)
+        return
     
-    search_indexer = SearchIndexer(host=config.MEILISEARCH_HOST, api_key=config.MEILISEARCH_KEY)
-    search_indexer.configure_search_settings()
-    llm_service = LLMService(
-        search_indexer=search_indexer,
-        llm_client=OpenAIClient(
-            model=args.model,
-            api_key=config.OPENAI_API_KEY
-        )
-    )
+    # Built on the first question, so the prompt appears without waiting on the services
+    llm_service = None
 
     # Interactive loop
     try:
@@ -46,9 +228,12 @@ def main():
 
             # Generate response
             try:
+                if llm_service is None:
+                    llm_service = build_llm_service(args)
                 response = llm_service.generate_response(
                     prompt,
                     max_context_length=args.max_context,
+                    max_context_tokens=args.max_context_tokens,
                     temperature=args.temperature
                 )
                 print("\nResponse:")
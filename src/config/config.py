@@ -5,10 +5,74 @@ load_dotenv()
 
 class Config:
     NOTION_API_KEY = os.getenv("NOTION_API_KEY")
+    NOTION_BASE_URL = os.getenv("NOTION_BASE_URL")  # Override to point at a local fake Notion server
+    NOTION_CONCURRENCY = int(os.getenv("NOTION_CONCURRENCY", "4"))
+    NOTION_REQUESTS_PER_SECOND = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+    NOTION_MAX_BLOCK_DEPTH = int(os.getenv("NOTION_MAX_BLOCK_DEPTH", "8"))
+    # Index database rows by querying each database in bulk rather than through the page crawl
+    NOTION_DATABASE_ROWS = os.getenv("NOTION_DATABASE_ROWS", "false").lower() == "true"
+    # Comma-separated IDs of databases whose rows have no block content worth fetching
+    NOTION_BODYLESS_DATABASES = [database_id.strip() for database_id in os.getenv("NOTION_BODYLESS_DATABASES", "").split(",") if database_id.strip()]
+    # Token Notion sends when a webhook subscription is created; webhook events are refused until it is set
+    NOTION_WEBHOOK_VERIFICATION_TOKEN = os.getenv("NOTION_WEBHOOK_VERIFICATION_TOKEN")
+    NOTION_WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv("NOTION_WEBHOOK_DEBOUNCE_SECONDS", "5"))
+    NOTION_WEBHOOK_MAX_DELAY_SECONDS = float(os.getenv("NOTION_WEBHOOK_MAX_DELAY_SECONDS", "60"))
     MEILISEARCH_HOST = os.getenv("MEILISEARCH_HOST", "http://localhost:7700")
     MEILISEARCH_KEY = os.getenv("MEILISEARCH_KEY")
+    # "page" indexes one document per page, "passage" one per heading-delimited passage
+    INDEX_MODE = os.getenv("INDEX_MODE", "page")
+    SEARCH_INDEX_NAME = "notion_passages" if INDEX_MODE == "passage" else "notion_pages"
+    PASSAGE_MAX_CHARS = int(os.getenv("PASSAGE_MAX_CHARS", "1500"))
     SYNC_INTERVAL_MINUTES = int(os.getenv("SYNC_INTERVAL_MINUTES", "60"))
+    SYNC_STATE_DIR = os.getenv("SYNC_STATE_DIR", ".sync")
+    # How often a running crawl saves a checkpoint to resume from; 0 disables checkpoints
+    SYNC_CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("SYNC_CHECKPOINT_INTERVAL_SECONDS", "60"))
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "50000"))
+    INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "1000"))
+    INDEX_BATCH_MAX_BYTES = int(os.getenv("INDEX_BATCH_MAX_BYTES", str(10 * 1024 * 1024)))
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Override to point at a local OpenAI-compatible server
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    # When to ask the LLM to rewrite questions into search terms: "fallback", "always" or "never"
+    QUERY_REWRITE = os.getenv("QUERY_REWRITE", "fallback")
+    QUERY_REWRITE_MIN_SCORE = float(os.getenv("QUERY_REWRITE_MIN_SCORE", "0.5"))
+    REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "1000"))
+    REWRITE_CACHE_TTL_SECONDS = int(os.getenv("REWRITE_CACHE_TTL_SECONDS", "3600"))
+    # Answer cache backend: "memory", "disk" (shared with the sync service) or "off"
+    ANSWER_CACHE = os.getenv("ANSWER_CACHE", "memory")
+    ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join(SYNC_STATE_DIR, "answers.sqlite3"))
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    # Context budget in model tokens, and words MeiliSearch crops each hit to (0 keeps whole content)
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "4000"))
+    CONTEXT_CROP_WORDS = int(os.getenv("CONTEXT_CROP_WORDS", "200"))
+    # Search several variants of each question in one multi-search request
+    MULTI_QUERY = os.getenv("MULTI_QUERY", "true").lower() == "true"
+    # "keyword" search, or "hybrid" keyword and vector search
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "keyword")
+    # Embedder for hybrid mode: "local" (deterministic, offline) or "openai"
+    EMBEDDER = os.getenv("EMBEDDER", "local")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "256"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    # Where vectors are kept: "meilisearch" or "local" (a NumPy file, needs numpy)
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "meilisearch")
+    VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", os.path.join(SYNC_STATE_DIR, "vectors.npz"))
+    # Weight of vector similarity against keyword relevance, from 0 to 1
+    HYBRID_SEMANTIC_RATIO = float(os.getenv("HYBRID_SEMANTIC_RATIO", "0.5"))
+    # Vector dimensions for indexes that store vectors in MeiliSearch
+    SEARCH_VECTOR_DIMENSIONS = EMBEDDING_DIMENSIONS if RETRIEVAL_MODE == "hybrid" and VECTOR_STORE == "meilisearch" else None
     SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
+    # Stream answers into Slack by editing a placeholder message as tokens arrive
+    SLACK_STREAMING = os.getenv("SLACK_STREAMING", "true").lower() == "true"
+    SLACK_UPDATE_INTERVAL_SECONDS = float(os.getenv("SLACK_UPDATE_INTERVAL_SECONDS", "1.0"))
+    SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api")
+    SLACK_CHANNEL_INTERVAL_SECONDS = float(os.getenv("SLACK_CHANNEL_INTERVAL_SECONDS", "1.0"))
+    SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "5"))
+    SLACK_RETRY_QUEUE_SIZE = int(os.getenv("SLACK_RETRY_QUEUE_SIZE", "100"))
+    SLACK_EVENT_WORKERS = int(os.getenv("SLACK_EVENT_WORKERS", "8"))
+    SLACK_EVENT_QUEUE_SIZE = int(os.getenv("SLACK_EVENT_QUEUE_SIZE", "100"))
+    SLACK_EVENT_DEDUPE_TTL_SECONDS = float(os.getenv("SLACK_EVENT_DEDUPE_TTL_SECONDS", "600"))
 
 config = Config()
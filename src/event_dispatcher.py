@@ -0,0 +1,172 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+class SeenSet:
+    """Remembers keys for `ttl_seconds`, holding at most `max_entries` of them."""
+
+    def __init__(self, ttl_seconds: float = 600.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._expires_at: "OrderedDict[str, float]" = OrderedDict()
+
+    def _purge(self, now: float):
+        while self._expires_at:
+            key, expires_at = next(iter(self._expires_at.items()))
+            if expires_at > now and len(self._expires_at) <= self.max_entries:
+                break
+            del self._expires_at[key]
+
+    def add_if_new(self, keys: Iterable[Optional[str]]) -> bool:
+        """Record `keys`; return False if any of them was seen already."""
+        now = time.monotonic()
+        self._purge(now)
+        keys = [key for key in keys if key]
+        if any(key in self._expires_at for key in keys):
+            return False
+        for key in keys:
+            self._expires_at[key] = now + self.ttl_seconds
+        return True
+
+    def discard(self, keys: Iterable[Optional[str]]):
+        for key in keys:
+            self._expires_at.pop(key, None)
+
+class EventDispatcher:
+    """Runs an async handler over submitted events with bounded concurrency.
+
+    Events wait in a queue of at most `max_queue` entries and are handled by
+    `concurrency` worker tasks. When the queue is full, `submit` refuses the
+    event so the caller can shed load instead of piling up work.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[None]], concurrency: int = 8, max_queue: int = 100):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._in_flight = 0
+        self._counters = {"accepted": 0, "shed": 0, "processed": 0, "errors": 0}
+
+    async def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, event: Dict[str, Any]) -> bool:
+        """Queue an event; return False if the queue is full and the event was shed."""
+        if self._queue is None:
+            raise RuntimeError("EventDispatcher.start() has not been called")
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._counters["shed"] += 1
+            return False
+        self._counters["accepted"] += 1
+        return True
+
+    def get_metrics(self) -> dict:
+        return {
+            **self._counters,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._in_flight
+        }
+
+    async def _worker(self):
+        while True:
+            event = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self.handler(event)
+                self._counters["processed"] += 1
+            except Exception as e:
+                self._counters["errors"] += 1
+                print(f"Error handling event: {e}")
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+class ChangeDebouncer:
+    """Coalesces change events per key and applies them once the key goes quiet.
+
+    A key is applied `debounce_seconds` after its last event, or at most
+    `max_delay_seconds` after its first, so a page edited continuously is
+    still picked up. Keys that are due together are applied in one call of
+    `apply(changed, deleted)`, one call at a time; the latest event for a
+    key decides whether it counts as changed or deleted.
+    """
+
+    def __init__(self, apply: Callable[[List[str], List[str]], Awaitable[None]], debounce_seconds: float = 5.0,
+                 max_delay_seconds: float = 60.0):
+        self.apply = apply
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._pending: Dict[str, list] = {}  # key -> [deleted, first event time, last event time]
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._counters = {"received": 0, "coalesced": 0, "applied": 0, "errors": 0}
+
+    async def start(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop applying changes; pending ones are left to the next sync."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending:
+            print(f"Dropping {len(self._pending)} pending page changes on shutdown")
+
+    def submit(self, key: str, deleted: bool = False):
+        now = time.monotonic()
+        self._counters["received"] += 1
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [deleted, now, now]
+        else:
+            self._counters["coalesced"] += 1
+            entry[0] = deleted
+            entry[2] = now
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def get_metrics(self) -> dict:
+        return {**self._counters, "pending": len(self._pending)}
+
+    def _due_at(self, entry: list) -> float:
+        return min(entry[2] + self.debounce_seconds, entry[1] + self.max_delay_seconds)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = [key for key, entry in self._pending.items() if self._due_at(entry) <= now]
+            if not due:
+                self._wakeup.clear()
+                timeout = min((self._due_at(entry) for entry in self._pending.values()), default=now + 3600) - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.01))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entries = {key: self._pending.pop(key) for key in due}
+            changed = [key for key, entry in entries.items() if not entry[0]]
+            deleted = [key for key, entry in entries.items() if entry[0]]
+            try:
+                await self.apply(changed, deleted)
+                self._counters["applied"] += len(entries)
+            except Exception as e:
+                self._counters["errors"] += 1
+                print(f"Error applying {len(entries)} page changes: {e}")
@@ -0,0 +1,120 @@
+import json
+import time
+from typing import Dict, List, Optional
+
+from .meilisearch_client import SearchIndexer
+
+class BulkIndexer:
+    """Buffers documents and sends them to MeiliSearch in batches.
+
+    Documents are collected until either `max_documents` or `max_bytes` of
+    JSON would be exceeded, then flushed as a single `add_documents` call.
+    The returned task uids are only recorded; `finish()` flushes the last
+    batch and checks all of them at once.
+
+    With a `replace_key` such as `page_id`, documents are grouped by that
+    attribute: each flush first deletes the documents already indexed for
+    the batch's keys, so a page that now has fewer passages leaves none
+    behind, and failures are reported per key rather than per document.
+    A page that no longer has any passages is passed as a key without
+    documents, so its old ones are still deleted.
+    """
+
+    def __init__(self, indexer: SearchIndexer, max_documents: int = 1000, max_bytes: int = 10 * 1024 * 1024,
+                 replace_key: Optional[str] = None):
+        self.indexer = indexer
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.replace_key = replace_key
+        self._buffer: List[dict] = []
+        self._buffer_keys: List[str] = []  # replace_key values of the buffer, including ones without documents
+        self._buffer_bytes = 0
+        self._tasks: Dict[int, List[str]] = {}  # task uid -> ids of the documents it carries, until waited for
+        self._task_count = 0
+        self._failed_ids: List[str] = []
+        self._failed_tasks: List[int] = []
+        self._document_count = 0
+        self._key_count = 0
+        self._started_at = time.monotonic()
+
+    def add(self, documents: List[dict], keys: Optional[List[str]] = None) -> bool:
+        """Buffer documents, flushing first if they would overflow the batch.
+
+        The documents of one call always go out in the same batch. With a
+        `replace_key`, `keys` are the values whose documents the call
+        replaces; they default to the documents' own.
+        """
+        size = sum(len(json.dumps(doc, ensure_ascii=False).encode("utf-8")) for doc in documents)
+        if self._buffer and (len(self._buffer) + len(documents) > self.max_documents or self._buffer_bytes + size > self.max_bytes):
+            self.flush()
+        self._buffer.extend(documents)
+        self._buffer_bytes += size
+        if self.replace_key:
+            self._buffer_keys.extend(keys if keys is not None else [doc[self.replace_key] for doc in documents])
+        return True
+
+    def flush(self):
+        """Send the buffered documents as one batch without waiting for the task."""
+        if not self._buffer and not self._buffer_keys:
+            return
+        batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        keys, self._buffer_keys = self._buffer_keys, []
+        ids = list(dict.fromkeys(keys if self.replace_key else [doc["id"] for doc in batch]))
+        self._document_count += len(batch)
+        self._key_count += len(ids)
+        try:
+            if self.replace_key:
+                # Queued before the additions, and MeiliSearch runs an index's tasks in order
+                self._tasks[self.indexer.delete_documents_where(self.replace_key, ids)] = ids
+                self._task_count += 1
+            if not batch:
+                return
+            task_uid = self.indexer.add_documents(batch)
+            self._tasks[task_uid] = ids
+            self._task_count += 1
+            print(f"Queued batch of {len(batch)} documents (task {task_uid})")
+        except Exception as e:
+            print(f"Error sending batch of {len(batch)} documents: {e}")
+            self._failed_ids.extend(ids)
+
+    def wait(self, timeout_seconds: float = 300.0) -> List[str]:
+        """Flush, wait for every task sent so far and return all ids that failed so far.
+
+        Unlike `finish`, the summary counters keep running.
+        """
+        self.flush()
+        statuses = self.indexer.wait_for_tasks(list(self._tasks), timeout_seconds=timeout_seconds)
+        for task_uid, ids in self._tasks.items():
+            if statuses.get(task_uid) != "succeeded":
+                self._failed_tasks.append(task_uid)
+                self._failed_ids.extend(ids)
+        self._tasks = {}
+        self._failed_ids = list(dict.fromkeys(self._failed_ids))
+        return list(self._failed_ids)
+
+    def finish(self, timeout_seconds: float = 300.0) -> dict:
+        """Flush remaining documents, wait for all tasks and return a summary.
+
+        The summary contains the number of documents sent, the uids of failed
+        tasks, the ids (or `replace_key` values) of documents that did not
+        make it into the index and
+        the indexing throughput in pages per second.
+        """
+        self.wait(timeout_seconds)
+
+        elapsed = time.monotonic() - self._started_at
+        indexed_count = max(self._key_count - len(self._failed_ids), 0)
+        summary = {
+            "documents": self._document_count,
+            "tasks": self._task_count,
+            "failed_tasks": list(self._failed_tasks),
+            "failed_ids": list(self._failed_ids),
+            "pages_per_second": indexed_count / elapsed if elapsed > 0 else 0.0
+        }
+        self._failed_ids = []
+        self._failed_tasks = []
+        self._task_count = 0
+        self._document_count = 0
+        self._key_count = 0
+        self._started_at = time.monotonic()
+        return summary
@@ -0,0 +1,49 @@
+from typing import List
+
+def split_into_passages(content: str, max_chars: int = 1500) -> List[dict]:
+    """Split page content into heading-aware passages.
+
+    A new passage starts at every Markdown heading line (`#`, `##`, `###`).
+    Sections longer than `max_chars` are split further at line boundaries.
+    Each passage carries the heading path it sits under as `section`.
+    """
+    passages = []
+    headings: List[str] = []
+    lines: List[str] = []
+    length = 0
+
+    def flush():
+        nonlocal lines, length
+        text = "\n".join(lines).strip()
+        if text:
+            passages.append({"section": " > ".join(headings), "content": text})
+        lines, length = [], 0
+
+    for line in content.split("\n"):
+        level = len(line) - len(line.lstrip("#"))
+        if 1 <= level <= 3 and line[level:level + 1] == " ":
+            flush()
+            headings = headings[:level - 1] + [line[level + 1:].strip()]
+        elif lines and length + len(line) > max_chars:
+            flush()
+        lines.append(line)
+        length += len(line) + 1
+    flush()
+    return passages
+
+def page_to_passages(doc: dict, max_chars: int = 1500) -> List[dict]:
+    """Turn a page document into passage documents for the passage index."""
+    return [
+        {
+            "id": f"{doc['id']}-{position}",
+            "page_id": doc["id"],
+            "title": doc["title"],
+            "url": doc["url"],
+            "hierarchy": doc["hierarchy"],
+            "section": passage["section"],
+            "content": passage["content"],
+            "position": position,
+            "content_hash": doc.get("content_hash")
+        }
+        for position, passage in enumerate(split_into_passages(doc["content"], max_chars))
+    ]
@@ -0,0 +1,85 @@
+from typing import List, Optional, Tuple
+
+from ..llm.embedder import EMBEDDER_NAME, Embedder, document_text
+from .bulk_indexer import BulkIndexer
+from .vector_index import LocalVectorIndex
+
+class EmbeddingIndexer:
+    """Embeds documents in batches on their way into a `BulkIndexer`.
+
+    Documents are held until `batch_size` of them are waiting, then embedded
+    with one call per batch. Vectors go into the documents' `_vectors` for
+    MeiliSearch, or into `vector_index` when one is given. The documents of
+    one `add` call are treated as one page: its previous vectors are replaced.
+
+    If embedding fails, the documents are still indexed for keyword search
+    and their pages reported as failed, so the next sync retries them.
+    """
+
+    def __init__(self, bulk_indexer: BulkIndexer, embedder: Embedder, vector_index: Optional[LocalVectorIndex] = None,
+                 batch_size: int = 64):
+        self.bulk_indexer = bulk_indexer
+        self.embedder = embedder
+        self.vector_index = vector_index
+        self.batch_size = batch_size
+        self._pending: List[Tuple[List[dict], Optional[List[str]]]] = []  # (documents, keys) per `add`
+        self._pending_count = 0
+        self._embedded = 0
+        self._failed_ids: List[str] = []
+
+    def add(self, documents: List[dict], keys: Optional[List[str]] = None) -> bool:
+        """Queue one page's documents; `keys` are passed on to `BulkIndexer.add`."""
+        self._pending.append((documents, keys))
+        self._pending_count += len(documents)
+        if self._pending_count >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        pages, self._pending, self._pending_count = self._pending, [], 0
+        documents = [doc for page, _ in pages for doc in page]
+        vectors = []
+        if documents:
+            try:
+                vectors = self.embedder.embed_batched([document_text(doc) for doc in documents], self.batch_size)
+            except Exception as e:
+                print(f"Error embedding {len(documents)} documents: {e}")
+                vectors = None
+                self._failed_ids.extend(_group(page[0]) for page, _ in pages if page)
+
+        position = 0
+        for page, keys in pages:
+            page_vectors = vectors[position:position + len(page)] if vectors is not None else None
+            position += len(page)
+            if not page:
+                # A page without documents only loses its old vectors
+                if self.vector_index is not None and keys:
+                    self.vector_index.remove_groups(keys)
+            elif page_vectors is not None:
+                self._embedded += len(page)
+                if self.vector_index is not None:
+                    self.vector_index.remove_groups([_group(doc) for doc in page])
+                    self.vector_index.upsert([doc["id"] for doc in page], page_vectors, [_group(doc) for doc in page])
+                else:
+                    page = [{**doc, "_vectors": {EMBEDDER_NAME: vector}} for doc, vector in zip(page, page_vectors)]
+            self.bulk_indexer.add(page, keys)
+
+    def wait(self, **kwargs) -> List[str]:
+        """Embed and index what is waiting, then wait for the indexing tasks sent so far.
+
+        Returns the page ids that failed to embed or index so far.
+        """
+        self.flush()
+        return list(dict.fromkeys(self.bulk_indexer.wait(**kwargs) + self._failed_ids))
+
+    def finish(self, **kwargs) -> dict:
+        """Embed and index what is left, then wait for the indexing tasks."""
+        self.flush()
+        summary = self.bulk_indexer.finish(**kwargs)
+        summary["embedded"] = self._embedded
+        summary["failed_ids"] = list(dict.fromkeys(summary["failed_ids"] + self._failed_ids))
+        return summary
+
+def _group(doc: dict) -> str:
+    # Passages belong to their page; whole-page documents to themselves
+    return doc.get("page_id", doc["id"])
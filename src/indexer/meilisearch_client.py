@@ -1,75 +1,268 @@
-from meilisearch import Client
+import hashlib
+import json
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from ..llm.embedder import EMBEDDER_NAME
+from ..metrics import INDEX_DOCUMENTS, INDEX_WRITE_SECONDS, timed
+
+if TYPE_CHECKING:
+    from meilisearch import Client
+
+# Search settings applied to every index we write to
+SEARCH_SETTINGS = {
+    # Add common English stop words
+    'stopWords': [
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to',
+        'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were'
+    ],
+
+    # Configure typo tolerance
+    'typoTolerance': {
+        'enabled': True,
+        'minWordSizeForTypos': {
+            'oneTypo': 5,    # Words must be at least 5 chars for 1 typo
+            'twoTypos': 9    # Words must be at least 9 chars for 2 typos
+        },
+        'disableOnWords': [], # Add specific words where typos should be disabled
+        'disableOnAttributes': [] # Add attributes where typos should be disabled
+    },
+    # Customize ranking rules if needed
+    'rankingRules': [
+        'words',
+        'typo',
+        'proximity',
+        'attribute',
+        'exactness'
+    ],
+
+    # Maybe add synonyms for common terms in your domain
+    'synonyms': {
+        'api': ['endpoint', 'service'],
+        'database': ['db', 'storage']
+    },
+
+    # Configure searchable attributes, most important first (MeiliSearch
+    # ranks matches by attribute order; it has no per-attribute boosts)
+    'searchableAttributes': [
+        'title',
+        'section',
+        'content',
+        'hierarchy'
+    ],
+
+    # Passages are replaced and collapsed per page; hybrid search looks
+    # up vector hits by id
+    'filterableAttributes': [
+        'id',
+        'page_id'
+    ]
+}
+
+# Settings MeiliSearch may not report in the order we sent them
+UNORDERED_SETTINGS = {"stopWords", "filterableAttributes", "synonyms", "disableOnWords", "disableOnAttributes"}
+
+def _project(desired: Any, reported: Any, unordered: bool = False) -> Any:
+    """Reduce `reported` to the keys of `desired`, sorting unordered lists."""
+    if isinstance(desired, dict):
+        reported = reported if isinstance(reported, dict) else {}
+        return {
+            key: _project(value, reported.get(key), unordered or key in UNORDERED_SETTINGS)
+            for key, value in desired.items()
+        }
+    if isinstance(reported, list) and unordered:
+        return sorted(reported)
+    return reported
+
+def settings_hash(desired: dict, reported: Optional[dict] = None) -> str:
+    """Hash the `desired` settings, or the part of `reported` that they cover."""
+    values = _project(desired, desired if reported is None else reported)
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], k: int = 60) -> List[dict]:
+    """Merge ranked hit lists by summing 1 / (k + rank) per document id.
+
+    Each fused hit keeps its best `_rankingScore` from any list, and gets
+    the fused score as `_fusionScore`.
+    """
+    fused: Dict[str, dict] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = {**hit, "_fusionScore": 0.0}
+            elif hit.get("_rankingScore", 0.0) > entry.get("_rankingScore", 0.0):
+                entry.update({**hit, "_fusionScore": entry["_fusionScore"]})
+            entry["_fusionScore"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["_fusionScore"], reverse=True)
 
 class SearchIndexer:
-    def __init__(self, host: str, api_key: str):
-        self.client = Client(host, api_key)
-        self.index_name = "notion_pages"
+    def __init__(self, host: str, api_key: str, index_name: str = "notion_pages", vector_dimensions: Optional[int] = None):
+        """Wrap one MeiliSearch index.
+
+        With `vector_dimensions`, the index also stores the vectors we compute
+        (a userProvided embedder) and can run hybrid searches.
+        """
+        self.host = host
+        self.api_key = api_key
+        self.index_name = index_name
+        self.vector_dimensions = vector_dimensions
+        self._client: Optional["Client"] = None
+        self._settings = None
+
+    @property
+    def client(self) -> "Client":
+        """MeiliSearch client, created (and the SDK imported) on first use."""
+        if self._client is None:
+            from meilisearch import Client
+            self._client = Client(self.host, self.api_key)
+        return self._client
+
+    def configure_search_settings(self, force: bool = False):
+        """Configure search settings for better relevancy.
 
-    def configure_search_settings(self):
-        """Configure search settings for better relevancy."""
+        Settings are only sent when the index reports settings that differ
+        from ours, since any update makes MeiliSearch re-process the index.
+        """
         try:
             index = self.client.index(self.index_name)
-            
-            # Update settings
-            index.update_settings({
-                # Add common English stop words
-                'stopWords': [
-                    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to',
-                    'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were'
-                ],
-                
-                # Configure typo tolerance
-                'typoTolerance': {
-                    'enabled': True,
-                    'minWordSizeForTypos': {
-                        'oneTypo': 5,    # Words must be at least 5 chars for 1 typo
-                        'twoTypos': 9    # Words must be at least 9 chars for 2 typos
-                    },
-                    'disableOnWords': [], # Add specific words where typos should be disabled
-                    'disableOnAttributes': [] # Add attributes where typos should be disabled
-                },                
-                # Customize ranking rules if needed
-                'rankingRules': [
-                    'words',
-                    'typo',
-                    'proximity',
-                    'attribute',
-                    'exactness'
-                ],
-                
-                # Maybe add synonyms for common terms in your domain
-                'synonyms': {
-                    'api': ['endpoint', 'service'],
-                    'database': ['db', 'storage']
-                },
-                
-                # Configure searchable attributes
-                'searchableAttributes': [
-                    'title^2',
-                    'content',
-                    'hierarchy'
-                ]
-            })
+            settings = self.search_settings()
+            desired = settings_hash(settings)
+            if not force:
+                try:
+                    current = settings_hash(settings, self.get_settings())
+                except Exception:
+                    # The index doesn't exist yet
+                    current = None
+                if current == desired:
+                    print("Search settings are up to date")
+                    return True
+
+            index.update_settings(settings)
+            self._settings = None
             print("Search settings updated successfully")
             return True
         except Exception as e:
             print(f"Error updating search settings: {e}")
             return False
 
+    def search_settings(self) -> dict:
+        """Settings for this index: ours, plus the embedder in hybrid mode."""
+        if not self.vector_dimensions:
+            return SEARCH_SETTINGS
+        return {
+            **SEARCH_SETTINGS,
+            'embedders': {
+                EMBEDDER_NAME: {'source': 'userProvided', 'dimensions': self.vector_dimensions}
+            }
+        }
+
     def index_pages(self, pages):
         try:
-            # Add documents and wait for the operation to complete
-            task = self.client.index(self.index_name).add_documents(pages)
-            # Check if documents were actually indexed
-            stats = self.client.index(self.index_name).get_stats()
-            print(f"Number of documents: {stats.number_of_documents}")
+            # Queue the documents; MeiliSearch indexes them asynchronously
+            self.add_documents(pages)
             return True
         except Exception as e:
             print(f"Error during indexing: {e}")
             return False
 
-    def search(self, query: str, limit: int = 10):
-        return self.client.index(self.index_name).search(query, {"limit": limit}) 
+    def add_documents(self, documents: List[dict]) -> int:
+        """Queue a batch of documents and return the MeiliSearch task uid."""
+        with timed(INDEX_WRITE_SECONDS, operation="add_documents"):
+            task = self.client.index(self.index_name).add_documents(documents, primary_key="id")
+        INDEX_DOCUMENTS.inc(len(documents))
+        return task.task_uid
+
+    def update_documents(self, documents: List[dict]) -> int:
+        """Queue a partial update: only the given fields of each document are replaced."""
+        with timed(INDEX_WRITE_SECONDS, operation="update_documents"):
+            task = self.client.index(self.index_name).update_documents(documents, primary_key="id")
+        INDEX_DOCUMENTS.inc(len(documents))
+        return task.task_uid
+
+    def get_documents_where(self, attribute: str, values: List[str], fields: List[str]) -> List[dict]:
+        """Every document whose `attribute` is one of `values`, with only `fields` (MeiliSearch 1.2+)."""
+        if not values:
+            return []
+        quoted = ", ".join(f'"{value}"' for value in values)
+        documents = []
+        while True:
+            page = self.client.index(self.index_name).get_documents({
+                "filter": f"{attribute} IN [{quoted}]", "fields": fields, "limit": 1000, "offset": len(documents)
+            })
+            documents.extend({field: getattr(doc, field, None) for field in fields} for doc in page.results)
+            if not page.results or len(documents) >= page.total:
+                return documents
+
+    def delete_documents_where(self, attribute: str, values: List[str]) -> int:
+        """Queue deletion of every document whose `attribute` is one of `values`."""
+        quoted = ", ".join(f'"{value}"' for value in values)
+        with timed(INDEX_WRITE_SECONDS, operation="delete_documents"):
+            task = self.client.index(self.index_name).delete_documents(filter=f"{attribute} IN [{quoted}]")
+        return task.task_uid
+
+    def wait_for_tasks(self, task_uids: List[int], timeout_seconds: float = 300.0, interval_seconds: float = 0.5) -> Dict[int, str]:
+        """Poll the given tasks until they finish and return their statuses.
+
+        Tasks are looked up in chunks so a whole sync needs only a handful of
+        requests. Tasks still pending at the timeout keep their last status.
+        """
+        with timed(INDEX_WRITE_SECONDS, operation="wait_for_tasks"):
+            return self._poll_tasks(task_uids, timeout_seconds, interval_seconds)
+
+    def _poll_tasks(self, task_uids: List[int], timeout_seconds: float, interval_seconds: float) -> Dict[int, str]:
+        statuses = {uid: "enqueued" for uid in task_uids}
+        pending = list(task_uids)
+        deadline = time.monotonic() + timeout_seconds
+        while pending:
+            for start in range(0, len(pending), 100):
+                chunk = pending[start:start + 100]
+                for task in self.client.get_tasks({"uids": [str(uid) for uid in chunk], "limit": len(chunk)}).results:
+                    statuses[task.uid] = task.status
+                    if task.status == "failed":
+                        print(f"Indexing task {task.uid} failed: {task.error}")
+            pending = [uid for uid in pending if statuses[uid] in ("enqueued", "processing")]
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(interval_seconds)
+        return statuses
+
+    def search(self, query: str, limit: int = 10, options: Optional[dict] = None):
+        return self.client.index(self.index_name).search(query, {"limit": limit, **(options or {})})
+
+    def hybrid_search(self, query: str, vector: List[float], semantic_ratio: float = 0.5, limit: int = 10,
+                      options: Optional[dict] = None):
+        """Search by keywords and by `vector` at once; MeiliSearch fuses the rankings."""
+        return self.search(query, limit=limit, options={
+            "vector": vector,
+            "hybrid": {"embedder": EMBEDDER_NAME, "semanticRatio": semantic_ratio},
+            **(options or {})
+        })
+
+    def multi_search(self, queries: List[dict], limit: int = 10) -> List[dict]:
+        """Run several searches on this index in one request.
+
+        Each query is a dict of search parameters with at least `q`; the
+        results come back in the same order.
+        """
+        response = self.client.multi_search([
+            {"indexUid": self.index_name, "limit": limit, **query} for query in queries
+        ])
+        return response["results"]
+
+    def get_documents_by_id(self, ids: List[str]) -> Dict[str, dict]:
+        """Fetch documents by id, skipping ids that are no longer indexed."""
+        if not ids:
+            return {}
+        quoted = ", ".join(f'"{doc_id}"' for doc_id in ids)
+        results = self.search("", limit=len(ids), options={"filter": f"id IN [{quoted}]"})
+        return {hit["id"]: hit for hit in results["hits"]}
+
+    def get_settings(self) -> dict:
+        """Return the index settings, fetched once per indexer."""
+        if self._settings is None:
+            self._settings = self.client.index(self.index_name).get_settings()
+        return self._settings
     
     def clear_index(self):
         try:
@@ -87,4 +280,41 @@ class SearchIndexer:
             return True
         except Exception as e:
             print(f"Error clearing and recreating index: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def create_shadow_index(self) -> "SearchIndexer":
+        """Create a new, versioned index with our search settings for a rebuild.
+
+        Returns an indexer that writes into the shadow index. Once it is fully
+        populated, `swap_in` puts it in place of the live index.
+        """
+        shadow_name = f"{self.index_name}_{time.strftime('%Y%m%d%H%M%S')}"
+        self._wait(self.client.create_index(shadow_name, {"primaryKey": "id"}).task_uid)
+        shadow = SearchIndexer(self.host, self.api_key, index_name=shadow_name, vector_dimensions=self.vector_dimensions)
+        if not shadow.configure_search_settings():
+            raise RuntimeError(f"Could not configure shadow index {shadow_name}")
+        print(f"Created shadow index {shadow_name}")
+        return shadow
+
+    def swap_in(self, shadow: "SearchIndexer"):
+        """Atomically replace the live index with `shadow`, then drop the old data.
+
+        Searches keep hitting the complete old index until MeiliSearch applies
+        the swap, and the rebuilt index from then on.
+        """
+        try:
+            self.client.get_index(self.index_name)
+        except Exception:
+            # Swapping requires both indexes to exist
+            self._wait(self.client.create_index(self.index_name, {"primaryKey": "id"}).task_uid)
+        self._wait(self.client.swap_indexes([{"indexes": [self.index_name, shadow.index_name]}]).task_uid)
+        print(f"Swapped {shadow.index_name} into {self.index_name}")
+        # After the swap the shadow name holds the previous documents
+        self._wait(self.client.delete_index(shadow.index_name).task_uid)
+        print(f"Dropped previous index data ({shadow.index_name})")
+
+    def _wait(self, task_uid: int, timeout_seconds: float = 300.0):
+        task = self.client.wait_for_task(task_uid, timeout_in_ms=int(timeout_seconds * 1000))
+        if task.status != "succeeded":
+            raise RuntimeError(f"MeiliSearch task {task_uid} {task.status}: {task.error}")
+        return task
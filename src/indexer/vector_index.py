@@ -0,0 +1,122 @@
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("VECTOR_STORE=local needs NumPy; install it with `pip install numpy`") from None
+    return numpy
+
+class LocalVectorIndex:
+    """Document vectors kept in memory and in a NumPy file, searched by cosine similarity.
+
+    Each vector belongs to a group, the page it was cut from, so all of a
+    page's passages can be replaced when it changes. The file is written by
+    the sync process; a searching process reloads it when it changes on disk.
+    """
+
+    def __init__(self, path: str, dimensions: int):
+        self.path = path
+        self.dimensions = dimensions
+        self._np = _numpy()
+        self._entries: Dict[str, Tuple[str, "numpy.ndarray"]] = {}  # id -> (group, unit vector)
+        self._matrix = None  # (ids, stacked vectors), rebuilt after changes
+        self._mtime: Optional[float] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        with self._lock:
+            self._entries = {}
+            self._matrix = None
+            self._dirty = False
+            if not os.path.exists(self.path):
+                return
+            with self._np.load(self.path, allow_pickle=False) as data:
+                for doc_id, group, vector in zip(data["ids"].tolist(), data["groups"].tolist(), data["vectors"]):
+                    self._entries[doc_id] = (group, vector)
+            self._mtime = os.path.getmtime(self.path)
+            print(f"Loaded {len(self._entries)} vectors from {self.path}")
+
+    def reset(self):
+        """Forget every vector; the next `save` writes an empty index."""
+        with self._lock:
+            self._entries = {}
+            self._matrix = None
+            self._dirty = True
+
+    def save(self):
+        """Write the vectors atomically, if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            np = self._np
+            ids = list(self._entries)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    ids=np.array(ids, dtype=str),
+                    groups=np.array([self._entries[doc_id][0] for doc_id in ids], dtype=str),
+                    vectors=self._stack([self._entries[doc_id][1] for doc_id in ids])
+                )
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+            self._dirty = False
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], groups: Optional[List[str]] = None):
+        np = self._np
+        with self._lock:
+            for doc_id, group, vector in zip(ids, groups or ids, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                self._entries[doc_id] = (group, vector / norm if norm else vector)
+            self._matrix = None
+            self._dirty = True
+
+    def remove_groups(self, groups: Iterable[str]):
+        groups = set(groups)
+        with self._lock:
+            removed = [doc_id for doc_id, (group, _) in self._entries.items() if group in groups]
+            for doc_id in removed:
+                del self._entries[doc_id]
+            if removed:
+                self._matrix = None
+                self._dirty = True
+
+    def search(self, vector: List[float], limit: int = 10) -> List[Tuple[str, float]]:
+        """Return up to `limit` (id, cosine similarity) pairs, most similar first."""
+        self._reload_if_changed()
+        np = self._np
+        with self._lock:
+            if self._matrix is None:
+                ids = list(self._entries)
+                self._matrix = (ids, self._stack([self._entries[doc_id][1] for doc_id in ids]))
+            ids, matrix = self._matrix
+        if not ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = matrix @ (query / norm if norm else query)
+        top = np.argsort(-scores)[:limit]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime and not self._dirty:
+            self.load()
+
+    def _stack(self, vectors: list):
+        if not vectors:
+            return self._np.zeros((0, self.dimensions), dtype=self._np.float32)
+        return self._np.stack(vectors).astype(self._np.float32)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+def normalize_query(query: str) -> str:
+    """Normalize a question for use as a cache key."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.").strip().lower()
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries expire after `ttl_seconds`."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+class ResponseCache(ABC):
+    """Cache of generated answers, invalidated when a contributing document changes.
+
+    Keys cover everything that shapes an answer: the normalized question,
+    the model and generation settings, and the ids and content hashes of the
+    documents retrieved as context. Each entry also remembers its document
+    ids so `invalidate_documents` can drop answers built from changed pages.
+    """
+
+    @staticmethod
+    def make_key(question: str, hits: List[Dict], **settings) -> str:
+        payload = {
+            "question": normalize_query(question),
+            "documents": [[hit.get("id"), hit.get("content_hash")] for hit in hits],
+            "settings": settings
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, answer: str, document_ids: Iterable[str]):
+        pass
+
+    @abstractmethod
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """Drop every answer built from one of `document_ids`; return how many."""
+        pass
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU answer cache."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400.0):
+        self._answers = TTLCache(max_entries, ttl_seconds)
+        self._keys_by_document: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._answers.get(key)
+
+    def set(self, key: str, answer: str, document_ids: Iterable[str]):
+        self._answers.set(key, answer)
+        with self._lock:
+            for document_id in document_ids:
+                self._keys_by_document.setdefault(document_id, set()).add(key)
+            if len(self._keys_by_document) > 4 * self._answers.max_entries:
+                # Forget keys of answers the LRU has already evicted
+                self._keys_by_document = {
+                    document_id: live
+                    for document_id, keys in self._keys_by_document.items()
+                    if (live := {key for key in keys if key in self._answers})
+                }
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for document_id in document_ids:
+                for key in self._keys_by_document.pop(document_id, ()):
+                    removed += self._answers.delete(key)
+        return removed
+
+class SqliteResponseCache(ResponseCache):
+    """On-disk answer cache shared between processes.
+
+    The sync service and the server can point at the same file, so pages
+    re-indexed by a sync invalidate the answers the server has cached.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: float = 86400.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS answer_documents (document_id TEXT NOT NULL, key TEXT NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS answer_documents_by_document ON answer_documents (document_id)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT answer FROM answers WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, answer: str, document_ids: Iterable[str]):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO answers (key, answer, created_at) VALUES (?, ?, ?)", (key, answer, time.time()))
+            self._db.execute("DELETE FROM answer_documents WHERE key = ?", (key,))
+            self._db.executemany("INSERT INTO answer_documents (document_id, key) VALUES (?, ?)", [(document_id, key) for document_id in document_ids])
+            # Expire old answers and keep the table bounded
+            self._db.execute(
+                "DELETE FROM answers WHERE created_at < ? OR key NOT IN (SELECT key FROM answers ORDER BY created_at DESC LIMIT ?)",
+                (time.time() - self.ttl_seconds, self.max_entries)
+            )
+            self._db.execute("DELETE FROM answer_documents WHERE key NOT IN (SELECT key FROM answers)")
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        document_ids = list(document_ids)
+        removed = 0
+        with self._lock, self._db:
+            for start in range(0, len(document_ids), 500):
+                chunk = document_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                keys = [row[0] for row in self._db.execute(f"SELECT DISTINCT key FROM answer_documents WHERE document_id IN ({placeholders})", chunk)]
+                for key in keys:
+                    removed += self._db.execute("DELETE FROM answers WHERE key = ?", (key,)).rowcount
+                    self._db.execute("DELETE FROM answer_documents WHERE key = ?", (key,))
+        return removed
+
+def create_response_cache(backend: str, path: str, max_entries: int, ttl_seconds: float) -> Optional[ResponseCache]:
+    """Build the answer cache for a `backend` of "memory", "disk" or "off"."""
+    if backend == "memory":
+        return MemoryResponseCache(max_entries, ttl_seconds)
+    if backend == "disk":
+        return SqliteResponseCache(path, max_entries, ttl_seconds)
+    return None
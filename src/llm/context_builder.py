@@ -0,0 +1,92 @@
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+SEPARATOR = "\n\n---\n\n"
+
+@lru_cache(maxsize=None)
+def _encoding(model: Optional[str]):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its encodings on first use, which fails offline
+        return None
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the model tokens in `text`, or estimate them if tiktoken is not installed."""
+    encoding = _encoding(model)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def shingles(text: str, size: int = 5) -> Set[str]:
+    """The set of `size`-word sequences in `text`."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def jaccard(first: Set[str], second: Set[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+def cropped_content(hit: Dict) -> str:
+    """A hit's content, preferring the snippet MeiliSearch cropped around the matches."""
+    return (hit.get('_formatted') or {}).get('content') or hit.get('content') or ""
+
+def snippet_text(hit: Dict) -> str:
+    """The text of a hit to put in the context, under its title."""
+    text = cropped_content(hit)
+    if hit.get('title') and not text.startswith("#"):
+        text = f"# {hit['title']}\n\n{text}"
+    return text
+
+class ContextBuilder:
+    """Packs search hits into a context of at most `max_tokens` model tokens.
+
+    Hits are taken greedily by ranking score per token, so a large page that
+    doesn't fit is skipped in favor of smaller relevant ones rather than
+    ending the context. Hits that mostly repeat one already taken (by word
+    shingle Jaccard similarity) are dropped. The chosen hits keep their
+    search order in the context.
+    """
+
+    def __init__(self, max_tokens: int, model: Optional[str] = None, duplicate_threshold: float = 0.8):
+        self.max_tokens = max_tokens
+        self.model = model
+        self.duplicate_threshold = duplicate_threshold
+
+    def build(self, hits: List[Dict]) -> str:
+        separator_tokens = count_tokens(SEPARATOR, self.model)
+        candidates = []
+        for rank, hit in enumerate(hits):
+            text = snippet_text(hit)
+            if not text.strip():
+                continue
+            tokens = count_tokens(text, self.model) + separator_tokens
+            candidates.append((hit.get('_rankingScore', 1.0) / tokens, rank, hit, text, tokens))
+
+        chosen = []
+        chosen_shingles = []
+        used_tokens = 0
+        for _, rank, hit, text, tokens in sorted(candidates, key=lambda candidate: (-candidate[0], candidate[1])):
+            if used_tokens + tokens > self.max_tokens:
+                continue
+            # Compare content only, so copies under different titles still match
+            content_shingles = shingles(cropped_content(hit))
+            if any(jaccard(content_shingles, other) >= self.duplicate_threshold for other in chosen_shingles):
+                continue
+            chosen.append((rank, text))
+            chosen_shingles.append(content_shingles)
+            used_tokens += tokens
+        return SEPARATOR.join(text for _, text in sorted(chosen))
@@ -0,0 +1,90 @@
+import hashlib
+import math
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+# Name of the embedder in the MeiliSearch settings and in documents' `_vectors`
+EMBEDDER_NAME = "notion"
+
+def document_text(doc: dict, max_chars: int = 8000) -> str:
+    """Text of a document to embed: where it lives, its title and its content."""
+    parts = [doc.get("hierarchy") or "", doc.get("title") or "", doc.get("section") or "", doc.get("content") or ""]
+    return "\n".join(part for part in parts if part)[:max_chars]
+
+class Embedder(ABC):
+    """Turns texts into fixed-size vectors for semantic search."""
+
+    dimensions: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts, returning one vector per text."""
+        pass
+
+    def embed_batched(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        """Embed any number of texts in batches of at most `batch_size`."""
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(self.embed(texts[start:start + batch_size]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+class HashingEmbedder(Embedder):
+    """Deterministic local embedder for offline use and tests.
+
+    Words and word pairs are hashed into `dimensions` buckets with a random
+    sign and the counts normalized, so texts sharing vocabulary end up close.
+    It needs no model or network, at the cost of knowing nothing about
+    meaning beyond shared words.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = [word for word in re.findall(r"\w+", text.lower()) if len(word) > 2]
+        for feature in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+class OpenAIEmbedder(Embedder):
+    """Embeds texts with the OpenAI embeddings API."""
+
+    def __init__(self, model: str = "text-embedding-3-small", dimensions: int = 256, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None, timeout: float = 60.0):
+        self.model = model
+        self.dimensions = dimensions
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+        return self._client
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts, dimensions=self.dimensions)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def create_embedder(backend: str, dimensions: int = 256, model: str = "text-embedding-3-small",
+                    api_key: Optional[str] = None, base_url: Optional[str] = None) -> Embedder:
+    """Build the embedder named by `backend`: "local" or "openai"."""
+    if backend == "local":
+        return HashingEmbedder(dimensions)
+    if backend == "openai":
+        return OpenAIEmbedder(model, dimensions, api_key=api_key, base_url=base_url)
+    raise ValueError(f"Unknown embedder {backend!r}")
@@ -1,7 +1,12 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 import os
-from openai import OpenAI
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+SYSTEM_PROMPT = "You are a helpful assistant that answers questions based on the provided context."
 
 class LLMClient(ABC):
     """Abstract base class for LLM clients."""
@@ -11,30 +16,118 @@ class LLMClient(ABC):
         """Generate a response from the LLM."""
         pass
 
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate a response without blocking the event loop.
+
+        Clients without a native async API run `generate` in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate, prompt, **kwargs)
+
+    async def astream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Yield the response as it is generated.
+
+        Clients without streaming support yield the whole response at once.
+        """
+        yield await self.agenerate(prompt, **kwargs)
+
+    async def aclose(self):
+        """Release pooled connections."""
+        pass
+
 class OpenAIClient(LLMClient):
     """OpenAI ChatGPT implementation of LLMClient."""
     
-    def __init__(self, model: str = "gpt-3.5-turbo", api_key: Optional[str] = None):
+    def __init__(self, model: str = "gpt-3.5-turbo", api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = 60.0, max_connections: int = 100):
         """Initialize the OpenAI client.
         
         Args:
             model: The model to use (e.g., "gpt-3.5-turbo", "gpt-4")
             api_key: Optional API key. If not provided, will use OPENAI_API_KEY env var.
+            base_url: Optional API root, e.g. a local OpenAI-compatible mock server
+            timeout: Default request timeout in seconds; pass `timeout=` to override per request
+            max_connections: Size of the connection pool shared by async requests
         """
         self.model = model
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional["OpenAI"] = None
+        self._async_client: Optional["AsyncOpenAI"] = None
+
+    # The openai package is slow to import, so it is loaded on first request
+
+    @property
+    def client(self) -> "OpenAI":
+        """Blocking client, created on first use."""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+        return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """Async client sharing one pooled HTTP connection pool across requests."""
+        if self._async_client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+                )
+            )
+        return self._async_client
+
+    def _messages(self, prompt: str) -> list:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
         
     def generate(self, prompt: str, **kwargs) -> str:
         """Generate a response using OpenAI's API."""
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._messages(prompt),
                 **kwargs
             )
             return response.choices[0].message.content
         except Exception as e:
-            return f"Error generating response: {str(e)}"
\ No newline at end of file
+            return f"Error generating response: {str(e)}"
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate a response using OpenAI's API without blocking the event loop."""
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt),
+                **kwargs
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+
+    async def astream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Yield response tokens as OpenAI streams them."""
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt),
+                stream=True,
+                **kwargs
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
@@ -1,37 +1,341 @@
-from typing import List, Dict, Optional
-from ..indexer.meilisearch_client import SearchIndexer
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from ..indexer.meilisearch_client import SearchIndexer, reciprocal_rank_fusion
+from ..indexer.vector_index import LocalVectorIndex
+from .cache import ResponseCache, TTLCache, normalize_query
+from .context_builder import ContextBuilder, cropped_content
+from .embedder import EMBEDDER_NAME, Embedder
 from .llm_client import LLMClient, OpenAIClient
+from .query_terms import QueryTermExtractor
 from ..config.config import config
+from ..metrics import ANSWER_CACHE_REQUESTS, LLM_STAGE_SECONDS, timed
 
 class LLMService:
-    def __init__(self, search_indexer: SearchIndexer, llm_client: Optional[LLMClient] = None):
+    def __init__(self, search_indexer: SearchIndexer, llm_client: Optional[LLMClient] = None,
+                 passage_mode: bool = False, passages_per_page: int = 3,
+                 query_rewrite: str = "fallback", rewrite_min_score: float = 0.5,
+                 rewrite_cache: Optional[TTLCache] = None, response_cache: Optional[ResponseCache] = None,
+                 embedder: Optional[Embedder] = None, vector_index: Optional[LocalVectorIndex] = None,
+                 semantic_ratio: float = 0.5, crop_words: int = 0, multi_query: bool = False):
+        """Create the question answering service.
+
+        Args:
+            search_indexer: Indexer to retrieve context from
+            llm_client: LLM used for query rewriting and answers
+            passage_mode: Whether the index holds passages rather than whole pages
+            passages_per_page: Most passages of a single page used as context
+            query_rewrite: When to ask the LLM for search terms: "fallback" (only
+                when the locally extracted terms find weak hits), "always" or "never"
+            rewrite_min_score: Top ranking score below which local hits are weak
+            rewrite_cache: Cache of LLM rewrites keyed by normalized question
+            response_cache: Optional cache of generated answers
+            embedder: Enables hybrid search, embedding questions with it
+            vector_index: Local vectors to search; without one, MeiliSearch
+                stores the vectors and runs the hybrid search
+            semantic_ratio: Weight of vector similarity against keyword relevance
+            crop_words: If set, MeiliSearch crops each hit's content to a snippet
+                of about this many words around the matches
+            multi_query: Search several variants of each query in one
+                multi-search request and merge them by reciprocal-rank fusion
+        """
         self.search_indexer = search_indexer
         self.llm_client = llm_client or OpenAIClient(api_key=config.OPENAI_API_KEY)
+        self.passage_mode = passage_mode
+        self.passages_per_page = passages_per_page
+        self.query_rewrite = query_rewrite
+        self.rewrite_min_score = rewrite_min_score
+        self.rewrite_cache = rewrite_cache if rewrite_cache is not None else TTLCache()
+        self.response_cache = response_cache
+        self.term_extractor = QueryTermExtractor(search_indexer)
+        self.embedder = embedder
+        self.vector_index = vector_index
+        self.semantic_ratio = semantic_ratio
+        self.crop_words = crop_words
+        self.multi_query = multi_query
+        self._query_vectors = TTLCache()
 
-    def get_context_for_llm(self, query: str, max_context_length: int = 40000) -> str:
-        """Get relevant context from MeiliSearch for the LLM."""
+    def rewrite_query(self, query: str) -> str:
+        """Ask the LLM to translate a question into search terms, memoized per question."""
+        key = normalize_query(query)
+        terms = self.rewrite_cache.get(key)
+        if terms is None:
+            with timed(LLM_STAGE_SECONDS, stage="rewrite"):
+                response = self.llm_client.generate(prompt=self._rewrite_prompt(query))
+            terms = self._remember_rewrite(key, query, response)
+        return terms
+
+    async def arewrite_query(self, query: str) -> str:
+        """Async variant of `rewrite_query`."""
+        key = normalize_query(query)
+        terms = self.rewrite_cache.get(key)
+        if terms is None:
+            with timed(LLM_STAGE_SECONDS, stage="rewrite"):
+                response = await self.llm_client.agenerate(prompt=self._rewrite_prompt(query))
+            terms = self._remember_rewrite(key, query, response)
+        return terms
 
+    @staticmethod
+    def _rewrite_prompt(query: str) -> str:
         #translate the query into searchable terms
-        terms = self.llm_client.generate(prompt=f"Note that your output will be consumed by a machine. You must only return the requested data as a csv or list, without any comentary whatsoever.Translate the following query into searchable terms prioritizing words will yield results that get to the heart of what is being asked: {query}")
-        # Get more results than needed to ensure we have enough content
-        results = self.search_indexer.search(terms, limit=5)
-        context = []
-        current_length = 0
-        for hit in results['hits']:
-            content = hit['content']
-
-            if current_length + len(content) > max_context_length:
-                break
-                
-            context.append(content)
-            current_length += len(content)
-        
-        return "\n\n---\n\n".join(context)
-
-    def generate_response(self, user_prompt: str, max_context_length: int = 40000, **kwargs) -> str:
-        """Generate a response using the LLM with context from MeiliSearch."""
-        # Get relevant context from MeiliSearch
-        context = self.get_context_for_llm(user_prompt, max_context_length)
+        return f"Note that your output will be consumed by a machine. You must only return the requested data as a csv or list, without any comentary whatsoever.Translate the following query into searchable terms prioritizing words will yield results that get to the heart of what is being asked: {query}"
+
+    def _remember_rewrite(self, key: str, query: str, terms: str) -> str:
+        if terms.startswith("Error generating response"):
+            return query
+        self.rewrite_cache.set(key, terms)
+        return terms
+
+    def search(self, query: str) -> List[Dict]:
+        """Find the hits to build context from.
+
+        Search terms are extracted locally; the LLM rewrite is only used when
+        those terms find nothing convincing, unless configured otherwise.
+        """
+        if self.query_rewrite == "always":
+            return self._search_terms(self.rewrite_query(query), query)['hits']
+
+        with timed(LLM_STAGE_SECONDS, stage="extract_terms"):
+            terms = self.term_extractor.extract(query) or query
+        results = self._search_terms(terms, query)
+        if self.query_rewrite == "fallback" and self._is_weak(results):
+            rewritten = self._search_terms(self.rewrite_query(query), query)
+            if self._top_score(rewritten) > self._top_score(results):
+                results = rewritten
+        return results['hits']
+
+    async def asearch(self, query: str) -> List[Dict]:
+        """Async variant of `search`; MeiliSearch calls run in worker threads."""
+        if self.query_rewrite == "always":
+            return (await asyncio.to_thread(self._search_terms, await self.arewrite_query(query), query))['hits']
+
+        with timed(LLM_STAGE_SECONDS, stage="extract_terms"):
+            terms = await asyncio.to_thread(self.term_extractor.extract, query) or query
+        results = await asyncio.to_thread(self._search_terms, terms, query)
+        if self.query_rewrite == "fallback" and self._is_weak(results):
+            rewritten = await asyncio.to_thread(self._search_terms, await self.arewrite_query(query), query)
+            if self._top_score(rewritten) > self._top_score(results):
+                results = rewritten
+        return results['hits']
+
+    def _search_terms(self, terms: str, question: Optional[str] = None) -> Dict:
+        # Fetch more passages than pages, then collapse them per page; for
+        # whole pages, get more results than needed to ensure enough content
+        limit = 20 if self.passage_mode else 5
+        options = {"showRankingScore": True}
+        if self.crop_words:
+            options.update({"attributesToCrop": ["content"], "cropLength": self.crop_words})
+        with timed(LLM_STAGE_SECONDS, stage="search"):
+            if self.multi_query and question:
+                results = self._multi_search(terms, question, limit, options)
+            elif self.embedder is not None and question:
+                results = self._hybrid_search(terms, question, limit, options)
+            else:
+                results = self.search_indexer.search(terms, limit=limit, options=options)
+        if self.passage_mode:
+            return {**results, 'hits': self._collapse_passages(results['hits'])}
+        return results
+
+    def _hybrid_search(self, terms: str, question: str, limit: int, options: Dict) -> Dict:
+        """Search by `terms` and by similarity to the question, fusing both rankings.
+
+        MeiliSearch fuses them itself when it stores the vectors. With a local
+        vector index, the scores are combined here: keyword relevance and
+        cosine similarity, weighted by `semantic_ratio`.
+        """
+        vector = self._query_vector(question)
+        if self.vector_index is None:
+            return self.search_indexer.hybrid_search(terms, vector, self.semantic_ratio, limit=limit, options=options)
+
+        results = self.search_indexer.search(terms, limit=limit, options=options)
+        documents = {hit['id']: hit for hit in results['hits']}
+        scores = {doc_id: (1 - self.semantic_ratio) * hit.get('_rankingScore', 1.0) for doc_id, hit in documents.items()}
+        similar = self.vector_index.search(vector, limit)
+        for doc_id, similarity in similar:
+            scores[doc_id] = scores.get(doc_id, 0.0) + self.semantic_ratio * max(similarity, 0.0)
+        # Vector hits the keyword search missed still have to be fetched
+        documents.update(self.search_indexer.get_documents_by_id([doc_id for doc_id, _ in similar if doc_id not in documents]))
+        ranked = sorted((doc_id for doc_id in scores if doc_id in documents), key=scores.get, reverse=True)
+        return {**results, 'hits': [{**documents[doc_id], '_rankingScore': scores[doc_id]} for doc_id in ranked[:limit]]}
+
+    def _multi_search(self, terms: str, question: str, limit: int, options: Dict) -> Dict:
+        """Search variants of the query in one request and fuse their rankings.
+
+        The variants are the search terms, the question as asked, and the
+        terms matched against titles only and against the page hierarchy
+        only. In hybrid mode the question is also matched by its embedding.
+        """
+        variants = [
+            {"q": terms},
+            {"q": question},
+            {"q": terms, "attributesToSearchOn": ["title"]},
+            {"q": terms, "attributesToSearchOn": ["hierarchy"]}
+        ]
+        if self.embedder is not None and self.vector_index is None:
+            variants[1].update({
+                "vector": self._query_vector(question),
+                "hybrid": {"embedder": EMBEDDER_NAME, "semanticRatio": self.semantic_ratio}
+            })
+        # The terms are often the question itself
+        unique = list({json.dumps(variant, sort_keys=True): variant for variant in variants}.values())
+        result_lists = [results['hits'] for results in self.search_indexer.multi_search(
+            [{**options, **variant} for variant in unique], limit=limit
+        )]
+
+        if self.embedder is not None and self.vector_index is not None:
+            similar = self.vector_index.search(self._query_vector(question), limit)
+            documents = {hit['id']: hit for hits in result_lists for hit in hits}
+            documents.update(self.search_indexer.get_documents_by_id([doc_id for doc_id, _ in similar if doc_id not in documents]))
+            result_lists.append([
+                {**documents[doc_id], '_rankingScore': max(similarity, 0.0)}
+                for doc_id, similarity in similar if doc_id in documents
+            ])
+        return {'hits': reciprocal_rank_fusion(result_lists)[:limit]}
+
+    def _query_vector(self, question: str) -> List[float]:
+        key = normalize_query(question)
+        vector = self._query_vectors.get(key)
+        if vector is None:
+            with timed(LLM_STAGE_SECONDS, stage="embed_query"):
+                vector = self.embedder.embed_query(question)
+            self._query_vectors.set(key, vector)
+        return vector
+
+    def _is_weak(self, results: Dict) -> bool:
+        return not results['hits'] or self._top_score(results) < self.rewrite_min_score
+
+    @staticmethod
+    def _top_score(results: Dict) -> float:
+        if not results['hits']:
+            return -1.0
+        # Older MeiliSearch versions don't report scores; treat any hit as good
+        return results['hits'][0].get('_rankingScore', 1.0)
+
+    def get_context_for_llm(self, query: str, max_context_length: int = 40000, max_context_tokens: Optional[int] = None) -> str:
+        """Get relevant context from MeiliSearch for the LLM."""
+        return self._build_context(self.search(query), max_context_length, max_context_tokens)
+
+    def _build_context(self, hits: List[Dict], max_context_length: int, max_context_tokens: Optional[int] = None) -> str:
+        # The budget is in model tokens; a character budget is converted at ~4 characters a token
+        builder = ContextBuilder(
+            max_context_tokens or max_context_length // 4,
+            model=getattr(self.llm_client, "model", None)
+        )
+        with timed(LLM_STAGE_SECONDS, stage="context"):
+            return builder.build(hits)
+
+    def _collapse_passages(self, hits: List[Dict]) -> List[Dict]:
+        """Group passage hits by page, best-ranked page first.
+
+        Each page keeps its best `passages_per_page` passages, put back into
+        document order under the page title.
+        """
+        pages = OrderedDict()
+        for hit in hits:
+            page = pages.setdefault(hit['page_id'], {'title': hit['title'], 'passages': []})
+            if len(page['passages']) < self.passages_per_page:
+                page['passages'].append(hit)
+
+        collapsed = []
+        for page_id, page in pages.items():
+            passages = sorted(page['passages'], key=lambda passage: passage['position'])
+            content = "\n\n".join([f"# {page['title']}"] + [cropped_content(passage) for passage in passages])
+            collapsed.append({
+                'id': page_id,
+                'title': page['title'],
+                'content': content,
+                'content_hash': page['passages'][0].get('content_hash'),
+                '_rankingScore': page['passages'][0].get('_rankingScore', 1.0)
+            })
+        return collapsed
+
+    def generate_response(self, user_prompt: str, max_context_length: int = 40000, max_context_tokens: Optional[int] = None, **kwargs) -> str:
+        """Generate a response using the LLM with context from MeiliSearch.
+
+        With a response cache, an answer is reused when the same question is
+        asked with the same settings and retrieves the same, unchanged
+        documents.
+        """
+        with timed(LLM_STAGE_SECONDS, stage="answer"):
+            # Get relevant context from MeiliSearch
+            hits = self.search(user_prompt)
+            cache_key, cached, prompt = self._prepare_answer(user_prompt, hits, max_context_length, max_context_tokens, kwargs)
+            if cached is not None:
+                return cached
+            # Generate response using the LLM client
+            with timed(LLM_STAGE_SECONDS, stage="generate"):
+                response = self.llm_client.generate(prompt, **kwargs)
+            self._remember_answer(cache_key, response, hits)
+            return response
+
+    async def agenerate_response(self, user_prompt: str, max_context_length: int = 40000, max_context_tokens: Optional[int] = None, **kwargs) -> str:
+        """Async variant of `generate_response` that never blocks the event loop."""
+        response, _ = await self.aanswer(user_prompt, max_context_length, max_context_tokens, **kwargs)
+        return response
+
+    async def aanswer(self, user_prompt: str, max_context_length: int = 40000, max_context_tokens: Optional[int] = None, **kwargs) -> Tuple[str, List[Dict]]:
+        """Like `agenerate_response`, but also return the search hits the answer was built from."""
+        with timed(LLM_STAGE_SECONDS, stage="answer"):
+            hits = await self.asearch(user_prompt)
+            # The answer cache may be on disk and the context is token-counted, so both run off the loop
+            cache_key, cached, prompt = await asyncio.to_thread(self._prepare_answer, user_prompt, hits, max_context_length, max_context_tokens, kwargs)
+            if cached is not None:
+                return cached, hits
+            with timed(LLM_STAGE_SECONDS, stage="generate"):
+                response = await self.llm_client.agenerate(prompt, **kwargs)
+            await asyncio.to_thread(self._remember_answer, cache_key, response, hits)
+            return response, hits
+
+    async def astream_response(self, user_prompt: str, max_context_length: int = 40000, max_context_tokens: Optional[int] = None, **kwargs) -> AsyncIterator[str]:
+        """Yield the response as the LLM generates it.
+
+        A cached answer is yielded in one piece; a fresh one is cached once
+        it has been streamed completely. The time to the first token is
+        recorded separately from the whole generation, since that is the
+        wait a user sees.
+        """
+        started = time.perf_counter()
+        hits = await self.asearch(user_prompt)
+        cache_key, cached, prompt = await asyncio.to_thread(self._prepare_answer, user_prompt, hits, max_context_length, max_context_tokens, kwargs)
+        if cached is not None:
+            LLM_STAGE_SECONDS.observe(time.perf_counter() - started, stage="answer")
+            yield cached
+            return
+        parts = []
+        failed = False
+        generate_started = time.perf_counter()
+        async for token in self.llm_client.astream(prompt, **kwargs):
+            if not parts:
+                LLM_STAGE_SECONDS.observe(time.perf_counter() - started, stage="first_token")
+            failed = failed or token.startswith("Error generating response")
+            parts.append(token)
+            yield token
+        finished = time.perf_counter()
+        LLM_STAGE_SECONDS.observe(finished - generate_started, stage="generate")
+        LLM_STAGE_SECONDS.observe(finished - started, stage="answer")
+        if not failed:
+            await asyncio.to_thread(self._remember_answer, cache_key, "".join(parts), hits)
+
+    def _prepare_answer(self, user_prompt: str, hits: List[Dict], max_context_length: int, max_context_tokens: Optional[int], kwargs: dict) -> Tuple[Optional[str], Optional[str], str]:
+        """Return the answer cache key, any cached answer and the LLM prompt."""
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key(
+                user_prompt, hits,
+                model=getattr(self.llm_client, "model", None),
+                max_context_length=max_context_length,
+                max_context_tokens=max_context_tokens,
+                crop_words=self.crop_words,
+                **kwargs
+            )
+            cached = self.response_cache.get(cache_key)
+            ANSWER_CACHE_REQUESTS.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cache_key, cached, ""
+
+        context = self._build_context(hits, max_context_length, max_context_tokens)
         # Format the prompt with context
         prompt = f"""Context from knowledge base:
 {context}
@@ -39,6 +343,8 @@ class LLMService:
 User question: {user_prompt}
 
 Please answer the question based on the context provided above. Don't tell me you are answering based on the context; assume I aslready know that you are using the provided context. If the provided context gives you enough information to at least give a broad response based on what you know, please do so, but only if pertaining to the prompt. But if the context doesn't contain enough information to answer the question or at least provide some useful related information, please say you don't know."""
-        
-        # Generate response using the LLM client
-        return self.llm_client.generate(prompt, **kwargs) 
\ No newline at end of file
+        return cache_key, None, prompt
+
+    def _remember_answer(self, cache_key: Optional[str], response: str, hits: List[Dict]):
+        if cache_key is not None and not response.startswith("Error generating response"):
+            self.response_cache.set(cache_key, response, [hit['id'] for hit in hits])
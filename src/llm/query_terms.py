@@ -0,0 +1,65 @@
+import re
+from typing import Optional, Set
+
+from ..indexer.meilisearch_client import SearchIndexer
+
+# Words that carry no search value in questions, on top of the index's stop words
+QUESTION_WORDS = {
+    'what', 'whats', 'which', 'who', 'whom', 'whose', 'when', 'where', 'why', 'how',
+    'do', 'does', 'did', 'can', 'could', 'should', 'would', 'will', 'shall', 'may', 'might', 'must',
+    'i', 'me', 'my', 'we', 'us', 'our', 'you', 'your', 'it', 'its', 'they', 'them', 'their',
+    'this', 'that', 'these', 'those', 'there', 'here', 'be', 'been', 'being', 'am', 'has', 'have', 'had',
+    'please', 'tell', 'explain', 'describe', 'know', 'find', 'show', 'give', 'get', 'need', 'want',
+    'about', 'any', 'some', 'all', 'if', 'so', 'as', 'from', 'into', 'up', 'out', 'not', 'no',
+    'is', 'are', 'was', 'were', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'
+}
+
+class QueryTermExtractor:
+    """Turns a question into search terms locally, without an LLM call.
+
+    Stop words and synonyms come from the index's own settings. The
+    remaining words are scored by how specific they look (length,
+    capitalization, digits, known synonyms) and the best ones are returned
+    in their original order.
+    """
+
+    def __init__(self, search_indexer: SearchIndexer, max_terms: int = 8):
+        self.search_indexer = search_indexer
+        self.max_terms = max_terms
+        self._stop_words: Optional[Set[str]] = None
+        self._synonyms: Set[str] = set()
+
+    def _load_settings(self):
+        stop_words = set(QUESTION_WORDS)
+        try:
+            settings = self.search_indexer.get_settings()
+            stop_words.update(word.lower() for word in settings.get('stopWords') or [])
+            self._synonyms = {word.lower() for word in (settings.get('synonyms') or {})}
+        except Exception as e:
+            print(f"Could not load index settings for term extraction: {e}")
+        self._stop_words = stop_words
+
+    def extract(self, query: str) -> str:
+        """Return the most specific words of `query` as a search string."""
+        if self._stop_words is None:
+            self._load_settings()
+
+        candidates = []
+        seen = set()
+        for position, match in enumerate(re.finditer(r"[\w][\w'\-.]*[\w]|[\w]", query)):
+            word = match.group(0)
+            lowered = word.lower().replace("'", "")
+            if lowered in self._stop_words or lowered in seen:
+                continue
+            seen.add(lowered)
+            score = min(len(word), 10) / 10
+            if position > 0 and word[:1].isupper():
+                score += 0.5  # Likely a name or product
+            if (word.isupper() and len(word) > 1) or any(char.isdigit() for char in word):
+                score += 0.5  # Acronyms, versions, ids
+            if lowered in self._synonyms:
+                score += 0.3
+            candidates.append((score, position, word))
+
+        best = sorted(candidates, key=lambda candidate: -candidate[0])[:self.max_terms]
+        return " ".join(word for _, _, word in sorted(best, key=lambda candidate: candidate[1]))
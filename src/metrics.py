@@ -0,0 +1,233 @@
+"""In-process counters, gauges and histograms, rendered in the Prometheus text format.
+
+Metrics live in the module-level `registry` and are shared by every part of
+the process; the server exposes them on `/metrics`.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+# (histogram, seconds per label values) pairs collecting observations for `recording`
+_recordings: ContextVar[tuple] = ContextVar("metric_recordings", default=())
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """A value that only goes up, per combination of label values."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def totals(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.totals().items())]
+
+class Gauge(Counter):
+    """A value that can be set to anything, such as a queue depth."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """Observed values, such as durations in seconds, counted into cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+        for histogram, recorded in _recordings.get():
+            if histogram is self:
+                name = "/".join(key)
+                recorded[name] = recorded.get(name, 0.0) + value
+
+    def totals(self) -> Dict[LabelValues, Tuple[int, float]]:
+        """(count, sum) per combination of label values."""
+        with self._lock:
+            return {key: (series[2], series[1]) for key, series in self._series.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(series.items()):
+            for bound, bucket_count in list(zip(self.buckets, counts)) + [("+Inf", count)]:
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {bucket_count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Holds every metric by name; asking for an existing name returns the same metric."""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """Observe the wall time of the `with` block in `histogram`, even if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+@contextmanager
+def recording(histogram: Histogram) -> Iterator[Dict[str, float]]:
+    """Collect the sum of the values `histogram` observes in the `with` block, per label values.
+
+    Only observations made in the current context count, including asyncio
+    tasks and `asyncio.to_thread` calls started from it, so concurrent
+    requests each collect their own.
+    """
+    recorded: Dict[str, float] = {}
+    token = _recordings.set(_recordings.get() + ((histogram, recorded),))
+    try:
+        yield recorded
+    finally:
+        _recordings.reset(token)
+
+def changes_since(metric: _Metric, before: dict) -> dict:
+    """What `metric` recorded since `before = metric.totals()`, per label values.
+
+    Counters give the increase, histograms (count, sum) of the new observations.
+    Label values that did not change are left out.
+    """
+    changes = {}
+    for key, value in metric.totals().items():
+        if isinstance(value, tuple):
+            count, total = before.get(key, (0, 0.0))
+            if value[0] != count:
+                changes[key] = (value[0] - count, value[1] - total)
+        elif value != before.get(key, 0.0):
+            changes[key] = value - before.get(key, 0.0)
+    return changes
+
+registry = Registry()
+
+# Question answering
+LLM_STAGE_SECONDS = registry.histogram(
+    "llm_stage_seconds", "Time spent in each stage of answering a question", ["stage"])
+ANSWER_CACHE_REQUESTS = registry.counter(
+    "answer_cache_requests_total", "Answer cache lookups by result", ["result"])
+
+# Notion API
+NOTION_REQUEST_SECONDS = registry.histogram(
+    "notion_request_seconds", "Duration of Notion API requests", ["operation"])
+NOTION_REQUESTS = registry.counter(
+    "notion_requests_total", "Notion API requests by outcome", ["operation", "status"])
+NOTION_RETRIES = registry.counter(
+    "notion_retries_total", "Notion API requests retried after HTTP 429", ["operation"])
+NOTION_WAIT_SECONDS = registry.histogram(
+    "notion_rate_limit_wait_seconds", "Time requests waited for the Notion rate limiter")
+
+NOTION_WEBHOOK_EVENTS = registry.counter(
+    "notion_webhook_events_total", "Notion webhook events by result", ["result"])
+NOTION_PAGE_CHANGES_PENDING = registry.gauge(
+    "notion_page_changes_pending", "Changed pages waiting out the webhook debounce")
+
+# Search index
+INDEX_WRITE_SECONDS = registry.histogram(
+    "search_index_write_seconds", "Duration of MeiliSearch write calls", ["operation"])
+INDEX_DOCUMENTS = registry.counter(
+    "search_index_documents_total", "Documents sent to MeiliSearch")
+SYNC_STAGE_SECONDS = registry.histogram(
+    "sync_stage_seconds", "Time spent in each stage of a sync", ["stage"], buckets=(1, 5, 10, 30, 60, 300, 900, 1800, 3600))
+
+# Slack
+SLACK_REQUEST_SECONDS = registry.histogram(
+    "slack_request_seconds", "Duration of Slack Web API calls", ["method"])
+SLACK_REQUESTS = registry.counter(
+    "slack_requests_total", "Slack Web API calls by outcome", ["method", "outcome"])
+SLACK_QUEUE_DEPTH = registry.gauge(
+    "slack_queue_depth", "Items waiting in the server's queues", ["queue"])
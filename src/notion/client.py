@@ -1,96 +1,515 @@
-from notion_client import Client
-from notion_client.helpers import iterate_paginated_api
+from notion_client import APIResponseError, Client
 from notion_client.helpers import is_full_page
+import threading
 import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .page_cache import PageMetadata, PageMetadataCache
+from .properties import page_title, property_lines, rich_text_plain
+from .rate_limiter import RateLimiter
+from ..sync.crawl_checkpoint import CrawlCheckpoint, SearchBatch
+from ..sync.sync_state import SyncState
+
+HEADING_LEVELS = {"heading_1": 1, "heading_2": 2, "heading_3": 3}
 
 class NotionClient:
-    def __init__(self, api_key: str):
-        self.client = Client(auth=api_key)
-        self._page_cache = {}  # Cache to store page titles by ID
+    def __init__(self, api_key: str, base_url: Optional[str] = None, concurrency: int = 1, requests_per_second: float = 3.0, max_block_depth: int = 8,
+                 page_cache: Optional[PageMetadataCache] = None, database_rows: bool = False, bodyless_databases: Iterable[str] = ()):
+        """Create a Notion client.
+
+        Args:
+            api_key: Notion integration token
+            base_url: Optional API root, e.g. a local fake Notion server
+            concurrency: Number of pages fetched in parallel
+            requests_per_second: Shared request budget across all workers
+            max_block_depth: How deep to descend into nested blocks
+            page_cache: Metadata cache for hierarchy resolution; defaults to an in-memory one
+            database_rows: Index database rows through `fetch_and_index_databases`, not the page crawl
+            bodyless_databases: IDs of databases whose rows are indexed without fetching their block content
+        """
+        options = {"base_url": base_url} if base_url else {}
+        self.client = Client(auth=api_key, **options)
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter(requests_per_second=requests_per_second, burst=max(3, self.concurrency))
+        self.max_block_depth = max_block_depth
+        self.database_rows = database_rows
+        self.bodyless_databases = {database_id.replace("-", "") for database_id in bodyless_databases}
+        # Separate pool for nested block prefetches; its tasks never wait on other tasks
+        self._block_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        # Titles and parents of pages seen so far, used to build hierarchy strings
+        self.page_cache = page_cache if page_cache is not None else PageMetadataCache()
+        self._fetching = {}  # page id -> Event set when an in-flight fetch finishes
+        self._fetch_lock = threading.Lock()
+
+    def _remember_page(self, page: dict) -> PageMetadata:
+        """Record a page or database object's title, parent and edit time in the metadata cache."""
+        parent = page.get("parent", {})
+        parent_id = parent.get("page_id") if parent.get("type") == "page_id" else None
+        if page.get("object") == "database":
+            entry = (rich_text_plain(page.get("title")) or "Untitled", parent_id, page.get("last_edited_time"))
+        elif self.database_rows and parent.get("type") == "database_id":
+            # Rows are placed under their database in the hierarchy
+            entry = (page_title(page) or "Untitled", parent["database_id"], page.get("last_edited_time"))
+        else:
+            entry = (self._get_page_name(page), parent_id, page.get("last_edited_time"))
+        self.page_cache.put(page["id"], *entry)
+        return entry
+
+    def _track_page(self, page: dict, checkpoint: CrawlCheckpoint):
+        """Remember a page or database seen in a crawl, noting in `checkpoint` if its title or parent changed."""
+        previous = self.page_cache.get(page["id"])
+        self._remember_page(page)
+        current = self.page_cache.get(page["id"])
+        if previous is not None and current is not None and previous[:2] != current[:2]:
+            checkpoint.moved.add(page["id"])
+
+    def _get_page(self, page_id: str) -> Optional[PageMetadata]:
+        """Return metadata for a page, fetching it only if it is not cached.
 
-    def _get_page(self, page_id: str) -> object:
+        Concurrent lookups of the same uncached page share a single fetch.
+        Failed fetches are not cached.
+        """
+        entry = self.page_cache.get(page_id)
+        if entry is not None:
+            return entry
+        with self._fetch_lock:
+            done = self._fetching.get(page_id)
+            fetching = done is None
+            if fetching:
+                done = self._fetching[page_id] = threading.Event()
+        if not fetching:
+            done.wait()
+            return self.page_cache.get(page_id)
 
         try:
-            if page_id not in self._page_cache:
-                self._page_cache[page_id] = self.client.pages.retrieve(page_id=page_id)
-            return self._page_cache[page_id]
+            return self._remember_page(self._retrieve_parent(page_id))
         except Exception as e:
             print(f"Error fetching page for {page_id}: {e}")
-            return "Unknown Page"
+            return None
+        finally:
+            with self._fetch_lock:
+                del self._fetching[page_id]
+            done.set()
 
-    def _get_page_hierarchy(self, page: object) -> list:
-        """Recursively get the hierarchy path for a page."""
-        hierarchy = []
-        current_page = page
-        while current_page:
-            try:
-                title = self._get_page_name(current_page)
-                hierarchy.insert(0, title)  # Add to beginning of list
-                
-                # Check if page has a parent
-                if "parent" in current_page and current_page["parent"]["type"] == "page_id":
-                    current_page = self._get_page(current_page["parent"]["page_id"])
-                else:
-                    current_page = None
-            except Exception as e:
-                print(f"Error fetching hierarchy for {current_page['id']}: {e}")
-                print("Full traceback:")
-                traceback.print_exc()
+    def _retrieve_parent(self, page_id: str) -> dict:
+        try:
+            return self.rate_limiter.call(self.client.pages.retrieve, "pages.retrieve", page_id=page_id)
+        except APIResponseError as e:
+            # In database mode a row's parent is a database, which isn't a page
+            if not self.database_rows or e.status not in (400, 404):
+                raise
+            return self.rate_limiter.call(self.client.databases.retrieve, "databases.retrieve", database_id=page_id)
+
+    def _get_page_hierarchy(self, page: dict) -> list:
+        """Get the hierarchy path for a page, from the root down to the page itself.
+
+        Ancestors are resolved through the page metadata cache and the
+        resolved paths are memoized, so a shared ancestor is only looked up
+        once until its title or parent changes.
+        """
+        self._remember_page(page)
+        return self.get_page_hierarchy(page["id"])
+
+    def get_page_hierarchy(self, page_id: str) -> list:
+        """Get the hierarchy path of a page already in the metadata cache, fetching uncached ancestors."""
+        chain = []  # (page_id, title) from the page upwards
+        prefix = ()
+        complete = True
+        while page_id:
+            memoized = self.page_cache.get_path(page_id)
+            if memoized is not None:
+                prefix = memoized
+                break
+            entry = self._get_page(page_id)
+            if entry is None or any(seen_id == page_id for seen_id, _ in chain):
+                complete = False
                 break
-        
-        return hierarchy
+            chain.append((page_id, entry[0]))
+            page_id = entry[1]
+
+        path = prefix
+        for chain_id, title in reversed(chain):
+            path = path + (title,)
+            # Don't memoize paths truncated by a failed fetch
+            if complete:
+                self.page_cache.set_path(chain_id, path)
+        return list(path)
+
+    def fetch_and_index_all_pages(self, index_pages_callback, sync_state: Optional[SyncState] = None, full_resync: bool = False,
+                                  checkpoint: Optional[CrawlCheckpoint] = None, on_checkpoint: Optional[Callable[[], None]] = None):
+        """Fetch pages from Notion and pass their documents to `index_pages_callback`.
+
+        With a `sync_state`, pages whose `last_edited_time` matches the stored
+        watermark are skipped without fetching their content, and documents
+        whose hash is unchanged are not re-indexed. `full_resync` fetches and
+        re-indexes every page but still records fresh watermarks.
+
+        Page content and hierarchy are fetched by up to `concurrency` worker
+        threads while the search results are paginated; the callback and
+        sync state are only touched from the calling thread.
 
-    def fetch_and_index_all_pages(self, index_pages_callback):
+        The search starts at the cursor of `checkpoint`, skipping the pages it
+        lists as processed, and the checkpoint is moved forward as pages are
+        indexed; pages that fail stay pending. Pages the checkpoint lists for
+        retry are fetched first, and only those if the checkpoint says the
+        search was already finished. Whenever the checkpoint is due,
+        `on_checkpoint` is called to persist it. Pages whose cached title or
+        parent changed are added to the checkpoint's `moved`.
+
+        With `database_rows`, pages in databases are skipped; they are left
+        to `fetch_and_index_databases`.
+        """
+        checkpoint = checkpoint if checkpoint is not None else CrawlCheckpoint()
         try:
-            added_count = 0
-            for page in iterate_paginated_api(self.client.search, filter={"property": "object", "value": "page"}):
-                print(f"\nPage {page['id']}:")                
-                if not is_full_page(page):
-                    print("Skipping page {page['id']} - not a full page")
-                    continue
+            counts = {"added": 0, "unchanged": 0}
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                in_flight = {}
 
-                # if "parent" in page and page["parent"]["type"] == "database_id":
-                #     print("Skipping page {page['id']} - parent is a database")
-                #     continue
-                # Get page content
-                try:
-                    page_name = self._get_page_name(page)
-                    if page_name == "unknown":
-                        print("Skipping page {page['id']} - unknown page name")
-                        continue
-                    content = self._get_page_content(page)
-                    hierarchy = self._get_page_hierarchy(page)
-
-                    doc = {
-                        "id": page["id"],
-                        "title": page_name,
-                        "content": "\n".join(content),
-                        "url": page["url"],
-                        "hierarchy": " > ".join(hierarchy)  # Join hierarchy with arrows
-                    }
-                except Exception as e:
-                    print(f"Error fetching content for page {page['id']}: {e}")
-                    continue
-                # Extract nested plain_text from rich_text array
-                index_pages_callback([doc])
-                added_count += 1
-            return added_count
+                def save_checkpoint_if_due():
+                    if on_checkpoint is not None and checkpoint.due():
+                        on_checkpoint()
+
+                def complete(futures):
+                    for future in futures:
+                        page, batch = in_flight.pop(future)
+                        if batch is None:
+                            self._complete_retry(page, future, index_pages_callback, sync_state, full_resync, counts, checkpoint)
+                        elif self._index_document(page, future.result(), index_pages_callback, sync_state, full_resync, counts):
+                            checkpoint.page_done(batch, page["id"])
+                    save_checkpoint_if_due()
+
+                for page_id in sorted(checkpoint.retry):
+                    in_flight[executor.submit(self._fetch_document, page_id)] = (page_id, None)
+
+                for batch, pages in self._iter_search_batches(checkpoint) if not checkpoint.pages_done else ():
+                    for page in pages:
+                        print(f"\nPage {page['id']}:")
+                        if page["id"] in batch.processed:
+                            # Processed before the crawl was interrupted
+                            continue
+
+                        if self.database_rows and page.get("parent", {}).get("type") == "database_id":
+                            checkpoint.page_done(batch, page["id"])
+                            continue
+
+                        if not self._has_page_name(page):
+                            # Never indexed, so it doesn't hold the checkpoint back like a failed page
+                            checkpoint.page_done(batch, page["id"])
+                            continue
+
+                        # Unchanged descendants of a renamed or moved page need a new hierarchy
+                        self._track_page(page, checkpoint)
+
+                        if sync_state is not None and not full_resync and sync_state.is_unchanged(page["id"], page.get("last_edited_time")):
+                            counts["unchanged"] += 1
+                            checkpoint.page_done(batch, page["id"])
+                            continue
+
+                        in_flight[executor.submit(self._build_document, page)] = (page, batch)
+                        # Keep a bounded number of pages in flight
+                        if len(in_flight) >= self.concurrency * 2:
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            complete(done)
+                    save_checkpoint_if_due()
+
+                for future in as_completed(list(in_flight)):
+                    complete([future])
+                checkpoint.finish_pages()
+            if sync_state is not None:
+                print(f"Skipped {counts['unchanged']} unchanged pages")
+            return counts["added"]
         except Exception as e:
             print(f"Error fetching Notion pages: {e}")
             print("Full traceback:")
             traceback.print_exc()
             raise
 
+    def _complete_retry(self, page_id: str, future, index_pages_callback, sync_state, full_resync, counts, checkpoint: CrawlCheckpoint):
+        """Index a page the checkpoint listed for retry, dropping it from the list once done or gone."""
+        try:
+            page, doc = future.result()
+        except Exception as e:
+            print(f"Error fetching page {page_id}: {e}")
+            return
+        if page is None or self._index_document(page, doc, index_pages_callback, sync_state, full_resync, counts):
+            checkpoint.retry.discard(page_id)
+
+    def fetch_and_index_databases(self, index_pages_callback, sync_state: Optional[SyncState] = None, full_resync: bool = False,
+                                  checkpoint: Optional[CrawlCheckpoint] = None, on_checkpoint: Optional[Callable[[], None]] = None) -> dict:
+        """Index the rows of every shared database, pulling them in bulk with `databases.query`.
+
+        Rows are documents of their title, a "Name: value" line per property
+        and their block content. With a `sync_state`, each database is only
+        queried for rows edited since its watermark, which is moved forward
+        once all of them are indexed. `full_resync` queries every row.
+
+        Notion doesn't say whether a row has a body, so the block content of
+        every changed row is fetched by the worker threads, except in the
+        `bodyless_databases`. Databases whose rows are all indexed are marked
+        done in `checkpoint`, and skipped if it is resumed; `on_checkpoint` is
+        called whenever the checkpoint is due, as in the page crawl. Returns
+        the number of databases, rows and added documents, and the ids of the
+        databases with rows that could not be indexed ("failed").
+        """
+        checkpoint = checkpoint if checkpoint is not None else CrawlCheckpoint()
+        counts = {"added": 0, "unchanged": 0, "rows": 0, "databases": 0, "failed": []}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for database in self._iter_databases():
+                counts["databases"] += 1
+                if database["id"] in checkpoint.databases_done:
+                    # Indexed before the crawl was interrupted
+                    continue
+                self._track_page(database, checkpoint)
+                try:
+                    if self._index_database(database, executor, index_pages_callback, sync_state, full_resync, counts):
+                        checkpoint.database_done(database["id"])
+                    else:
+                        counts["failed"].append(database["id"])
+                except APIResponseError as e:
+                    # Its watermark is left as it was, so the next sync tries again
+                    print(f"Error querying database {database['id']}: {e}")
+                    counts["failed"].append(database["id"])
+                if on_checkpoint is not None and checkpoint.due():
+                    on_checkpoint()
+        print(f"Queried {counts['rows']} rows edited since the last sync from {counts['databases']} databases, "
+              f"{counts['unchanged']} of them unchanged")
+        return counts
+
+    def _index_database(self, database: dict, executor: ThreadPoolExecutor, index_pages_callback, sync_state: Optional[SyncState],
+                        full_resync: bool, counts: dict) -> bool:
+        """Index a database's changed rows; return False if any of them failed."""
+        database_id = database["id"]
+        self._remember_page(database)
+        incremental = sync_state is not None and not full_resync
+        since = sync_state.database_watermark(database_id) if incremental else None
+        fetch_bodies = database_id.replace("-", "") not in self.bodyless_databases
+        newest = since
+        complete = True
+        in_flight = {}
+
+        def index(row, doc):
+            nonlocal complete
+            if not self._index_document(row, doc, index_pages_callback, sync_state, full_resync, counts):
+                complete = False
+
+        for row in self._iter_database_rows(database_id, since):
+            counts["rows"] += 1
+            self._remember_page(row)
+            if row.get("last_edited_time") and (newest is None or row["last_edited_time"] > newest):
+                newest = row["last_edited_time"]
+            if incremental and sync_state.is_unchanged(row["id"], row.get("last_edited_time")):
+                counts["unchanged"] += 1
+                continue
+
+            if not fetch_bodies:
+                index(row, self._build_row_document(row, []))
+                continue
+            in_flight[executor.submit(self._build_row_document, row)] = row
+            # Keep a bounded number of rows in flight
+            if len(in_flight) >= self.concurrency * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index(in_flight.pop(future), future.result())
+        for future in as_completed(list(in_flight)):
+            index(in_flight.pop(future), future.result())
+
+        if sync_state is not None:
+            # A row that failed must be queried again, so the watermark stays put
+            sync_state.update_database(database_id, newest if complete else since)
+        return complete
+
+    def _iter_databases(self) -> Iterator[dict]:
+        cursor = None
+        while True:
+            options = {"start_cursor": cursor} if cursor else {}
+            response = self._search(filter={"property": "object", "value": "database"}, page_size=100, **options)
+            for database in response["results"]:
+                if not database.get("archived") and not database.get("in_trash"):
+                    yield database
+            cursor = response.get("next_cursor")
+            if not response.get("has_more") or not cursor:
+                return
+
+    def _iter_database_rows(self, database_id: str, since: Optional[str] = None) -> Iterator[dict]:
+        """Page through a database's rows edited on or after `since`, least recently edited first.
+
+        Rows edited while the query runs move to the end, so they are still
+        returned or have a newer edit time than every row returned.
+        """
+        query = {"sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+        if since:
+            query["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+        cursor = None
+        while True:
+            options = {"start_cursor": cursor} if cursor else {}
+            response = self.rate_limiter.call(self.client.databases.query, "databases.query", database_id=database_id,
+                                              page_size=100, **query, **options)
+            for row in response["results"]:
+                if is_full_page(row):
+                    yield row
+            cursor = response.get("next_cursor")
+            if not response.get("has_more") or not cursor:
+                return
+
+    def _build_row_document(self, row: dict, body: Optional[List[str]] = None) -> Optional[dict]:
+        """Build a database row's index document from its properties, fetching its body unless given."""
+        try:
+            if body is None:
+                body = self._get_page_content(row)
+            content = property_lines(row)
+            if body:
+                content += [""] + body
+            return {
+                "id": row["id"],
+                "title": page_title(row) or "Untitled",
+                "content": "\n".join(content),
+                "url": row["url"],
+                "hierarchy": " > ".join(self._get_page_hierarchy(row))
+            }
+        except Exception as e:
+            print(f"Error fetching content for row {row['id']}: {e}")
+            return None
+
+    def fetch_and_index_pages(self, page_ids: List[str], index_pages_callback, sync_state: Optional[SyncState] = None) -> dict:
+        """Re-fetch the given pages and pass their documents to `index_pages_callback`.
+
+        Used for targeted updates rather than crawls; pages are fetched by
+        the same worker threads. Returns the ids of pages that were indexed
+        ("indexed"), unchanged ("unchanged"), gone from Notion because they
+        were deleted, archived or unshared ("gone"), and indexed with a new
+        title or parent ("moved"), whose descendants' hierarchy is stale.
+        Pages that could not be fetched or indexed are listed as "failed".
+        """
+        result = {"indexed": [], "unchanged": [], "gone": [], "moved": [], "failed": []}
+        counts = {"added": 0, "unchanged": 0}
+        previous = {page_id: self.page_cache.get(page_id) for page_id in page_ids}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self._fetch_document, page_id): page_id for page_id in page_ids}
+            for future in as_completed(futures):
+                page_id = futures[future]
+                try:
+                    page, doc = future.result()
+                except Exception as e:
+                    print(f"Error fetching page {page_id}: {e}")
+                    result["failed"].append(page_id)
+                    continue
+                if page is None:
+                    result["gone"].append(page_id)
+                    continue
+                if doc is None:
+                    result["failed"].append(page_id)
+                    continue
+                added, unchanged = counts["added"], counts["unchanged"]
+                self._index_document(page, doc, index_pages_callback, sync_state, False, counts)
+                if counts["added"] > added:
+                    result["indexed"].append(page_id)
+                elif counts["unchanged"] > unchanged:
+                    result["unchanged"].append(page_id)
+                else:
+                    result["failed"].append(page_id)
+                current = self.page_cache.get(page_id)
+                if previous[page_id] is not None and current is not None and previous[page_id][:2] != current[:2]:
+                    result["moved"].append(page_id)
+        return result
+
+    def _fetch_document(self, page_id: str) -> Tuple[Optional[dict], Optional[dict]]:
+        """Fetch a page and build its document; the page is None if it is gone from Notion."""
+        try:
+            page = self.rate_limiter.call(self.client.pages.retrieve, "pages.retrieve", page_id=page_id)
+        except APIResponseError as e:
+            if e.status in (403, 404):
+                return None, None
+            raise
+        if page.get("archived") or page.get("in_trash"):
+            return None, None
+        return page, self._build_document(page)
+
+    def _iter_search_batches(self, checkpoint: CrawlCheckpoint) -> Iterator[Tuple[SearchBatch, List[dict]]]:
+        """Page through the search for pages from the checkpoint's cursor, yielding each response's full pages."""
+        cursor = checkpoint.cursor
+        resuming = cursor is not None
+        while True:
+            options = {"start_cursor": cursor} if cursor else {}
+            try:
+                response = self._search(filter={"property": "object", "value": "page"}, page_size=100, **options)
+            except APIResponseError as e:
+                if not resuming or e.status != 400:
+                    raise
+                # Search cursors don't last forever; start over rather than fail
+                print(f"Notion rejected the checkpoint cursor ({e}), starting the crawl over")
+                checkpoint.start(checkpoint.scope, checkpoint.full_resync)
+                cursor = None
+                resuming = False
+                continue
+            resuming = False
+
+            pages = []
+            for page in response["results"]:
+                if is_full_page(page):
+                    pages.append(page)
+                else:
+                    print(f"Skipping page {page['id']} - not a full page")
+            next_cursor = response.get("next_cursor") if response.get("has_more") else None
+            yield checkpoint.add_batch(cursor, next_cursor, [page["id"] for page in pages]), pages
+            if not next_cursor:
+                return
+            cursor = next_cursor
+
+    def _build_document(self, page) -> Optional[dict]:
+        """Fetch a page's content and hierarchy and build its index document."""
+        if self.database_rows and page.get("parent", {}).get("type") == "database_id":
+            return self._build_row_document(page)
+        try:
+            page_name = self._get_page_name(page)
+            if page_name == "unknown":
+                print(f"Skipping page {page['id']} - unknown page name")
+                return None
+            content = self._get_page_content(page)
+            hierarchy = self._get_page_hierarchy(page)
+
+            return {
+                "id": page["id"],
+                "title": page_name,
+                "content": "\n".join(content),
+                "url": page["url"],
+                "hierarchy": " > ".join(hierarchy)  # Join hierarchy with arrows
+            }
+        except Exception as e:
+            print(f"Error fetching content for page {page['id']}: {e}")
+            return None
+
+    def _index_document(self, page, doc, index_pages_callback, sync_state, full_resync, counts) -> bool:
+        """Index a page's document unless its hash is unchanged; return False if it couldn't be indexed."""
+        if doc is None:
+            return False
+        last_edited_time = page.get("last_edited_time")
+        parent = page.get("parent", {})
+        database_id = parent.get("database_id") if parent.get("type") == "database_id" else None
+        content_hash = SyncState.hash_document(doc)
+        if sync_state is not None and not full_resync and sync_state.has_hash(page["id"], content_hash):
+            sync_state.update(page["id"], last_edited_time, content_hash, database_id)
+            counts["unchanged"] += 1
+            return True
+        # The hash doubles as the document's update stamp for answer caching
+        doc["content_hash"] = content_hash
+        if index_pages_callback([doc]) is False:
+            return False
+        if sync_state is not None:
+            sync_state.update(page["id"], last_edited_time, content_hash, database_id)
+        counts["added"] += 1
+        return True
+
+    def _search(self, **kwargs):
+        return self.rate_limiter.call(self.client.search, "search", **kwargs)
+
     def _get_page_content(self, page):
         try:
-            blocks = self.client.blocks.children.list(block_id=page["id"])
-            # Extract nested plain_text from rich_text array
-            content = []
-            for block in blocks["results"]:
-                for key, value in block.items():
-                    if isinstance(value, dict) and "rich_text" in value:
-                        for text in value["rich_text"]:
-                            content.append(text["plain_text"])
+            content = [
+                # Keep headings as Markdown so passages can be split on them
+                f"{'#' * HEADING_LEVELS[block_type]} {text}" if block_type in HEADING_LEVELS else text
+                for block_type, text in self.iter_page_blocks(page["id"])
+            ]
             # Skip pages with empty content
             if not content:
                 print(f"Page {page['id']} - no content found")
@@ -100,6 +519,63 @@ class NotionClient:
             print(f"Error fetching Notion page contents: {e}")
             raise
 
+    def iter_page_blocks(self, block_id: str, depth: int = 0, first_batch: Optional[dict] = None) -> Iterator[Tuple[str, str]]:
+        """Yield `(block_type, text)` for every block under `block_id` in document order.
+
+        Follows `next_cursor` through all children and descends into blocks
+        with `has_children` up to `max_block_depth` levels. The first batch of
+        children of every nested block in a batch is requested concurrently,
+        and text is yielded as batches arrive, so only the blocks currently
+        being walked are held in memory. Child pages and databases are not
+        descended into; they are indexed as pages of their own.
+        """
+        cursor = None
+        while True:
+            if first_batch is not None:
+                response, first_batch = first_batch, None
+            else:
+                response = self._list_block_children(block_id, cursor)
+            blocks = response["results"]
+
+            # Start fetching nested subtrees before walking this batch
+            nested = {
+                block["id"]: self._block_executor.submit(self._list_block_children, block["id"])
+                for block in blocks
+                if block.get("has_children") and depth < self.max_block_depth and block.get("type") not in ("child_page", "child_database")
+            }
+            for block in blocks:
+                # Extract nested plain_text from rich_text array
+                for key, value in block.items():
+                    if isinstance(value, dict) and "rich_text" in value:
+                        text = "".join(part["plain_text"] for part in value["rich_text"])
+                        if text:
+                            yield key, text
+                if block["id"] in nested:
+                    try:
+                        children = nested.pop(block["id"]).result()
+                    except Exception as e:
+                        # A page missing a subtree must not be indexed as if it were complete
+                        print(f"Error fetching children of block {block['id']}: {e}")
+                        raise
+                    yield from self.iter_page_blocks(block["id"], depth + 1, first_batch=children)
+
+            cursor = response.get("next_cursor")
+            if not response.get("has_more") or not cursor:
+                return
+
+    def _list_block_children(self, block_id: str, cursor: Optional[str] = None) -> dict:
+        options = {"start_cursor": cursor} if cursor else {}
+        return self.rate_limiter.call(self.client.blocks.children.list, "blocks.children.list", block_id=block_id, page_size=100, **options)
+
+    def _has_page_name(self, page) -> bool:
+        try:
+            if self._get_page_name(page) != "unknown":
+                return True
+        except Exception:
+            pass
+        print(f"Skipping page {page['id']} - unknown page name")
+        return False
+
     def _get_page_name(self, page):
         try:
             if "properties" not in page:
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+PageMetadata = Tuple[str, Optional[str], Optional[str]]  # (title, parent_id, last_edited_time)
+
+class PageMetadataCache:
+    """Bounded LRU cache of page id -> (title, parent_id, last_edited_time).
+
+    Only the fields needed to build hierarchy strings are kept, never full
+    page objects. Resolved hierarchy paths are memoized and dropped whenever
+    a cached page's title or parent changes. With a `path`, the entries are
+    persisted so a restarted sync does not re-fetch every ancestor.
+    """
+
+    def __init__(self, max_entries: int = 50000, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: "OrderedDict[str, PageMetadata]" = OrderedDict()
+        self._paths: Dict[str, Tuple[str, ...]] = {}
+        self._lock = threading.RLock()
+        if path:
+            self.load()
+
+    def get(self, page_id: str) -> Optional[PageMetadata]:
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is not None:
+                self._entries.move_to_end(page_id)
+            return entry
+
+    def put(self, page_id: str, title: str, parent_id: Optional[str], last_edited_time: Optional[str]):
+        """Store a page, invalidating memoized paths if its title or parent changed."""
+        with self._lock:
+            previous = self._entries.get(page_id)
+            if previous is not None and previous[2] and last_edited_time and previous[2] > last_edited_time:
+                # Never replace a newer entry with a stale one
+                self._entries.move_to_end(page_id)
+                return
+            self._entries[page_id] = (title, parent_id, last_edited_time)
+            self._entries.move_to_end(page_id)
+            if previous is not None and previous[:2] != (title, parent_id):
+                self._paths.clear()
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._paths.pop(evicted, None)
+
+    def remove(self, page_id: str):
+        with self._lock:
+            if self._entries.pop(page_id, None) is not None:
+                self._paths.clear()
+
+    def descendants(self, page_id: str) -> List[str]:
+        """Ids of the cached pages below `page_id`, nearest first."""
+        with self._lock:
+            children: Dict[str, List[str]] = {}
+            for child_id, (_, parent_id, _) in self._entries.items():
+                if parent_id:
+                    children.setdefault(parent_id, []).append(child_id)
+        found = []
+        seen = {page_id}
+        queue = [page_id]
+        while queue:
+            for child_id in children.get(queue.pop(0), []):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    found.append(child_id)
+                    queue.append(child_id)
+        return found
+
+    def get_path(self, page_id: str) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            return self._paths.get(page_id)
+
+    def set_path(self, page_id: str, path: Tuple[str, ...]):
+        with self._lock:
+            if page_id in self._entries:
+                self._paths[page_id] = path
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        """Load persisted entries, starting empty if the file is missing or unreadable."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f).get("pages", [])
+        except (OSError, ValueError) as e:
+            print(f"Could not read page cache {self.path}, starting fresh: {e}")
+            return
+        with self._lock:
+            self._entries = OrderedDict((row[0], tuple(row[1:4])) for row in rows[-self.max_entries:])
+            self._paths.clear()
+
+    def save(self):
+        """Atomically write the entries in LRU order."""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            rows = [[page_id, *entry] for page_id, entry in self._entries.items()]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": rows}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,63 @@
+from typing import List
+
+def rich_text_plain(parts: list) -> str:
+    return "".join(part.get("plain_text", "") for part in parts or [])
+
+def _number_text(number) -> str:
+    return str(int(number)) if isinstance(number, float) and number.is_integer() else str(number)
+
+def _date_text(date: dict) -> str:
+    return f"{date['start']} → {date['end']}" if date.get("end") else date.get("start") or ""
+
+def property_text(prop: dict) -> str:
+    """Plain text of a page property value, or "" for empty values and relations."""
+    kind = prop.get("type")
+    value = prop.get(kind)
+    if value is None or value == [] or value == "":
+        return ""
+    if kind in ("title", "rich_text"):
+        return rich_text_plain(value)
+    if kind == "number":
+        return _number_text(value)
+    if kind in ("select", "status"):
+        return value.get("name", "")
+    if kind == "multi_select":
+        return ", ".join(option.get("name", "") for option in value)
+    if kind == "date":
+        return _date_text(value)
+    if kind == "checkbox" or kind == "boolean":
+        return "Yes" if value else "No"
+    if kind in ("url", "email", "phone_number", "string", "created_time", "last_edited_time"):
+        return str(value)
+    if kind in ("created_by", "last_edited_by"):
+        return value.get("name", "")
+    if kind == "people":
+        return ", ".join(person.get("name", "") for person in value if person.get("name"))
+    if kind == "files":
+        return ", ".join(file.get("name", "") for file in value)
+    if kind == "unique_id":
+        return f"{value['prefix']}-{value['number']}" if value.get("prefix") else _number_text(value.get("number"))
+    if kind in ("formula", "rollup"):
+        # Both wrap a value of their own type; rollups of other properties wrap an array of them
+        if value.get("type") == "array":
+            return ", ".join(text for text in map(property_text, value.get("array", [])) if text)
+        return property_text(value)
+    return ""
+
+def page_title(page: dict) -> str:
+    """Text of a page's title property, whatever it is named."""
+    for prop in page.get("properties", {}).values():
+        if prop.get("type") == "title":
+            return property_text(prop)
+    return ""
+
+def property_lines(page: dict) -> List[str]:
+    """A "Name: value" line per non-empty property of a database row, except its title."""
+    lines = []
+    for name, prop in page.get("properties", {}).items():
+        if prop.get("type") == "title":
+            continue
+        text = property_text(prop)
+        if text:
+            lines.append(f"{name}: {text}")
+    return lines
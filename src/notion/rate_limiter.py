@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from notion_client import APIResponseError
+
+from ..metrics import NOTION_REQUEST_SECONDS, NOTION_REQUESTS, NOTION_RETRIES, NOTION_WAIT_SECONDS, timed
+
+class RateLimiter:
+    """Thread-safe token bucket shared by every request to the Notion API.
+
+    Tokens refill at `requests_per_second` up to `burst`. When Notion answers
+    with HTTP 429 the whole bucket is paused for the `Retry-After` interval,
+    so concurrent workers back off together instead of each hitting the
+    limit in turn.
+    """
+
+    def __init__(self, requests_per_second: float = 3.0, burst: int = 3, max_retries: int = 5):
+        self.rate = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.retry_count = 0
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.request_count += 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def call(self, fn: Callable, operation: str = "other", **kwargs):
+        """Call a Notion API method under the limiter, retrying on HTTP 429.
+
+        `operation` names the method in the request metrics.
+        """
+        attempt = 0
+        while True:
+            with timed(NOTION_WAIT_SECONDS):
+                self.acquire()
+            try:
+                with timed(NOTION_REQUEST_SECONDS, operation=operation):
+                    result = fn(**kwargs)
+            except APIResponseError as e:
+                NOTION_REQUESTS.inc(operation=operation, status=str(e.status))
+                if e.status != 429 or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retry_count += 1
+                NOTION_RETRIES.inc(operation=operation)
+                delay = self._retry_after(e.headers.get("Retry-After"), attempt)
+                print(f"Rate limited by Notion, retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+                self.pause(delay)
+            except Exception:
+                NOTION_REQUESTS.inc(operation=operation, status="error")
+                raise
+            else:
+                NOTION_REQUESTS.inc(operation=operation, status="ok")
+                return result
+
+    @staticmethod
+    def _retry_after(header: Optional[str], attempt: int) -> float:
+        try:
+            return max(float(header), 0.0)
+        except (TypeError, ValueError):
+            return min(2.0 ** attempt, 60.0)
@@ -1,29 +1,128 @@
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
+import asyncio
+import hashlib
+import hmac
 import json
+import threading
+from contextlib import asynccontextmanager
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from src.indexer.meilisearch_client import SearchIndexer
 from src.llm.llm_service import LLMService
 from src.llm.llm_client import OpenAIClient
+from src.llm.cache import TTLCache, create_response_cache
+from src.llm.embedder import create_embedder
+from src.indexer.vector_index import LocalVectorIndex
 from src.slack_client import SlackClient
+from src.event_dispatcher import ChangeDebouncer, EventDispatcher, SeenSet
 from src.config.config import config
+from src.metrics import NOTION_PAGE_CHANGES_PENDING, NOTION_WEBHOOK_EVENTS, SLACK_QUEUE_DEPTH, registry
 
-app = FastAPI()
-
-# Initialize services
-search_indexer = SearchIndexer(host=config.MEILISEARCH_HOST, api_key=config.MEILISEARCH_KEY)
-search_indexer.configure_search_settings()
-llm_service = LLMService(
-    search_indexer=search_indexer,
-    llm_client=OpenAIClient(
-        model='gpt-3.5-turbo',  # Default model
-        api_key=config.OPENAI_API_KEY
-    )
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pooled Slack session and its retry workers for the server's lifetime
+    await slack_client.start()
+    await dispatcher.start()
+    await page_changes.start()
+    # Warm up the answering services in the background
+    warm_up = asyncio.get_running_loop().run_in_executor(None, get_llm_service)
+    yield
+    # Stop taking events, then close pooled connections on shutdown
+    await dispatcher.close()
+    await page_changes.close()
+    await slack_client.close()
+    await asyncio.gather(warm_up, return_exceptions=True)
+    if _llm_service is not None:
+        await _llm_service.llm_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Services are built on first use, so the server starts answering Slack's
+# URL verification and health checks without waiting on MeiliSearch or OpenAI
+_llm_service: Optional[LLMService] = None
+_llm_service_lock = threading.Lock()
+
+def get_llm_service() -> LLMService:
+    """Return the question answering service, building it on first call."""
+    global _llm_service
+    with _llm_service_lock:
+        if _llm_service is None:
+            search_indexer = SearchIndexer(host=config.MEILISEARCH_HOST, api_key=config.MEILISEARCH_KEY, index_name=config.SEARCH_INDEX_NAME,
+                                           vector_dimensions=config.SEARCH_VECTOR_DIMENSIONS)
+            search_indexer.configure_search_settings()
+            _llm_service = LLMService(
+                search_indexer=search_indexer,
+                llm_client=OpenAIClient(
+                    model='gpt-3.5-turbo',  # Default model
+                    api_key=config.OPENAI_API_KEY,
+                    base_url=config.OPENAI_BASE_URL,
+                    timeout=config.LLM_TIMEOUT_SECONDS,
+                    max_connections=config.LLM_MAX_CONNECTIONS
+                ),
+                passage_mode=config.INDEX_MODE == "passage",
+                query_rewrite=config.QUERY_REWRITE,
+                rewrite_min_score=config.QUERY_REWRITE_MIN_SCORE,
+                rewrite_cache=TTLCache(config.REWRITE_CACHE_SIZE, config.REWRITE_CACHE_TTL_SECONDS),
+                response_cache=create_response_cache(
+                    config.ANSWER_CACHE,
+                    config.ANSWER_CACHE_PATH,
+                    config.ANSWER_CACHE_SIZE,
+                    config.ANSWER_CACHE_TTL_SECONDS
+                ),
+                embedder=create_embedder(
+                    config.EMBEDDER,
+                    config.EMBEDDING_DIMENSIONS,
+                    config.EMBEDDING_MODEL,
+                    api_key=config.OPENAI_API_KEY,
+                    base_url=config.OPENAI_BASE_URL
+                ) if config.RETRIEVAL_MODE == "hybrid" else None,
+                vector_index=LocalVectorIndex(
+                    config.VECTOR_INDEX_PATH,
+                    config.EMBEDDING_DIMENSIONS
+                ) if config.RETRIEVAL_MODE == "hybrid" and config.VECTOR_STORE == "local" else None,
+                semantic_ratio=config.HYBRID_SEMANTIC_RATIO,
+                crop_words=config.CONTEXT_CROP_WORDS,
+                multi_query=config.MULTI_QUERY
+            )
+        return _llm_service
+
+_sync_service = None
+_sync_service_lock = threading.Lock()
+
+def get_sync_service():
+    """Return the service that re-indexes pages changed in Notion, building it on first call."""
+    global _sync_service
+    with _sync_service_lock:
+        if _sync_service is None:
+            from src.sync.sync_service import SyncService
+            _sync_service = SyncService()
+        return _sync_service
+
+async def apply_page_changes(changed: List[str], deleted: List[str]):
+    """Re-index pages reported changed by Notion and remove deleted ones."""
+    sync_service = _sync_service or await asyncio.to_thread(get_sync_service)
+    update = await asyncio.to_thread(sync_service.update_pages, changed, deleted)
+    # A disk-backed answer cache was already invalidated by the sync service
+    if _llm_service is not None and _llm_service.response_cache is not None and config.ANSWER_CACHE != "disk":
+        _llm_service.response_cache.invalidate_documents(update["indexed"] + update["hierarchy_updated"] + update["deleted"])
+
+page_changes = ChangeDebouncer(
+    apply_page_changes,
+    debounce_seconds=config.NOTION_WEBHOOK_DEBOUNCE_SECONDS,
+    max_delay_seconds=config.NOTION_WEBHOOK_MAX_DELAY_SECONDS
+)
+
+slack_client = SlackClient(
+    bot_token=config.SLACK_BOT_TOKEN,
+    update_interval=config.SLACK_UPDATE_INTERVAL_SECONDS,
+    base_url=config.SLACK_API_URL,
+    channel_interval=config.SLACK_CHANNEL_INTERVAL_SECONDS,
+    max_retries=config.SLACK_MAX_RETRIES,
+    retry_queue_size=config.SLACK_RETRY_QUEUE_SIZE
 )
-slack_client = SlackClient(bot_token=config.SLACK_BOT_TOKEN)
 
 # This is the new function that contains all the message processing logic
 async def process_message(event: Dict[str, Any]):
@@ -33,21 +132,36 @@ async def process_message(event: Dict[str, Any]):
         if not user_message:
             return
 
-        response = llm_service.generate_response(
-            user_message,
-            max_context_length=40000,
-            temperature=0.7
-        )
-        
         # Send response back to Slack
         channel = event.get("channel")
         thread_ts = event.get("thread_ts") if event.get("thread_ts") else None
-        
-        success = await slack_client.post_message(
-            channel=channel,
-            text=response,
-            thread_ts=thread_ts
-        )
+        # Wait for the warm-up off the event loop if it hasn't finished yet
+        llm_service = _llm_service or await asyncio.to_thread(get_llm_service)
+
+        if config.SLACK_STREAMING:
+            # Post a placeholder right away and fill it in as tokens arrive
+            success = await slack_client.stream_message(
+                channel=channel,
+                chunks=llm_service.astream_response(
+                    user_message,
+                    max_context_length=40000,
+                    max_context_tokens=config.CONTEXT_MAX_TOKENS,
+                    temperature=0.7
+                ),
+                thread_ts=thread_ts
+            )
+        else:
+            response = await llm_service.agenerate_response(
+                user_message,
+                max_context_length=40000,
+                max_context_tokens=config.CONTEXT_MAX_TOKENS,
+                temperature=0.7
+            )
+            success = await slack_client.post_message(
+                channel=channel,
+                text=response,
+                thread_ts=thread_ts
+            )
         
         if not success:
             print(f"Failed to send response to Slack for user {event.get('user')}")
@@ -55,11 +169,35 @@ async def process_message(event: Dict[str, Any]):
     except Exception as e:
         print(f"Error processing message: {str(e)}")
 
+# Bounded worker pool for incoming questions, and the events already accepted
+dispatcher = EventDispatcher(
+    process_message,
+    concurrency=config.SLACK_EVENT_WORKERS,
+    max_queue=config.SLACK_EVENT_QUEUE_SIZE
+)
+seen_events = SeenSet(ttl_seconds=config.SLACK_EVENT_DEDUPE_TTL_SECONDS)
+
+@app.get("/metrics")
+async def metrics():
+    """Every counter and latency histogram, in the Prometheus text format."""
+    SLACK_QUEUE_DEPTH.set(dispatcher.get_metrics()["queued"], queue="events")
+    SLACK_QUEUE_DEPTH.set(slack_client.get_metrics()["retry_queue_depth"], queue="retries")
+    NOTION_PAGE_CHANGES_PENDING.set(page_changes.get_metrics()["pending"])
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/slack/metrics")
+async def slack_metrics():
+    """Outbound Slack delivery counters and latency, plus event queue counters."""
+    metrics = slack_client.get_metrics()
+    metrics.update({f"events_{name}": value for name, value in dispatcher.get_metrics().items()})
+    return metrics
+
 @app.post("/slack/events")
-async def handle_slack_event(request: Request, background_tasks: BackgroundTasks):
+async def handle_slack_event(request: Request):
     try:
         # Parse the request body
         body = await request.json()
+        retry_num = request.headers.get("X-Slack-Retry-Num")
         
         # Handle URL verification challenge
         if body.get("type") == "url_verification":
@@ -79,8 +217,19 @@ async def handle_slack_event(request: Request, background_tasks: BackgroundTasks
                 print("Ignoring message from bot")
                 return JSONResponse(content={"ok": True})
             
-            # Process the message in the background
-            background_tasks.add_task(process_message, event)
+            # Slack redelivers events it thinks we missed, and may send the same
+            # message as both a message and an app_mention event
+            event_keys = [body.get("event_id"), event.get("client_msg_id")]
+            if not seen_events.add_if_new(event_keys):
+                print(f"Ignoring duplicate event {body.get('event_id')} (retry {retry_num})")
+                return JSONResponse(content={"ok": True}, headers={"X-Slack-No-Retry": "1"})
+
+            # Queue the message for the worker pool; when it is full, shed the
+            # event with a 503 so Slack retries it later
+            if not dispatcher.submit(event):
+                seen_events.discard(event_keys)
+                print(f"Event queue full, shedding event {body.get('event_id')}")
+                return JSONResponse(status_code=503, content={"ok": False, "error": "overloaded"})
                     
         return JSONResponse(content={"ok": True})
         
@@ -88,6 +237,51 @@ async def handle_slack_event(request: Request, background_tasks: BackgroundTasks
         print(f"Error handling Slack event: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _valid_notion_signature(body: bytes, signature: Optional[str]) -> bool:
+    expected = "sha256=" + hmac.new(config.NOTION_WEBHOOK_VERIFICATION_TOKEN.encode(), body, hashlib.sha256).hexdigest()
+    return bool(signature) and hmac.compare_digest(expected, signature)
+
+@app.post("/notion/webhook")
+async def handle_notion_webhook(request: Request):
+    """Queue the pages named in Notion webhook events for re-indexing.
+
+    Takes one event or a JSON list of them, so a local change feed can post
+    in batches. Events are debounced per page; events about anything but
+    pages are ignored. A `page.deleted` page is only removed from the index
+    once Notion no longer returns it. Until a verification token is
+    configured, events are refused, since they could not be authenticated.
+    """
+    raw_body = await request.body()
+    try:
+        body = json.loads(raw_body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    # Sent once when the subscription is created, to be pasted back into Notion
+    if isinstance(body, dict) and "verification_token" in body:
+        print(f"Notion webhook verification token: {body['verification_token']}")
+        return {"ok": True}
+
+    if not config.NOTION_WEBHOOK_VERIFICATION_TOKEN:
+        NOTION_WEBHOOK_EVENTS.inc(result="rejected")
+        raise HTTPException(status_code=403, detail="Set NOTION_WEBHOOK_VERIFICATION_TOKEN to accept webhook events")
+    if not _valid_notion_signature(raw_body, request.headers.get("X-Notion-Signature")):
+        NOTION_WEBHOOK_EVENTS.inc(result="rejected")
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    events = body if isinstance(body, list) else [body]
+    if not all(isinstance(event, dict) and isinstance(event.get("entity") or {}, dict) for event in events):
+        NOTION_WEBHOOK_EVENTS.inc(result="rejected")
+        raise HTTPException(status_code=400, detail="Events must be JSON objects")
+    for event in events:
+        entity = event.get("entity") or {}
+        if entity.get("type") != "page" or not entity.get("id"):
+            NOTION_WEBHOOK_EVENTS.inc(result="ignored")
+            continue
+        page_changes.submit(entity["id"], deleted=event.get("type") == "page.deleted")
+        NOTION_WEBHOOK_EVENTS.inc(result="accepted")
+    return {"ok": True}
+
 def start_server(host: str = "0.0.0.0", port: int = 8000):
     """Start the FastAPI server."""
     uvicorn.run(app, host=host, port=port)
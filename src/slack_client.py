@@ -1,11 +1,192 @@
+import asyncio
+import time
 import aiohttp
-from typing import Optional
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
 from src.config.config import config
+from src.metrics import SLACK_REQUEST_SECONDS, SLACK_REQUESTS, timed
+
+class SlackRetryableError(Exception):
+    """A Slack call that failed in a way worth retrying (429, 5xx, network)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, rate_limited: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited or retry_after is not None
 
 class SlackClient:
-    def __init__(self, bot_token: str):
+    def __init__(self, bot_token: str, update_interval: float = 1.0, base_url: str = "https://slack.com/api",
+                 channel_interval: float = 1.0, max_retries: int = 5, retry_queue_size: int = 100, retry_workers: int = 4):
+        """Create a Slack client.
+
+        Args:
+            bot_token: Bot token used for all API calls
+            update_interval: Seconds between edits of a streamed message
+            base_url: Web API root, e.g. a local fake Slack server
+            channel_interval: Minimum seconds between calls writing to one channel
+            max_retries: Attempts per message after the first one fails
+            retry_queue_size: Most deliveries waiting for a retry; further failures are dropped
+            retry_workers: Number of tasks draining the retry queue
+        """
         self.bot_token = bot_token
-        self.base_url = "https://slack.com/api"
+        self.base_url = base_url
+        self.update_interval = update_interval
+        self.channel_interval = channel_interval
+        self.max_retries = max_retries
+        self.retry_workers = retry_workers
+        self._next_call_at: Dict[str, float] = {}  # channel -> earliest time for the next call
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.retry_queue_size = retry_queue_size
+        self._retry_queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._counters = {"delivered": 0, "failed": 0, "retried": 0, "dropped": 0, "rate_limited": 0}
+        self._latencies = deque(maxlen=1000)  # seconds from first attempt to delivery
+
+    async def start(self):
+        """Open the pooled HTTP session and start the retry workers."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.bot_token}"},
+                connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        if self._retry_queue is None:
+            self._retry_queue = asyncio.Queue(maxsize=self.retry_queue_size)
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._retry_worker()) for _ in range(self.retry_workers)]
+
+    async def close(self):
+        """Stop the retry workers and close the HTTP session."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def get_metrics(self) -> dict:
+        """Delivery counters and latency percentiles over recent deliveries."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+
+        return {
+            **self._counters,
+            "retry_queue_depth": self._retry_queue.qsize() if self._retry_queue is not None else 0,
+            "latency_p50_seconds": percentile(0.5),
+            "latency_p95_seconds": percentile(0.95),
+            "latency_max_seconds": latencies[-1] if latencies else 0.0
+        }
+
+    async def _request(self, method: str, payload: dict) -> dict:
+        """Make a single Web API call, raising SlackRetryableError for transient failures."""
+        if self._session is None:
+            await self.start()
+        try:
+            with timed(SLACK_REQUEST_SECONDS, method=method):
+                result = await self._post(method, payload)
+        except SlackRetryableError as e:
+            SLACK_REQUESTS.inc(method=method, outcome="rate_limited" if e.rate_limited else "retryable")
+            raise
+        SLACK_REQUESTS.inc(method=method, outcome="ok" if result.get("ok", False) else "error")
+        return result
+
+    async def _post(self, method: str, payload: dict) -> dict:
+        try:
+            async with self._session.post(f"{self.base_url}/{method}", json=payload) as response:
+                if response.status == 429:
+                    self._counters["rate_limited"] += 1
+                    retry_after = self._retry_after(response.headers.get("Retry-After"))
+                    raise SlackRetryableError(f"{method} rate limited", retry_after, rate_limited=True)
+                if response.status >= 500:
+                    raise SlackRetryableError(f"{method} failed with HTTP {response.status}")
+                result = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise SlackRetryableError(f"{method} failed: {e}")
+        if result.get("error") == "ratelimited":
+            self._counters["rate_limited"] += 1
+            raise SlackRetryableError(f"{method} rate limited", 1.0)
+        return result
+
+    @staticmethod
+    def _retry_after(header: Optional[str]) -> Optional[float]:
+        """Seconds from a `Retry-After` header, or None to back off exponentially if it is missing or not a number."""
+        try:
+            return max(float(header), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    async def _api_call(self, method: str, payload: dict, retry: bool = True) -> dict:
+        """Call a Slack Web API method, queueing it for retries if it fails transiently."""
+        started_at = time.monotonic()
+        channel = payload.get("channel", "")
+        await self._wait_for_channel(channel)
+        try:
+            result = await self._request(method, payload)
+        except SlackRetryableError as e:
+            self._pause_channel(channel, e.retry_after)
+            if not retry or self.max_retries <= 0:
+                self._counters["failed"] += 1
+                return {"ok": False, "error": str(e)}
+            delivered = asyncio.get_running_loop().create_future()
+            try:
+                self._retry_queue.put_nowait((method, payload, 1, e.retry_after, delivered))
+            except asyncio.QueueFull:
+                self._counters["dropped"] += 1
+                print(f"Slack retry queue full, dropping {method} to {channel}")
+                return {"ok": False, "error": "retry_queue_full"}
+            result = await delivered
+        self._record(result, started_at)
+        return result
+
+    async def _retry_worker(self):
+        while True:
+            method, payload, attempt, retry_after, delivered = await self._retry_queue.get()
+            try:
+                # Exponential backoff unless Slack told us how long to wait
+                await asyncio.sleep(retry_after if retry_after is not None else min(2 ** (attempt - 1), 60))
+                self._counters["retried"] += 1
+                channel = payload.get("channel", "")
+                await self._wait_for_channel(channel)
+                try:
+                    delivered.set_result(await self._request(method, payload))
+                except SlackRetryableError as e:
+                    self._pause_channel(channel, e.retry_after)
+                    if attempt >= self.max_retries:
+                        print(f"Giving up on {method} to {channel} after {attempt} retries: {e}")
+                        delivered.set_result({"ok": False, "error": str(e)})
+                        continue
+                    try:
+                        self._retry_queue.put_nowait((method, payload, attempt + 1, e.retry_after, delivered))
+                    except asyncio.QueueFull:
+                        self._counters["dropped"] += 1
+                        delivered.set_result({"ok": False, "error": "retry_queue_full"})
+            except Exception as e:
+                if not delivered.done():
+                    delivered.set_result({"ok": False, "error": str(e)})
+            finally:
+                self._retry_queue.task_done()
+
+    def _record(self, result: dict, started_at: float):
+        if result.get("ok", False):
+            self._counters["delivered"] += 1
+            self._latencies.append(time.monotonic() - started_at)
+        else:
+            self._counters["failed"] += 1
+
+    async def _wait_for_channel(self, channel: str):
+        """Space out calls writing to a channel to stay under Slack's rate limits."""
+        now = time.monotonic()
+        slot = max(now, self._next_call_at.get(channel, 0.0))
+        self._next_call_at[channel] = slot + self.channel_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _pause_channel(self, channel: str, seconds: Optional[float]):
+        if seconds:
+            self._next_call_at[channel] = max(self._next_call_at.get(channel, 0.0), time.monotonic() + seconds)
     
     async def post_message(self, channel: str, text: str, thread_ts: Optional[str] = None) -> bool:
         """
@@ -19,12 +200,10 @@ class SlackClient:
         Returns:
             bool: True if successful, False otherwise
         """
-        url = f"{self.base_url}/chat.postMessage"
-        headers = {
-            "Authorization": f"Bearer {self.bot_token}",
-            "Content-Type": "application/json"
-        }
-        
+        return await self.post_message_ts(channel, text, thread_ts) is not None
+
+    async def post_message_ts(self, channel: str, text: str, thread_ts: Optional[str] = None) -> Optional[str]:
+        """Post a message and return its timestamp, or None if posting failed."""
         payload = {
             "channel": channel,
             "text": text
@@ -33,7 +212,59 @@ class SlackClient:
         if thread_ts:
             payload["thread_ts"] = thread_ts
             
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                result = await response.json()
-                return result.get("ok", False) 
\ No newline at end of file
+        result = await self._api_call("chat.postMessage", payload)
+        return result.get("ts") if result.get("ok", False) else None
+
+    async def update_message(self, channel: str, ts: str, text: str, retry: bool = True) -> bool:
+        """Replace the text of a message we posted earlier."""
+        result = await self._api_call("chat.update", {"channel": channel, "ts": ts, "text": text}, retry=retry)
+        return result.get("ok", False)
+
+    async def stream_message(self, channel: str, chunks: AsyncIterator[str], thread_ts: Optional[str] = None,
+                             placeholder: str = "_Thinking..._") -> bool:
+        """
+        Post a placeholder right away and edit it in place as `chunks` arrive.
+
+        Edits are coalesced: at most one `chat.update` every `update_interval`
+        seconds, always with all text received so far, and a final edit with
+        the complete text. Intermediate edits are not retried, since the
+        next one carries the same text.
+
+        Returns:
+            bool: True if the complete text was delivered, False otherwise
+        """
+        ts = await self.post_message_ts(channel, placeholder, thread_ts)
+        if ts is None:
+            return False
+
+        parts = []
+        finished = asyncio.Event()
+
+        async def push_updates():
+            shown = placeholder
+            while not finished.is_set():
+                try:
+                    await asyncio.wait_for(finished.wait(), timeout=self.update_interval)
+                except asyncio.TimeoutError:
+                    pass
+                text = "".join(parts)
+                if text and text != shown and not finished.is_set() and await self.update_message(channel, ts, text, retry=False):
+                    shown = text
+
+        updater = asyncio.create_task(push_updates())
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+        except Exception as e:
+            # Don't leave the placeholder or a partial answer up when answering fails
+            print(f"Error streaming message: {e}")
+            failed = True
+        else:
+            failed = False
+        finally:
+            finished.set()
+            await updater
+        if failed:
+            await self.update_message(channel, ts, "Sorry, I couldn't generate a response.")
+            return False
+        return await self.update_message(channel, ts, "".join(parts) or "Sorry, I couldn't generate a response.")
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import time
+from typing import Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class SearchBatch:
+    """One response of the paginated Notion search and the progress on its pages."""
+
+    def __init__(self, start_cursor: Optional[str], next_cursor: Optional[str]):
+        self.start_cursor = start_cursor
+        self.next_cursor = next_cursor
+        self.pending: Set[str] = set()
+        self.processed: Set[str] = set()
+
+class CrawlCheckpoint:
+    """Position of a crawl through the Notion search results, persisted so it can be resumed.
+
+    The crawl fetches pages out of order, so the checkpoint is the start
+    cursor of the oldest search response that still has pages in flight,
+    together with the ids of the pages already processed from that response
+    onwards. A resumed crawl starts the search at the cursor and skips those
+    ids. Without a `path` the checkpoint lives in memory only.
+
+    Pages whose indexing failed after they were marked done are taken back
+    with `forget`. If the crawl has already moved past their search
+    response, they are kept in `retry` for a resumed crawl to fetch directly.
+
+    Once the search is finished, `pages_done` is set and the databases whose
+    rows are indexed in bulk afterwards are added to `databases_done`, so an
+    interrupted database phase resumes without crawling the pages again.
+
+    Pages found renamed or moved are kept in `moved` until the crawl
+    completes, so that their descendants' hierarchy can be rewritten.
+
+    Saving is left to the caller, which must first make the processed pages
+    durable (sent to the index and recorded in the sync state).
+    """
+
+    def __init__(self, path: Optional[str] = None, interval_seconds: float = 60.0):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.scope: Optional[str] = None
+        self.full_resync = False
+        self.cursor: Optional[str] = None
+        self.processed: Set[str] = set()
+        self.retry: Set[str] = set()
+        self.pages_done = False
+        self.databases_done: Set[str] = set()
+        self.moved: Set[str] = set()
+        self.pages_processed = 0
+        self.search_requests = 0
+        self.resumed_pages = 0  # pages processed before the resumed crawl was interrupted
+        self.resumed_requests = 0  # search requests it had made
+        self._skip: Set[str] = set()
+        self._batches: List[SearchBatch] = []
+        self._saved_at = time.monotonic()
+        self.load()
+
+    def load(self):
+        """Load a saved checkpoint, if there is a readable one."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read crawl checkpoint {self.path}, ignoring it: {e}")
+            return
+        self.scope = data.get("scope")
+        self.full_resync = data.get("full_resync", False)
+        self.cursor = data.get("cursor")
+        self.processed = set(data.get("processed", []))
+        self.retry = set(data.get("retry", []))
+        self.pages_done = data.get("pages_done", False)
+        self.databases_done = set(data.get("databases_done", []))
+        self.moved = set(data.get("moved", []))
+        self.pages_processed = data.get("pages_processed", 0)
+        self.search_requests = data.get("search_requests", 0)
+
+    def save(self):
+        """Atomically write the checkpoint."""
+        self._saved_at = time.monotonic()
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "scope": self.scope,
+                "full_resync": self.full_resync,
+                "cursor": self.cursor,
+                "processed": sorted(self.processed),
+                "retry": sorted(self.retry),
+                "pages_done": self.pages_done,
+                "databases_done": sorted(self.databases_done),
+                "moved": sorted(self.moved),
+                "pages_processed": self.pages_processed,
+                "search_requests": self.search_requests
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Forget the checkpoint once the crawl has completed."""
+        self.start(None, False)
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def resume(self, scope: str, full_resync: bool) -> bool:
+        """Return True if a saved crawl of `scope` can be continued; otherwise start a new one.
+
+        An interrupted full resync is resumed even if an incremental sync was
+        asked for, since finishing it saves the most work. An interrupted
+        incremental sync is not resumed when a full resync is asked for.
+        """
+        if self.scope == scope and (self.cursor or self.processed or self.retry or self.pages_done) and (self.full_resync or not full_resync):
+            self._skip = set(self.processed)
+            self.resumed_pages = self.pages_processed
+            self.resumed_requests = self.search_requests
+            return True
+        self.start(scope, full_resync)
+        return False
+
+    def start(self, scope: Optional[str], full_resync: bool):
+        """Reset the position to the beginning of a new crawl."""
+        self.scope = scope
+        self.full_resync = full_resync
+        self.cursor = None
+        self.processed = set()
+        self.retry = set()
+        self.pages_done = False
+        self.databases_done = set()
+        self.moved = set()
+        self.pages_processed = 0
+        self.search_requests = 0
+        self.resumed_pages = 0
+        self.resumed_requests = 0
+        self._skip = set()
+        self._batches = []
+
+    def due(self) -> bool:
+        """Return True if the checkpoint was last saved at least `interval_seconds` ago."""
+        return self.interval_seconds > 0 and time.monotonic() - self._saved_at >= self.interval_seconds
+
+    def add_batch(self, start_cursor: Optional[str], next_cursor: Optional[str], page_ids: List[str]) -> SearchBatch:
+        """Track a search response starting at `start_cursor` and listing `page_ids`.
+
+        Pages processed before a resumed crawl was interrupted are marked
+        done right away; the caller skips those in `batch.processed`.
+        """
+        batch = SearchBatch(start_cursor, next_cursor)
+        for page_id in page_ids:
+            (batch.processed if page_id in self._skip else batch.pending).add(page_id)
+        self._batches.append(batch)
+        self.search_requests += 1
+        self._advance()
+        return batch
+
+    def page_done(self, batch: SearchBatch, page_id: str):
+        """Mark a page of `batch` as processed, whether or not it needed indexing."""
+        batch.pending.discard(page_id)
+        batch.processed.add(page_id)
+        self.pages_processed += 1
+        self._advance()
+
+    def finish_pages(self):
+        """Mark the search as finished; pages still pending are kept in `retry`."""
+        for batch in self._batches:
+            self.retry.update(batch.pending)
+        self._batches = []
+        self.cursor = None
+        self.processed = set()
+        self.pages_done = True
+
+    def database_done(self, database_id: str):
+        """Mark a database whose rows are all indexed."""
+        self.databases_done.add(database_id)
+
+    def forget_databases(self, database_ids: Iterable[str]):
+        """Take back databases with rows that did not make it into the index."""
+        self.databases_done.difference_update(database_ids)
+
+    def forget(self, page_ids: Iterable[str]):
+        """Take back pages that were marked done but did not make it into the index."""
+        for page_id in page_ids:
+            self._skip.discard(page_id)
+            if any(page_id in batch.pending for batch in self._batches):
+                continue
+            batch = next((batch for batch in self._batches if page_id in batch.processed), None)
+            if batch is not None:
+                # Not behind the cursor yet, so a resumed crawl finds it in the search again
+                batch.processed.discard(page_id)
+                batch.pending.add(page_id)
+            else:
+                self.retry.add(page_id)
+        if self._batches:
+            self._advance()
+
+    def _advance(self):
+        # Responses that are done are behind the resume point; the last one is kept for its next cursor
+        while len(self._batches) > 1 and not self._batches[0].pending:
+            self._batches.pop(0)
+        first = self._batches[0]
+        if len(self._batches) == 1 and not first.pending:
+            self.cursor = first.next_cursor
+            self.processed = set()
+        else:
+            self.cursor = first.start_cursor
+            self.processed = {page_id for batch in self._batches for page_id in batch.processed}
@@ -1,9 +1,25 @@
+import argparse
+import os
 import time
 import logging
+from typing import List, Optional, Tuple
 from datetime import datetime
 from ..config.config import config
 from ..notion.client import NotionClient
+from ..notion.page_cache import PageMetadataCache
 from ..indexer.meilisearch_client import SearchIndexer
+from ..indexer.bulk_indexer import BulkIndexer
+from ..indexer.chunker import page_to_passages
+from ..indexer.embedding_indexer import EmbeddingIndexer
+from ..indexer.vector_index import LocalVectorIndex
+from ..llm.cache import create_response_cache
+from ..llm.embedder import create_embedder
+from ..metrics import (
+    INDEX_DOCUMENTS, INDEX_WRITE_SECONDS, NOTION_REQUEST_SECONDS, NOTION_REQUESTS, NOTION_RETRIES,
+    NOTION_WAIT_SECONDS, SYNC_STAGE_SECONDS, changes_since
+)
+from .crawl_checkpoint import CrawlCheckpoint
+from .sync_state import SyncState
 
 # Configure logging
 logging.basicConfig(
@@ -12,41 +28,422 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Metrics summarized in the log after every crawl
+_SUMMARY_METRICS = (NOTION_REQUEST_SECONDS, NOTION_REQUESTS, NOTION_RETRIES, NOTION_WAIT_SECONDS,
+                    INDEX_WRITE_SECONDS, INDEX_DOCUMENTS)
+
 class SyncService:
     def __init__(self):
-        self.notion_client = NotionClient(config.NOTION_API_KEY)
-        self.indexer = SearchIndexer(config.MEILISEARCH_HOST, config.MEILISEARCH_KEY)
+        self.notion_client = NotionClient(
+            config.NOTION_API_KEY,
+            base_url=config.NOTION_BASE_URL,
+            concurrency=config.NOTION_CONCURRENCY,
+            requests_per_second=config.NOTION_REQUESTS_PER_SECOND,
+            max_block_depth=config.NOTION_MAX_BLOCK_DEPTH,
+            page_cache=PageMetadataCache(
+                max_entries=config.PAGE_CACHE_SIZE,
+                path=os.path.join(config.SYNC_STATE_DIR, "page_cache.json")
+            ),
+            database_rows=config.NOTION_DATABASE_ROWS,
+            bodyless_databases=config.NOTION_BODYLESS_DATABASES
+        )
+        self.indexer = SearchIndexer(config.MEILISEARCH_HOST, config.MEILISEARCH_KEY, index_name=config.SEARCH_INDEX_NAME,
+                                     vector_dimensions=config.SEARCH_VECTOR_DIMENSIONS)
         self.sync_interval = config.SYNC_INTERVAL_MINUTES * 60  # Convert to seconds
-        # Configure search settings
-        self.indexer.configure_search_settings()
+        self.sync_state = SyncState(os.path.join(config.SYNC_STATE_DIR, "sync_state.json"))
+        # Where an interrupted crawl picks up again; kept in memory only if checkpoints are disabled
+        self.checkpoint = CrawlCheckpoint(
+            os.path.join(config.SYNC_STATE_DIR, "crawl_checkpoint.json") if config.SYNC_CHECKPOINT_INTERVAL_SECONDS > 0 else None,
+            interval_seconds=config.SYNC_CHECKPOINT_INTERVAL_SECONDS
+        )
+        # Only a disk-backed answer cache is shared with the processes answering questions
+        self.response_cache = create_response_cache(
+            config.ANSWER_CACHE, config.ANSWER_CACHE_PATH,
+            config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL_SECONDS
+        ) if config.ANSWER_CACHE == "disk" else None
+        # Hybrid retrieval embeds changed documents as they are indexed
+        hybrid = config.RETRIEVAL_MODE == "hybrid"
+        self.embedder = create_embedder(
+            config.EMBEDDER, config.EMBEDDING_DIMENSIONS, config.EMBEDDING_MODEL,
+            api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL
+        ) if hybrid else None
+        self.vector_index = LocalVectorIndex(
+            config.VECTOR_INDEX_PATH, config.EMBEDDING_DIMENSIONS
+        ) if hybrid and config.VECTOR_STORE == "local" else None
+        # Search settings are checked on the first sync rather than at startup
+        self._settings_checked = False
+
+    def sync(self, full_resync: bool = False):
+        """Perform a single sync operation.
 
-    def sync(self):
-        """Perform a single sync operation."""
+        Only pages that are new or edited since the previous sync are fetched
+        and re-indexed, unless `full_resync` is set. If the previous sync was
+        interrupted, it is resumed from its last checkpoint instead of
+        starting the crawl over.
+        """
         try:
-            logger.info("Starting sync operation...")
-            
-            # Fetch pages from Notion
-            logger.info("Fetching pages from Notion...")
-            added_count = self.notion_client.fetch_and_index_all_pages(self.indexer.index_pages)
-            logger.info(f"Added {added_count} pages to the index")
-            
-            # Index the pages
-            # logger.info(f"Found {len(pages)} pages. Indexing...")
-            # success = self.indexer.index_pages(pages)
-            
+            # Webhook updates may have written the state since the last sync
+            self._load_state()
+            resuming = self.checkpoint.resume(f"{self.indexer.index_name}:{config.INDEX_MODE}", full_resync)
+            full_resync = self.checkpoint.full_resync
+            if resuming:
+                logger.info(f"Resuming interrupted {'full' if full_resync else 'incremental'} sync from its checkpoint")
+            else:
+                logger.info(f"Starting {'full' if full_resync else 'incremental'} sync operation...")
+            if not self._settings_checked:
+                # Only sends settings if the index reports different ones
+                self._settings_checked = self.indexer.configure_search_settings()
+            summary = self._crawl(self.indexer, self.sync_state, full_resync, self.vector_index, self.checkpoint)
+            if summary["resumed_pages"]:
+                logger.info(f"Resuming skipped {summary['resumed_pages']} already-processed pages and {summary['resumed_requests']} search requests")
             logger.info("Sync completed successfully!")
             return True
         except Exception as e:
             logger.error(f"Error during sync: {e}")
             return False
+        finally:
+            self._save_state(self.sync_state, self.vector_index)
+
+    def rebuild(self):
+        """Rebuild the whole index without taking the live one offline.
+
+        Every page is written into a new shadow index, which is swapped into
+        place once it is complete. The live index keeps serving searches
+        throughout, and is left untouched if the rebuild fails or any page
+        fails to be fetched or indexed.
+        """
+        rebuild_state = SyncState(f"{self.sync_state.path}.rebuild")
+        rebuild_state.reset()
+        rebuild_vectors = None
+        if self.vector_index is not None:
+            rebuild_vectors = LocalVectorIndex(f"{self.vector_index.path}.rebuild", self.vector_index.dimensions)
+            rebuild_vectors.reset()
+        try:
+            logger.info("Starting index rebuild...")
+            shadow = self.indexer.create_shadow_index()
+            try:
+                # In memory only, to find out which pages could not be fetched
+                checkpoint = CrawlCheckpoint(interval_seconds=0)
+                summary = self._crawl(shadow, rebuild_state, full_resync=True, vector_index=rebuild_vectors, checkpoint=checkpoint)
+                if summary["failed_tasks"] or summary["failed_ids"] or summary["unfetched_ids"] or summary["failed_databases"]:
+                    raise RuntimeError(
+                        f"{len(summary['failed_tasks'])} indexing tasks failed, {len(summary['failed_ids']) + len(summary['unfetched_ids'])} "
+                        f"pages and {len(summary['failed_databases'])} databases are missing from the shadow index"
+                    )
+            except Exception:
+                self.indexer.client.delete_index(shadow.index_name)
+                raise
+            self.indexer.swap_in(shadow)
+            # The rebuilt index now reflects exactly what the rebuild state recorded
+            rebuild_state.save()
+            os.replace(rebuild_state.path, self.sync_state.path)
+            self.sync_state.load()
+            if rebuild_vectors is not None:
+                rebuild_vectors.save()
+                os.replace(rebuild_vectors.path, self.vector_index.path)
+                self.vector_index.load()
+            logger.info("Rebuild completed successfully!")
+            return True
+        except Exception as e:
+            logger.error(f"Error during rebuild: {e}")
+            return False
+        finally:
+            self.notion_client.page_cache.save()
+
+    @staticmethod
+    def _forget_failed(sync_state: SyncState, checkpoint: Optional[CrawlCheckpoint], failed_ids: List[str]):
+        """Take back pages that failed to index, so neither the next sync nor a resumed crawl skips them."""
+        if checkpoint is not None:
+            databases = {page_id: sync_state.database_of(page_id) for page_id in failed_ids}
+            checkpoint.forget([page_id for page_id, database_id in databases.items() if database_id is None])
+            checkpoint.forget_databases(database_id for database_id in databases.values() if database_id)
+        sync_state.forget(failed_ids)
+
+    def _load_state(self):
+        """Reload the state files shared with other processes, such as the server applying webhooks."""
+        self.sync_state.load()
+        self.notion_client.page_cache.load()
+        if self.vector_index is not None:
+            self.vector_index.load()
+
+    def _save_state(self, sync_state: SyncState, vector_index: Optional[LocalVectorIndex]):
+        sync_state.save()
+        self.notion_client.page_cache.save()
+        if vector_index is not None:
+            vector_index.save()
+
+    def _bulk_indexer(self, indexer: SearchIndexer, vector_index: Optional[LocalVectorIndex]):
+        """The batching pipeline documents are indexed through, embedding them in hybrid mode."""
+        bulk_indexer = BulkIndexer(
+            indexer,
+            max_documents=config.INDEX_BATCH_SIZE,
+            max_bytes=config.INDEX_BATCH_MAX_BYTES,
+            replace_key="page_id" if config.INDEX_MODE == "passage" else None
+        )
+        if self.embedder is not None:
+            bulk_indexer = EmbeddingIndexer(bulk_indexer, self.embedder, vector_index, batch_size=config.EMBEDDING_BATCH_SIZE)
+        return bulk_indexer
+
+    @staticmethod
+    def _index_callback(bulk_indexer, changed_ids: List[str]):
+        """The callback `NotionClient` hands page documents to; records their ids in `changed_ids`."""
+        def index_pages(docs):
+            changed_ids.extend(doc["id"] for doc in docs)
+            if config.INDEX_MODE == "passage":
+                # Keyed by page, so a page that no longer has passages still loses its old ones
+                return all([bulk_indexer.add(page_to_passages(doc, config.PASSAGE_MAX_CHARS), keys=[doc["id"]]) for doc in docs])
+            return bulk_indexer.add(docs)
+        return index_pages
+
+    def update_pages(self, changed_ids: List[str], deleted_ids: List[str] = ()) -> dict:
+        """Re-index only the given pages, e.g. as reported by Notion webhooks.
+
+        Changed pages are re-fetched and re-indexed if their document changed,
+        and pages Notion no longer returns are deleted. Pages in `deleted_ids`
+        are re-fetched as well rather than trusted, together with their cached
+        descendants, so those trashed with them are deleted. When a page's title or
+        parent changed, its descendants' hierarchy is rewritten in the index
+        without re-fetching them (their embeddings keep the old hierarchy
+        until they are next edited).
+        """
+        # The sync process may have written the state since it was loaded
+        self._load_state()
+        page_cache = self.notion_client.page_cache
+        deleted = set()
+        changed = list(changed_ids) + list(deleted_ids) + [child_id for page_id in deleted_ids for child_id in page_cache.descendants(page_id)]
+        changed = list(dict.fromkeys(changed))
 
-    def run_continuous_sync(self):
-        """Run sync operations continuously with the configured interval."""
+        bulk_indexer = self._bulk_indexer(self.indexer, self.vector_index)
+        indexed_ids = []
+        hierarchy_ids = []
+        tasks = []
+        try:
+            result = self.notion_client.fetch_and_index_pages(changed, self._index_callback(bulk_indexer, indexed_ids), self.sync_state)
+            deleted.update(result["gone"])
+            moved_descendants = [
+                child_id for page_id in result["moved"] for child_id in page_cache.descendants(page_id)
+                if child_id not in deleted and child_id not in changed
+            ]
+            if moved_descendants:
+                hierarchy_ids, task_uid = self._update_hierarchy(list(dict.fromkeys(moved_descendants)))
+                tasks.append(task_uid)
+            if deleted:
+                key = "page_id" if config.INDEX_MODE == "passage" else "id"
+                tasks.append(self.indexer.delete_documents_where(key, sorted(deleted)))
+        finally:
+            summary = bulk_indexer.finish()
+            self.sync_state.forget(summary["failed_ids"])
+            statuses = self.indexer.wait_for_tasks([uid for uid in tasks if uid is not None])
+            failed_tasks = [uid for uid, status in statuses.items() if status != "succeeded"]
+            for page_id in deleted:
+                page_cache.remove(page_id)
+            self.sync_state.forget(deleted)
+            if self.vector_index is not None:
+                self.vector_index.remove_groups(deleted)
+            self._save_state(self.sync_state, self.vector_index)
+
+        if self.response_cache is not None:
+            self.response_cache.invalidate_documents(indexed_ids + hierarchy_ids + sorted(deleted))
+        update = {
+            "indexed": result["indexed"],
+            "unchanged": result["unchanged"],
+            "deleted": sorted(deleted),
+            "hierarchy_updated": hierarchy_ids,
+            "failed": list(dict.fromkeys(result["failed"] + summary["failed_ids"])),
+            "failed_tasks": summary["failed_tasks"] + failed_tasks
+        }
+        logger.info(
+            f"Updated pages: {len(update['indexed'])} re-indexed, {len(update['unchanged'])} unchanged, "
+            f"{len(update['deleted'])} deleted, {len(update['hierarchy_updated'])} descendants with a new hierarchy, "
+            f"{len(update['failed'])} failed"
+        )
+        return update
+
+    def _update_hierarchy(self, page_ids: List[str], indexer: Optional[SearchIndexer] = None) -> Tuple[List[str], Optional[int]]:
+        """Rewrite the hierarchy of the indexed documents of `page_ids` from the metadata cache.
+
+        Returns the page ids that had documents and the update task uid.
+        """
+        indexer = indexer if indexer is not None else self.indexer
+        key = "page_id" if config.INDEX_MODE == "passage" else "id"
+        hierarchies = {}
+        updates = []
+        for doc in indexer.get_documents_where(key, page_ids, ["id", key]):
+            page_id = doc[key]
+            if page_id not in hierarchies:
+                hierarchies[page_id] = " > ".join(self.notion_client.get_page_hierarchy(page_id))
+            updates.append({"id": doc["id"], "hierarchy": hierarchies[page_id]})
+        if not updates:
+            return [], None
+        return list(hierarchies), indexer.update_documents(updates)
+
+    def _refresh_hierarchies(self, indexer: SearchIndexer, moved_ids: List[str]) -> List[str]:
+        """Rewrite the hierarchy of every indexed descendant of renamed or moved pages; return their ids.
+
+        Descendants indexed earlier in the crawl may have been built with the
+        old title, so they are rewritten too.
+        """
+        page_cache = self.notion_client.page_cache
+        descendants = list(dict.fromkeys(child_id for page_id in moved_ids for child_id in page_cache.descendants(page_id)))
+        if not descendants:
+            return []
+        hierarchy_ids, task_uid = self._update_hierarchy(descendants, indexer)
+        if task_uid is not None and indexer.wait_for_tasks([task_uid]).get(task_uid) != "succeeded":
+            logger.warning(f"Rewriting the hierarchy of {len(hierarchy_ids)} pages failed (task {task_uid})")
+            return []
+        logger.info(f"Rewrote the hierarchy of {len(hierarchy_ids)} descendants of {len(moved_ids)} renamed or moved pages")
+        return hierarchy_ids
+
+    def _crawl(self, indexer: SearchIndexer, sync_state: SyncState, full_resync: bool,
+               vector_index: Optional[LocalVectorIndex] = None, checkpoint: Optional[CrawlCheckpoint] = None):
+        """Fetch changed pages from Notion and bulk index them into `indexer`.
+
+        In hybrid mode the documents are embedded on the way, into
+        `vector_index` if given and into MeiliSearch otherwise.
+
+        With a `checkpoint`, the crawl continues from it and saves it
+        periodically. Before each save, the indexing tasks so far are waited
+        for and the sync state is written, so a resumed crawl never skips a
+        page that is missing from the index. The checkpoint is cleared when
+        the crawl completes and saved if it fails.
+
+        With `NOTION_DATABASE_ROWS`, database rows are skipped by the crawl and
+        indexed afterwards by querying each database in bulk. The checkpoint
+        is saved once the pages are done, then between databases when due.
+
+        Once the crawl completes, the descendants of pages whose title or
+        parent changed get their hierarchy rewritten, edited or not.
+        """
+        # Fetch pages from Notion
+        logger.info("Fetching pages from Notion...")
+        bulk_indexer = self._bulk_indexer(indexer, vector_index)
+        changed_ids = []
+        failed_databases = []
+        index_pages = self._index_callback(bulk_indexer, changed_ids)
+        metrics_before = {metric.name: metric.totals() for metric in _SUMMARY_METRICS}
+        stage_seconds = {}
+
+        def save_checkpoint():
+            # Pages that failed to index must not be skipped as done
+            self._forget_failed(sync_state, checkpoint, bulk_indexer.wait())
+            self._save_state(sync_state, vector_index)
+            checkpoint.save()
+
+        completed = False
+        started = time.perf_counter()
+        try:
+            added_count = self.notion_client.fetch_and_index_all_pages(
+                index_pages,
+                sync_state=sync_state,
+                full_resync=full_resync,
+                checkpoint=checkpoint,
+                on_checkpoint=save_checkpoint if checkpoint is not None else None
+            )
+            if config.NOTION_DATABASE_ROWS:
+                stage_seconds["crawl"] = time.perf_counter() - started
+                if checkpoint is not None:
+                    # An interrupted database phase resumes without crawling the pages again
+                    save_checkpoint()
+                started = time.perf_counter()
+                databases = self.notion_client.fetch_and_index_databases(
+                    index_pages,
+                    sync_state=sync_state,
+                    full_resync=full_resync,
+                    checkpoint=checkpoint,
+                    on_checkpoint=save_checkpoint if checkpoint is not None else None
+                )
+                added_count += databases["added"]
+                failed_databases = databases["failed"]
+            completed = True
+        finally:
+            stage_seconds["databases" if "crawl" in stage_seconds else "crawl"] = time.perf_counter() - started
+            # Index whatever was fetched, even if the crawl failed part way
+            started = time.perf_counter()
+            summary = bulk_indexer.finish()
+            stage_seconds["index_finish"] = time.perf_counter() - started
+            for stage, seconds in stage_seconds.items():
+                SYNC_STAGE_SECONDS.observe(seconds, stage=stage)
+            if completed and checkpoint is not None and checkpoint.moved:
+                try:
+                    changed_ids.extend(self._refresh_hierarchies(indexer, sorted(checkpoint.moved)))
+                except Exception as e:
+                    logger.error(f"Error rewriting hierarchies of moved pages: {e}")
+            summary["stages"] = self._stage_summary(stage_seconds, metrics_before)
+            summary["resumed_pages"] = checkpoint.resumed_pages if checkpoint is not None else 0
+            summary["resumed_requests"] = checkpoint.resumed_requests if checkpoint is not None else 0
+            # Pages whose fetch failed; not in the sync state, so the next sync fetches them again
+            summary["unfetched_ids"] = sorted(checkpoint.retry) if checkpoint is not None else []
+            summary["failed_databases"] = failed_databases
+            # Pages that did not make it into the index are retried next sync
+            self._forget_failed(sync_state, checkpoint, summary["failed_ids"])
+            if checkpoint is not None:
+                if completed:
+                    checkpoint.clear()
+                else:
+                    self._save_state(sync_state, vector_index)
+                    checkpoint.save()
+            if self.response_cache is not None and changed_ids:
+                invalidated = self.response_cache.invalidate_documents(changed_ids)
+                logger.info(f"Invalidated {invalidated} cached answers")
+        logger.info(f"Added {added_count} pages to the index")
+        logger.info(
+            f"Indexed {summary['documents']} documents in {summary['tasks']} tasks "
+            f"({summary['pages_per_second']:.1f} pages/sec)"
+        )
+        if "embedded" in summary:
+            logger.info(f"Embedded {summary['embedded']} changed documents")
+        if summary["failed_tasks"]:
+            logger.warning(
+                f"{len(summary['failed_tasks'])} indexing tasks failed ({summary['failed_tasks']}), "
+                f"{len(summary['failed_ids'])} pages will be retried on the next sync"
+            )
+        if summary["unfetched_ids"]:
+            logger.warning(f"{len(summary['unfetched_ids'])} pages could not be fetched and will be retried on the next sync")
+        self._log_stage_summary(summary["stages"])
+        return summary
+
+    @staticmethod
+    def _stage_summary(stage_seconds: dict, metrics_before: dict) -> dict:
+        """Stage timings plus the Notion and MeiliSearch calls made since `metrics_before`."""
+        changes = {metric.name: changes_since(metric, metrics_before[metric.name]) for metric in _SUMMARY_METRICS}
+        statuses = changes[NOTION_REQUESTS.name]
+        return {
+            "seconds": stage_seconds,
+            "notion_calls": {operation: {"requests": count, "seconds": seconds}
+                             for (operation,), (count, seconds) in changes[NOTION_REQUEST_SECONDS.name].items()},
+            "notion_retries": int(sum(changes[NOTION_RETRIES.name].values())),
+            "notion_rate_limited": int(sum(count for (_, status), count in statuses.items() if status == "429")),
+            "notion_errors": int(sum(count for (_, status), count in statuses.items() if status not in ("ok", "429"))),
+            "rate_limit_wait_seconds": sum(seconds for _, seconds in changes[NOTION_WAIT_SECONDS.name].values()),
+            "index_calls": {operation: {"requests": count, "seconds": seconds}
+                            for (operation,), (count, seconds) in changes[INDEX_WRITE_SECONDS.name].items()},
+            "index_documents": int(sum(changes[INDEX_DOCUMENTS.name].values()))
+        }
+
+    @staticmethod
+    def _log_stage_summary(stages: dict):
+        calls = lambda by_operation: ", ".join(
+            f"{operation} {call['requests']} calls/{call['seconds']:.1f}s" for operation, call in sorted(by_operation.items())
+        ) or "no calls"
+        logger.info("Sync stages: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in stages["seconds"].items()))
+        logger.info(
+            f"Notion API: {calls(stages['notion_calls'])}; {stages['notion_retries']} retries, "
+            f"{stages['notion_rate_limited']} rate limited, {stages['notion_errors']} errors, "
+            f"{stages['rate_limit_wait_seconds']:.1f}s waiting for the rate limiter"
+        )
+        logger.info(f"Search index: {calls(stages['index_calls'])}; {stages['index_documents']} documents sent")
+
+    def run_continuous_sync(self, full_resync: bool = False):
+        """Run sync operations continuously with the configured interval.
+
+        If `full_resync` is set, only the first run is a full resync.
+        """
         logger.info(f"Starting continuous sync service (interval: {config.SYNC_INTERVAL_MINUTES} minutes)")
         
         while True:
             try:
-                self.sync()
+                self.sync(full_resync=full_resync)
+                full_resync = False
             except Exception as e:
                 logger.error(f"Error in sync loop: {e}")
             
@@ -54,5 +451,9 @@ class SyncService:
             time.sleep(self.sync_interval)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sync Notion pages into the search index')
+    parser.add_argument('--full-resync', action='store_true', help='Re-fetch and re-index every page on the first run')
+    args = parser.parse_args()
+
     service = SyncService()
-    service.run_continuous_sync() 
\ No newline at end of file
+    service.run_continuous_sync(full_resync=args.full_resync)
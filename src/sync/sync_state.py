@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class SyncState:
+    """Persisted per-page `last_edited_time` watermarks and document hashes.
+
+    The state is a small JSON file mapping each indexed page id to the
+    `last_edited_time` Notion reported for it and a hash of the document we
+    last sent to MeiliSearch. Incremental syncs use it to skip pages that
+    have not been edited and index writes whose document did not change.
+
+    Databases whose rows are queried in bulk also get a watermark: the
+    newest row `last_edited_time` indexed, from which the next query starts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._pages: Dict[str, Dict[str, str]] = {}
+        self._databases: Dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        """Load the state file, starting empty if it is missing or unreadable."""
+        self._pages = {}
+        self._databases = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._pages = data.get("pages", {})
+            self._databases = data.get("databases", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read sync state {self.path}, starting fresh: {e}")
+            self._pages = {}
+            self._databases = {}
+
+    def save(self):
+        """Atomically write the state file."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self._pages, "databases": self._databases}, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """Forget every page, forcing the next sync to re-fetch everything."""
+        self._pages = {}
+        self._databases = {}
+
+    def __len__(self):
+        return len(self._pages)
+
+    def is_unchanged(self, page_id: str, last_edited_time: Optional[str]) -> bool:
+        """Return True if the page has not been edited since it was last indexed."""
+        entry = self._pages.get(page_id)
+        return bool(entry and last_edited_time and entry.get("last_edited_time") == last_edited_time)
+
+    def has_hash(self, page_id: str, content_hash: str) -> bool:
+        """Return True if the document last indexed for the page had this hash."""
+        entry = self._pages.get(page_id)
+        return bool(entry and entry.get("content_hash") == content_hash)
+
+    def update(self, page_id: str, last_edited_time: Optional[str], content_hash: str, database_id: Optional[str] = None):
+        self._pages[page_id] = {
+            "last_edited_time": last_edited_time,
+            "content_hash": content_hash
+        }
+        if database_id:
+            self._pages[page_id]["database_id"] = database_id
+
+    def forget(self, page_ids: Iterable[str]):
+        """Drop pages so they are re-fetched and re-indexed on the next sync.
+
+        A forgotten database row also resets its database's watermark, so the
+        next bulk query returns it again.
+        """
+        for page_id in page_ids:
+            entry = self._pages.pop(page_id, None)
+            if entry and entry.get("database_id") in self._databases:
+                self._databases[entry["database_id"]].pop("last_edited_time", None)
+
+    def database_watermark(self, database_id: str) -> Optional[str]:
+        """The newest row `last_edited_time` indexed from the database, if any."""
+        return self._databases.get(database_id, {}).get("last_edited_time")
+
+    def database_of(self, page_id: str) -> Optional[str]:
+        """The database a recorded page is a row of, if any."""
+        return self._pages.get(page_id, {}).get("database_id")
+
+    def update_database(self, database_id: str, last_edited_time: Optional[str]):
+        self._databases[database_id] = {}
+        if last_edited_time:
+            self._databases[database_id]["last_edited_time"] = last_edited_time
+
+    @staticmethod
+    def hash_document(doc: dict) -> str:
+        """Stable hash of an index document."""
+        payload = json.dumps(doc, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
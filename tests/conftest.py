@@ -0,0 +1,105 @@
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+class FakeIndexer:
+    """In-memory stand-in for `SearchIndexer` whose tasks run immediately."""
+
+    index_name = "test_pages"
+
+    def __init__(self, index_name=None):
+        if index_name:
+            self.index_name = index_name
+        self.documents = {}
+        self.calls = []
+        self.failing_tasks = set()
+        self.failing_ids = set()  # adding any of these documents fails the task
+        self._uids = itertools.count(1)
+
+    def add_documents(self, documents):
+        self.calls.append(("add", [doc["id"] for doc in documents]))
+        uid = next(self._uids)
+        if any(doc["id"] in self.failing_ids for doc in documents):
+            self.failing_tasks.add(uid)
+            return uid
+        for doc in documents:
+            self.documents[doc["id"]] = dict(doc)
+        return uid
+
+    def update_documents(self, documents):
+        self.calls.append(("update", [doc["id"] for doc in documents]))
+        for doc in documents:
+            self.documents.setdefault(doc["id"], {}).update(doc)
+        return next(self._uids)
+
+    def delete_documents_where(self, attribute, values):
+        self.calls.append(("delete", attribute, list(values)))
+        for doc_id in [doc_id for doc_id, doc in self.documents.items() if doc.get(attribute) in values]:
+            del self.documents[doc_id]
+        return next(self._uids)
+
+    def get_documents_where(self, attribute, values, fields):
+        return [{field: doc.get(field) for field in fields} for doc in self.documents.values() if doc.get(attribute) in values]
+
+    def wait_for_tasks(self, task_uids, timeout_seconds=300.0):
+        return {uid: "failed" if uid in self.failing_tasks else "succeeded" for uid in task_uids}
+
+    def configure_search_settings(self, force=False):
+        return True
+
+    def create_shadow_index(self):
+        self.shadow = FakeIndexer(f"{self.index_name}_shadow")
+        return self.shadow
+
+    def swap_in(self, shadow):
+        self.documents = shadow.documents
+
+    @property
+    def client(self):
+        return self
+
+    def delete_index(self, index_name):
+        self.deleted_indexes = getattr(self, "deleted_indexes", []) + [index_name]
+
+@pytest.fixture
+def indexer():
+    return FakeIndexer()
+
+@pytest.fixture
+def fake_notion():
+    from benchmarks.fake_notion import FakeNotionServer, FakeWorkspace
+
+    def start(**workspace_options):
+        server = FakeNotionServer(FakeWorkspace(**workspace_options))
+        server.start()
+        servers.append(server)
+        return server
+
+    servers = []
+    yield start
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def sync_service(fake_notion, indexer, tmp_path, monkeypatch):
+    """Build a `SyncService` against a fake Notion workspace and the in-memory indexer."""
+    from src.config.config import config
+    from src.sync.sync_service import SyncService
+
+    def build(**workspace_options):
+        server = fake_notion(**workspace_options)
+        monkeypatch.setattr(config, "NOTION_API_KEY", "test")
+        monkeypatch.setattr(config, "NOTION_BASE_URL", server.base_url)
+        monkeypatch.setattr(config, "NOTION_REQUESTS_PER_SECOND", 1000.0)
+        monkeypatch.setattr(config, "SYNC_STATE_DIR", str(tmp_path))
+        monkeypatch.setattr(config, "RETRIEVAL_MODE", "keyword")
+        monkeypatch.setattr(config, "ANSWER_CACHE", "off")
+        service = SyncService()
+        service.indexer = indexer
+        return service, server
+
+    return build
@@ -0,0 +1,62 @@
+import pytest
+
+from src.config.config import config
+from src.indexer.bulk_indexer import BulkIndexer
+from src.indexer.chunker import page_to_passages
+from src.sync.sync_service import SyncService
+
+def page(page_id, content):
+    return {"id": page_id, "title": "Title", "url": "https://notion.so/x", "hierarchy": "Title", "content": content}
+
+def test_passages_replace_the_pages_old_ones(indexer):
+    bulk = BulkIndexer(indexer, replace_key="page_id")
+    bulk.add(page_to_passages(page("p1", "# One\nfirst\n# Two\nsecond")))
+    bulk.finish()
+    bulk.add(page_to_passages(page("p1", "# One\nonly")))
+    bulk.finish()
+    assert sorted(indexer.documents) == ["p1-0"]
+
+def test_page_without_passages_loses_its_old_ones(indexer):
+    bulk = BulkIndexer(indexer, replace_key="page_id")
+    bulk.add(page_to_passages(page("p1", "# One\nfirst")))
+    bulk.finish()
+    assert page_to_passages(page("p1", "")) == []
+    bulk.add([], keys=["p1"])
+    summary = bulk.finish()
+    assert indexer.documents == {}
+    assert indexer.calls[-1] == ("delete", "page_id", ["p1"])
+    assert summary["failed_ids"] == []
+
+def test_failed_delete_reports_the_page(indexer):
+    bulk = BulkIndexer(indexer, replace_key="page_id")
+    indexer.failing_tasks.add(1)
+    bulk.add([], keys=["p1"])
+    assert bulk.finish()["failed_ids"] == ["p1"]
+
+def test_index_callback_deletes_passages_of_emptied_pages(indexer, monkeypatch):
+    monkeypatch.setattr(config, "INDEX_MODE", "passage")
+    bulk = BulkIndexer(indexer, replace_key="page_id")
+    changed = []
+    index_pages = SyncService._index_callback(bulk, changed)
+    index_pages([page("p1", "# One\nfirst\n# Two\nsecond")])
+    bulk.finish()
+    assert len(indexer.documents) == 2
+    index_pages([page("p1", "")])
+    bulk.finish()
+    assert indexer.documents == {}
+    assert changed == ["p1", "p1"]
+
+def test_embedding_indexer_drops_vectors_of_emptied_pages(indexer, tmp_path):
+    pytest.importorskip("numpy")
+    from src.indexer.embedding_indexer import EmbeddingIndexer
+    from src.indexer.vector_index import LocalVectorIndex
+    from src.llm.embedder import HashingEmbedder
+
+    vectors = LocalVectorIndex(str(tmp_path / "vectors.npz"), 16)
+    embedding = EmbeddingIndexer(BulkIndexer(indexer, replace_key="page_id"), HashingEmbedder(16), vectors)
+    embedding.add(page_to_passages(page("p1", "# One\nfirst")), keys=["p1"])
+    embedding.finish()
+    assert len(vectors) == 1 and len(indexer.documents) == 1
+    embedding.add([], keys=["p1"])
+    embedding.finish()
+    assert len(vectors) == 0 and indexer.documents == {}
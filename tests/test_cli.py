@@ -0,0 +1,49 @@
+import argparse
+import json
+
+from src import cli
+
+class FakeClient:
+    async def aclose(self):
+        pass
+
+class FakeLLMService:
+    """Answers every question, printing diagnostics like the real services do."""
+
+    llm_client = FakeClient()
+
+    async def aanswer(self, question, **options):
+        print(f"Extracted search terms from {question!r}")
+        return f"Answer to {question}", [{"id": "page-1"}]
+
+def build_fake_service(args):
+    print("Search settings are up to date")
+    return FakeLLMService()
+
+def batch_args(path, **options):
+    defaults = {"batch": str(path), "output": "-", "resume": False, "concurrency": 2,
+                "max_context": 40000, "max_context_tokens": 4000, "temperature": 0.7}
+    return argparse.Namespace(**{**defaults, **options})
+
+def test_batch_results_on_stdout_are_pure_jsonl(tmp_path, monkeypatch, capsys):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text('{"question": "What is x?"}\n"What is y?"\n', encoding="utf-8")
+    monkeypatch.setattr(cli, "build_llm_service", build_fake_service)
+
+    cli.run_batch(batch_args(questions))
+    out, err = capsys.readouterr()
+    results = [json.loads(line) for line in out.splitlines()]
+    assert sorted(result["answer"] for result in results) == ["Answer to What is x?", "Answer to What is y?"]
+    assert "Search settings are up to date" in err
+
+def test_resume_skips_answered_questions(tmp_path, monkeypatch, capsys):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text('{"id": "a", "question": "x"}\n{"id": "b", "question": "y"}\n', encoding="utf-8")
+    output = tmp_path / "answers.jsonl"
+    # The first run answered "a", then was killed mid-write
+    output.write_text('{"id": "a", "answer": "done"}\n{"id": "b", "ans', encoding="utf-8")
+    monkeypatch.setattr(cli, "build_llm_service", build_fake_service)
+
+    cli.run_batch(batch_args(questions, output=str(output), resume=True))
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["id"] for line in lines if line.endswith("}")] == ["a", "b"]
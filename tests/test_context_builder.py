@@ -0,0 +1,44 @@
+import pytest
+
+from src.llm import context_builder
+from src.llm.context_builder import SEPARATOR, ContextBuilder, count_tokens
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Four characters per token, whether or not tiktoken and its encodings are available
+    monkeypatch.setattr(context_builder, "_encoding", lambda model: None)
+
+def hit(title, content, score=1.0):
+    return {"id": title, "title": title, "content": content, "_rankingScore": score}
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+def test_context_stays_within_the_budget():
+    hits = [hit(f"Page {i}", words(f"w{i}x", 40)) for i in range(10)]
+    context = ContextBuilder(max_tokens=300).build(hits)
+    assert 0 < count_tokens(context) <= 300
+    assert context.count("# Page") < 10
+
+def test_oversized_top_hit_is_skipped_for_smaller_ones():
+    hits = [hit("Huge", words("huge", 1000), score=0.9), hit("Small", words("small", 20), score=0.8), hit("Tiny", words("tiny", 10), score=0.7)]
+    context = ContextBuilder(max_tokens=200).build(hits)
+    assert "# Huge" not in context
+    assert "# Small" in context and "# Tiny" in context
+
+def test_duplicate_under_another_title_is_dropped():
+    content = words("same", 50)
+    hits = [hit("Original", content, score=0.9), hit("Copy", content, score=0.8), hit("Other", words("other", 50), score=0.7)]
+    context = ContextBuilder(max_tokens=2000).build(hits)
+    assert "# Original" in context and "# Other" in context
+    assert "# Copy" not in context
+
+def test_chosen_hits_keep_their_search_order():
+    # The second hit is worth more per token, so it is picked first
+    hits = [hit("First", words("first", 80), score=0.9), hit("Second", words("second", 10), score=0.8)]
+    context = ContextBuilder(max_tokens=2000).build(hits)
+    assert context.split(SEPARATOR) == [f"# First\n\n{words('first', 80)}", f"# Second\n\n{words('second', 10)}"]
+
+def test_formatted_snippet_is_preferred():
+    snippet = {**hit("Page", words("full", 200)), "_formatted": {"content": "…the cropped part…"}}
+    assert ContextBuilder(max_tokens=2000).build([snippet]) == "# Page\n\n…the cropped part…"
@@ -0,0 +1,94 @@
+from src.config.config import config
+from src.sync.crawl_checkpoint import CrawlCheckpoint
+
+def test_cursor_stays_at_the_oldest_batch_with_pending_pages():
+    checkpoint = CrawlCheckpoint()
+    first = checkpoint.add_batch(None, "c1", ["a", "b"])
+    second = checkpoint.add_batch("c1", "c2", ["c"])
+    checkpoint.page_done(first, "a")
+    checkpoint.page_done(second, "c")
+    assert checkpoint.cursor is None and checkpoint.processed == {"a", "c"}
+    checkpoint.page_done(first, "b")
+    assert checkpoint.cursor == "c2" and checkpoint.processed == set()
+
+def test_forget_takes_back_a_page_ahead_of_the_cursor():
+    checkpoint = CrawlCheckpoint()
+    first = checkpoint.add_batch(None, "c1", ["a", "b"])
+    checkpoint.add_batch("c1", "c2", ["c"])
+    checkpoint.page_done(first, "a")
+    checkpoint.forget(["a"])
+    assert checkpoint.cursor is None and checkpoint.processed == set() and checkpoint.retry == set()
+
+def test_forget_keeps_pages_behind_the_cursor_for_retry(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = CrawlCheckpoint(path)
+    checkpoint.start("scope", False)
+    first = checkpoint.add_batch(None, "c1", ["a"])
+    second = checkpoint.add_batch("c1", "c2", ["b", "c"])
+    checkpoint.page_done(first, "a")
+    checkpoint.page_done(second, "b")
+    assert checkpoint.cursor == "c1"
+    checkpoint.forget(["a"])
+    assert checkpoint.cursor == "c1" and checkpoint.retry == {"a"}
+    checkpoint.save()
+
+    resumed = CrawlCheckpoint(path)
+    assert resumed.resume("scope", False)
+    assert resumed.cursor == "c1" and resumed.processed == {"b"} and resumed.retry == {"a"}
+
+def test_pending_failures_are_not_retried_twice():
+    checkpoint = CrawlCheckpoint()
+    checkpoint.add_batch(None, None, ["a"])
+    checkpoint.forget(["a"])
+    assert checkpoint.retry == set() and checkpoint.cursor is None
+
+def test_interrupted_sync_resumes_without_skipping_failed_pages(sync_service, indexer, monkeypatch, caplog):
+    monkeypatch.setattr(config, "INDEX_BATCH_SIZE", 10)
+    service, server = sync_service(pages=250, depth=2, blocks_per_page=1)
+    page_ids = list(server.workspace.pages)
+    # Indexing fails for a page of the first search response, which the crawl moves past
+    failed_id = page_ids[3]
+    indexer.failing_ids.add(failed_id)
+
+    iter_batches = service.notion_client._iter_search_batches
+
+    def interrupted(checkpoint):
+        for number, item in enumerate(iter_batches(checkpoint)):
+            if number == 2:
+                raise RuntimeError("connection lost")
+            yield item
+
+    monkeypatch.setattr(service.notion_client, "_iter_search_batches", interrupted)
+    assert service.sync() is False
+    assert failed_id not in indexer.documents
+    assert failed_id in service.checkpoint.retry
+
+    monkeypatch.setattr(service.notion_client, "_iter_search_batches", iter_batches)
+    indexer.failing_ids.clear()
+    calls_before = len(indexer.calls)
+    with caplog.at_level("INFO"):
+        assert service.sync() is True
+    assert "Resuming interrupted incremental sync" in caplog.text
+    assert caplog.text.count("Resuming") == 2 and "Resuming skipped" in caplog.text
+    assert sorted(indexer.documents) == sorted(page_ids)
+    # The pages of the failed task, those in flight and the ones after the interruption are indexed again, not all
+    reindexed = {doc_id for call in indexer.calls[calls_before:] if call[0] == "add" for doc_id in call[1]}
+    assert failed_id in reindexed
+    assert len(reindexed) < 100
+
+def test_page_is_not_done_until_it_is_indexed(sync_service):
+    service, server = sync_service(pages=20, depth=2, blocks_per_page=1)
+    failing = list(server.workspace.pages)[5]
+    checkpoint = CrawlCheckpoint()
+    indexed = []
+
+    def index_pages(docs):
+        if docs[0]["id"] == failing:
+            return False
+        indexed.extend(doc["id"] for doc in docs)
+        return True
+
+    service.notion_client.fetch_and_index_all_pages(index_pages, checkpoint=checkpoint)
+    # The search is finished, so the page is left for a resumed crawl to retry
+    assert checkpoint.pages_done and checkpoint.cursor is None
+    assert checkpoint.retry == {failing} and len(indexed) == 19
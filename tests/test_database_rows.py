@@ -0,0 +1,79 @@
+from src.config.config import config
+from src.notion.properties import page_title, property_lines, property_text
+
+def test_property_text():
+    assert property_text({"type": "number", "number": 3.0}) == "3"
+    assert property_text({"type": "number", "number": 2.5}) == "2.5"
+    assert property_text({"type": "number", "number": None}) == ""
+    assert property_text({"type": "multi_select", "multi_select": [{"name": "a"}, {"name": "b"}]}) == "a, b"
+    assert property_text({"type": "date", "date": {"start": "2025-01-01", "end": "2025-01-31"}}) == "2025-01-01 → 2025-01-31"
+    assert property_text({"type": "checkbox", "checkbox": False}) == "No"
+    assert property_text({"type": "unique_id", "unique_id": {"prefix": "TASK", "number": 7}}) == "TASK-7"
+    assert property_text({"type": "formula", "formula": {"type": "number", "number": 4}}) == "4"
+    rollup = {"type": "array", "array": [{"type": "select", "select": {"name": "x"}}, {"type": "select", "select": None}]}
+    assert property_text({"type": "rollup", "rollup": rollup}) == "x"
+    assert property_text({"type": "relation", "relation": [{"id": "r"}]}) == ""
+
+def test_row_title_and_property_lines():
+    row = {"properties": {
+        "Task": {"type": "title", "title": [{"plain_text": "Ship "}, {"plain_text": "it"}]},
+        "Status": {"type": "status", "status": {"name": "Done"}},
+        "Notes": {"type": "rich_text", "rich_text": []}
+    }}
+    assert page_title(row) == "Ship it"
+    assert property_lines(row) == ["Status: Done"]
+
+def database_service(sync_service, monkeypatch, rows=12, bodies=range(6, 12), **options):
+    monkeypatch.setattr(config, "NOTION_DATABASE_ROWS", True)
+    for name, value in options.items():
+        monkeypatch.setattr(config, name, value)
+    service, server = sync_service(pages=5, depth=1, blocks_per_page=1)
+    database = server.workspace.add_database("Tasks", next(iter(server.workspace.pages)))
+    row_ids = [server.workspace.add_row(database["id"], f"Task {i}", blocks=2 if i in bodies else 0)["id"] for i in range(rows)]
+    return service, server, database, row_ids
+
+def test_row_bodies_are_indexed_wherever_they_are(sync_service, indexer, monkeypatch):
+    # Only rows after the first few have bodies
+    service, _, _, row_ids = database_service(sync_service, monkeypatch)
+    assert service.sync() is True
+    with_body = [row_id for row_id in row_ids if "\n\n" in indexer.documents[row_id]["content"]]
+    assert with_body == row_ids[6:]
+
+def test_bodyless_databases_skip_block_content(sync_service, indexer, monkeypatch):
+    service, server, database, row_ids = database_service(sync_service, monkeypatch)
+    service.notion_client.bodyless_databases = {database["id"].replace("-", "")}
+    assert service.sync() is True
+    assert all("\n\n" not in indexer.documents[row_id]["content"] for row_id in row_ids)
+
+def test_interrupted_database_phase_resumes_after_the_last_finished_database(sync_service, indexer, monkeypatch):
+    service, server, _, _ = database_service(sync_service, monkeypatch)
+    server.workspace.add_database("Bugs", next(iter(server.workspace.pages)))
+    client = service.notion_client
+    search_batches = client._iter_search_batches
+    index_database = client._index_database
+    searched, queried = [], []
+
+    def count_search(checkpoint):
+        searched.append(checkpoint.cursor)
+        return search_batches(checkpoint)
+
+    def interrupted(database, *args):
+        if len(queried) == 1:
+            raise RuntimeError("connection lost")
+        queried.append(database["id"])
+        return index_database(database, *args)
+
+    monkeypatch.setattr(client, "_iter_search_batches", count_search)
+    monkeypatch.setattr(client, "_index_database", interrupted)
+    assert service.sync() is False
+    assert service.checkpoint.pages_done and service.checkpoint.databases_done == set(queried)
+
+    def resumed(database, *args):
+        queried.append(database["id"])
+        return index_database(database, *args)
+
+    monkeypatch.setattr(client, "_index_database", resumed)
+    assert service.sync() is True
+    # The pages were not crawled again, and the finished database not queried again
+    assert len(searched) == 1
+    assert len(queried) == 2 and len(set(queried)) == 2
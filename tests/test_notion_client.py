@@ -0,0 +1,47 @@
+def test_page_with_a_missing_subtree_is_retried(sync_service, indexer):
+    service, server = sync_service(pages=5, depth=1, blocks_per_page=4)
+    workspace = server.workspace
+    page_id = next(iter(workspace.pages))
+    toggle = next(block for block in workspace.blocks[page_id] if block["has_children"])
+    children = workspace.blocks.pop(toggle["id"])
+
+    service.sync()
+    assert page_id not in indexer.documents
+    assert not service.sync_state.is_unchanged(page_id, workspace.pages[page_id]["last_edited_time"])
+
+    workspace.blocks[toggle["id"]] = children
+    assert service.sync() is True
+    child = children[-1]
+    assert child[child["type"]]["rich_text"][0]["plain_text"] in indexer.documents[page_id]["content"]
+
+def test_crawl_rewrites_the_hierarchy_below_a_renamed_page(sync_service, indexer):
+    service, server = sync_service(pages=30, depth=3, blocks_per_page=1)
+    workspace = server.workspace
+    assert service.sync() is True
+    parent_id = next(page_id for page_id, page in workspace.pages.items()
+                     if page["parent"]["type"] == "workspace" and service.notion_client.page_cache.descendants(page_id))
+    descendants = service.notion_client.page_cache.descendants(parent_id)
+
+    parent = workspace.pages[parent_id]
+    parent["properties"]["title"]["title"] = [{"type": "text", "text": {"content": "Renamed"}, "plain_text": "Renamed"}]
+    parent["last_edited_time"] = "2099-01-01T00:00:00.000Z"
+    calls_before = len(indexer.calls)
+    assert service.sync() is True
+    assert all(indexer.documents[page_id]["hierarchy"].startswith("Renamed > ") for page_id in descendants)
+    # The descendants were not re-fetched and re-indexed, only their hierarchy rewritten
+    added = {doc_id for call in indexer.calls[calls_before:] if call[0] == "add" for doc_id in call[1]}
+    assert added == {parent_id}
+    assert service.checkpoint.moved == set()
+
+def test_rebuild_keeps_the_live_index_when_a_page_cannot_be_fetched(sync_service, indexer):
+    service, server = sync_service(pages=10, depth=1, blocks_per_page=4)
+    assert service.sync() is True
+    live = dict(indexer.documents)
+    workspace = server.workspace
+    page_id = next(iter(workspace.pages))
+    toggle = next(block for block in workspace.blocks[page_id] if block["has_children"])
+    del workspace.blocks[toggle["id"]]
+
+    assert service.rebuild() is False
+    assert indexer.documents == live
+    assert indexer.deleted_indexes == [indexer.shadow.index_name]
@@ -0,0 +1,112 @@
+import copy
+
+import pytest
+
+from src.indexer.meilisearch_client import SEARCH_SETTINGS, SearchIndexer, reciprocal_rank_fusion, settings_hash
+from src.llm.embedder import EMBEDDER_NAME
+from src.llm.llm_service import LLMService
+
+class FakeIndex:
+    def __init__(self, settings):
+        self.settings = settings
+        self.updates = []
+
+    def get_settings(self):
+        return self.settings
+
+    def update_settings(self, settings):
+        self.updates.append(settings)
+
+class FakeClient:
+    def __init__(self, index):
+        self._index = index
+
+    def index(self, name):
+        return self._index
+
+def reported_settings(dimensions=256):
+    """Settings as MeiliSearch reports them after ours were applied."""
+    return {
+        "displayedAttributes": ["*"],
+        "searchableAttributes": list(SEARCH_SETTINGS["searchableAttributes"]),
+        "filterableAttributes": list(reversed(SEARCH_SETTINGS["filterableAttributes"])),
+        "sortableAttributes": [],
+        "rankingRules": list(SEARCH_SETTINGS["rankingRules"]),
+        "stopWords": sorted(SEARCH_SETTINGS["stopWords"]),
+        "nonSeparatorTokens": [],
+        "synonyms": {word: list(reversed(synonyms)) for word, synonyms in reversed(SEARCH_SETTINGS["synonyms"].items())},
+        "distinctAttribute": None,
+        "typoTolerance": {**copy.deepcopy(SEARCH_SETTINGS["typoTolerance"]), "disableOnNumbers": False},
+        "faceting": {"maxValuesPerFacet": 100, "sortFacetValuesBy": {"*": "alpha"}},
+        "pagination": {"maxTotalHits": 1000},
+        "embedders": {EMBEDDER_NAME: {"source": "userProvided", "dimensions": dimensions}},
+        "searchCutoffMs": None
+    }
+
+def indexer_with(settings):
+    indexer = SearchIndexer("http://localhost:7700", "key", vector_dimensions=256)
+    index = FakeIndex(settings)
+    indexer._client = FakeClient(index)
+    return indexer, index
+
+def test_reported_settings_match_ours():
+    indexer, index = indexer_with(reported_settings())
+    desired = indexer.search_settings()
+    assert settings_hash(desired, reported_settings()) == settings_hash(desired)
+    assert indexer.configure_search_settings() is True
+    assert index.updates == []
+
+def test_changed_settings_are_sent():
+    reported = reported_settings()
+    reported["rankingRules"] = ["typo", "words", "proximity", "attribute", "exactness"]
+    indexer, index = indexer_with(reported)
+    assert indexer.configure_search_settings() is True
+    assert index.updates == [indexer.search_settings()]
+
+def test_changed_embedder_dimensions_are_sent():
+    indexer, index = indexer_with(reported_settings(dimensions=128))
+    indexer.configure_search_settings()
+    assert len(index.updates) == 1
+
+def test_fusion_ranks_documents_found_by_several_variants_first():
+    fused = reciprocal_rank_fusion([
+        [{"id": "a"}, {"id": "b"}, {"id": "c"}],
+        [{"id": "c"}, {"id": "b"}],
+        [{"id": "d"}]
+    ], k=60)
+    # Ties keep the order documents were first seen in
+    assert [hit["id"] for hit in fused] == ["c", "b", "a", "d"]
+    assert fused[0]["_fusionScore"] == pytest.approx(1 / 63 + 1 / 61)
+
+def test_fusion_keeps_the_best_ranking_score():
+    fused = reciprocal_rank_fusion([
+        [{"id": "a", "_rankingScore": 0.4, "title": "Old"}],
+        [{"id": "a", "_rankingScore": 0.9, "title": "New"}],
+        [{"id": "a", "_rankingScore": 0.2}]
+    ])
+    assert len(fused) == 1
+    assert fused[0]["_rankingScore"] == 0.9 and fused[0]["title"] == "New"
+    assert fused[0]["_fusionScore"] == pytest.approx(3 / 61)
+
+class RecordingIndexer:
+    index_name = "test_pages"
+
+    def __init__(self):
+        self.queries = []
+
+    def multi_search(self, queries, limit=10):
+        self.queries.extend(queries)
+        return [{"hits": [{"id": f"{i}-{query['q']}", "_rankingScore": 0.5}]} for i, query in enumerate(queries)]
+
+def test_multi_search_sends_identical_variants_once():
+    indexer = RecordingIndexer()
+    service = LLMService(indexer, llm_client=object(), multi_query=True)
+    # The extracted terms are the question itself, so the first two variants are the same
+    results = service._multi_search("deploy api", "deploy api", 5, {"showRankingScore": True})
+    assert [query.get("attributesToSearchOn") for query in indexer.queries] == [None, ["title"], ["hierarchy"]]
+    assert all(query["showRankingScore"] for query in indexer.queries)
+    assert len(results["hits"]) == 3
+
+    indexer.queries.clear()
+    service._multi_search("deploy api", "How do I deploy the API?", 5, {})
+    assert len(indexer.queries) == 4
@@ -0,0 +1,36 @@
+import asyncio
+
+from src.slack_client import SlackClient, SlackRetryableError
+
+def test_retry_after_parses_seconds():
+    assert SlackClient._retry_after("30") == 30.0
+    assert SlackClient._retry_after("-5") == 0.0
+
+def test_retry_after_falls_back_to_backoff_on_bad_headers():
+    assert SlackClient._retry_after(None) is None
+    assert SlackClient._retry_after("Wed, 21 Oct 2026 07:28:00 GMT") is None
+
+def test_rate_limited_without_retry_after():
+    error = SlackRetryableError("chat.postMessage rate limited", None, rate_limited=True)
+    assert error.rate_limited and error.retry_after is None
+
+def test_failed_stream_replaces_the_placeholder():
+    client = SlackClient("xoxb-test", update_interval=60)
+    messages = {}
+
+    async def post_message_ts(channel, text, thread_ts=None):
+        messages["1.0"] = text
+        return "1.0"
+
+    async def update_message(channel, ts, text, retry=True):
+        messages[ts] = text
+        return True
+
+    async def chunks():
+        yield "Partial"
+        raise ConnectionError("MeiliSearch is down")
+
+    client.post_message_ts = post_message_ts
+    client.update_message = update_message
+    assert asyncio.run(client.stream_message("C1", chunks())) is False
+    assert messages == {"1.0": "Sorry, I couldn't generate a response."}
@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import server
+from src.config.config import config
+from src.notion.page_cache import PageMetadataCache
+from src.sync.sync_service import SyncService
+
+TOKEN = "secret_test"
+
+@pytest.fixture
+def submitted(monkeypatch):
+    events = []
+    monkeypatch.setattr(server.page_changes, "submit", lambda page_id, deleted=False: events.append((page_id, deleted)))
+    return events
+
+def post(body, token=TOKEN):
+    raw = json.dumps(body).encode()
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["X-Notion-Signature"] = "sha256=" + hmac.new(token.encode(), raw, hashlib.sha256).hexdigest()
+    return TestClient(server.app).post("/notion/webhook", content=raw, headers=headers)
+
+def deleted_event(page_id):
+    return {"type": "page.deleted", "entity": {"type": "page", "id": page_id}}
+
+def test_events_are_refused_without_a_token(monkeypatch, submitted):
+    monkeypatch.setattr(config, "NOTION_WEBHOOK_VERIFICATION_TOKEN", "")
+    assert post(deleted_event("p1"), token=None).status_code == 403
+    assert submitted == []
+
+def test_events_need_a_valid_signature(monkeypatch, submitted):
+    monkeypatch.setattr(config, "NOTION_WEBHOOK_VERIFICATION_TOKEN", TOKEN)
+    assert post(deleted_event("p1"), token="wrong").status_code == 401
+    assert post(deleted_event("p1")).status_code == 200
+    assert submitted == [("p1", True)]
+
+def test_a_list_with_a_non_object_event_is_rejected(monkeypatch, submitted):
+    monkeypatch.setattr(config, "NOTION_WEBHOOK_VERIFICATION_TOKEN", TOKEN)
+    assert post([deleted_event("p1"), "p2"]).status_code == 400
+    assert post([{"type": "page.created", "entity": "p3"}]).status_code == 400
+    assert submitted == []
+
+def test_deleted_pages_are_confirmed_with_notion(sync_service, indexer):
+    service, server_ = sync_service(pages=30, depth=2, blocks_per_page=1)
+    assert service.sync() is True
+    live, trashed = list(server_.workspace.pages)[:2]
+    server_.workspace.pages[trashed]["archived"] = True
+
+    update = service.update_pages([], [live, trashed])
+    assert update["deleted"] == [trashed]
+    assert live in indexer.documents and trashed not in indexer.documents
+
+def test_updates_see_pages_the_sync_process_found_later(sync_service, indexer, tmp_path):
+    service, server_ = sync_service(pages=30, depth=2, blocks_per_page=1)
+    # The server's service is built before the sync process has crawled anything
+    webhook_service = SyncService()
+    webhook_service.indexer = indexer
+    assert service.sync() is True
+
+    workspace = server_.workspace
+    parent = next(page_id for page_id, page in workspace.pages.items()
+                  if any(child["parent"].get("page_id") == page_id for child in workspace.pages.values()))
+    children = [page_id for page_id, page in workspace.pages.items() if page["parent"].get("page_id") == parent]
+    for page_id in [parent] + children:
+        workspace.pages[page_id]["archived"] = True
+
+    update = webhook_service.update_pages([], [parent])
+    assert set(children) <= set(update["deleted"])
+    assert not set(children) & set(indexer.documents)
+
+    # The sync process doesn't write its stale cache back over the webhook's
+    assert service.sync() is True
+    cache = PageMetadataCache(path=str(tmp_path / "page_cache.json"))
+    cache.load()
+    assert all(cache.get(page_id) is None for page_id in [parent] + children)